@@ -1,7 +1,9 @@
 import os
+import asyncio
+import weakref
 from django.apps import AppConfig
 from dotenv import load_dotenv
-from langfuse.openai import OpenAI
+from langfuse.openai import OpenAI, AsyncOpenAI
 from langfuse import Langfuse
 import logging
 
@@ -14,6 +16,18 @@ class AgentServiceConfig(AppConfig):
 
     openai_client = None
     langfuse_client = None
+    # httpx pools are bound to the loop that first used them, so each loop gets its own client
+    _async_openai_clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get_async_openai_client(cls) -> AsyncOpenAI:
+        """Return the async OpenAI client of the running event loop, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        client = cls._async_openai_clients.get(loop)
+        if client is None:
+            logger.info("Loading async OpenAI client for a new event loop...")
+            client = cls._async_openai_clients[loop] = AsyncOpenAI(api_key = os.getenv("OPENAI_API_KEY"))
+        return client
 
     def ready(self):
         if not AgentServiceConfig.openai_client:
@@ -0,0 +1,38 @@
+import time
+import random
+from datetime import datetime, timedelta, timezone
+from datetime import time as day_time
+from django.core.management.base import BaseCommand
+from agent_service.toolbox.services.scheduling import compute_free_slots
+
+class Command(BaseCommand):
+    help = "Benchmark the free-slot engine on synthetic calendars."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, nargs='+', default=[1000, 10000, 50000], help="Event counts to benchmark.")
+        parser.add_argument('--days', type=int, default=90, help="Length of the searched range in days.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per event count; the best one is reported.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        start = datetime(2025, 1, 6, tzinfo=timezone.utc)
+        end = start + timedelta(days=options['days'])
+        span = int((end - start).total_seconds())
+
+        for count in options['events']:
+            busy = []
+            for _ in range(count):
+                event_start = start + timedelta(seconds=rng.randrange(0, span))
+                busy.append((event_start, event_start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 120]))))
+
+            best = float('inf')
+            for _ in range(options['repeat']):
+                began = time.perf_counter()
+                slots = compute_free_slots(
+                    busy, start, end, timedelta(minutes=30), "America/New_York",
+                    day_time(9), day_time(17), max_slots=count
+                )
+                best = min(best, time.perf_counter() - began)
+
+            self.stdout.write(f"{count:>7} events over {options['days']} days: {best * 1000:8.2f} ms, {len(slots)} free slots")
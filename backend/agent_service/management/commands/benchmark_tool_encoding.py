@@ -0,0 +1,73 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from agent_service.toolbox.services.calendar import simplify_event
+from agent_service.toolbox.services.encoding import encode_tool_result
+
+SUMMARIES = ["Standup", "1:1 with manager", "Gym", "Lunch", "Design review", "Lecture: Linear Algebra",
+             "Dentist", "Sprint planning", "Office hours", "Dinner with family", "Focus time", "Commute"]
+LOCATIONS = ["Room 204", "Zoom", "Main library", "Downtown gym", "Cafeteria"]
+DESCRIPTIONS = [
+    "Weekly sync on the roadmap, blockers and hiring. Please add agenda items to the shared doc beforehand.",
+    "Bring the printed handouts. Chapter 4 exercises are due at the start of class.",
+    "Join with Google Meet: meet.google.com/abc-defg-hij. Or dial +1 555-0100 PIN 123456#. "
+    "Learn more about Meet at support.google.com/a/users/answer/9282720",
+]
+
+class Command(BaseCommand):
+    help = "Measure how many characters and tokens the compact tool-result encoding saves."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, nargs='+', default=[10, 50, 250], help="Listing sizes to encode.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def make_event(self, rng: random.Random, start: datetime, index: int) -> dict:
+        """A raw API event with the mix of optional fields seen on real calendars"""
+        event_start = start + timedelta(minutes=30 * rng.randrange(0, 48 * 14))
+        event = {
+            'id': f"{rng.getrandbits(64):016x}{index}",
+            'summary': rng.choice(SUMMARIES),
+            'start': {'dateTime': event_start.isoformat(), 'timeZone': 'America/New_York'},
+            'end': {'dateTime': (event_start + timedelta(minutes=rng.choice([30, 60, 90]))).isoformat(), 'timeZone': 'America/New_York'},
+        }
+        if rng.random() < 0.4:
+            event['description'] = rng.choice(DESCRIPTIONS)
+        if rng.random() < 0.5:
+            event['location'] = rng.choice(LOCATIONS)
+        if rng.random() < 0.3:
+            event['attendees'] = [
+                {'email': f"person{rng.randrange(100)}@example.com", 'responseStatus': 'accepted', 'displayName': f"Person {n}"}
+                for n in range(rng.randrange(1, 6))
+            ]
+        return event
+
+    def count_tokens(self, text: str) -> int:
+        try:
+            import tiktoken
+        except ImportError:
+            # Same rough ratio the context compaction uses
+            return len(text) // 4
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        start = datetime(2025, 3, 3, 8, tzinfo=timezone.utc)
+
+        for count in options['events']:
+            events = sorted(
+                (simplify_event(self.make_event(rng, start, index)) for index in range(count)),
+                key=lambda event: event['start']
+            )
+            before = json.dumps(events)
+            after = encode_tool_result(events)
+            before_tokens = self.count_tokens(before)
+            after_tokens = self.count_tokens(after)
+            truncated = json.loads(after).get('truncated', 0)
+
+            self.stdout.write(
+                f"{count:>5} events: {len(before):>8} -> {len(after):>8} chars, "
+                f"{before_tokens:>7} -> {after_tokens:>7} tokens "
+                f"({100 * (1 - after_tokens / before_tokens):.0f}% saved"
+                + (f", {truncated} rows cut by the budget)" if truncated else ")")
+            )
@@ -0,0 +1,66 @@
+import os
+import signal
+import asyncio
+import logging
+import multiprocessing
+from django.core.management.base import BaseCommand
+from django.db import connections
+from agent_service.toolbox.jobs import run_worker, worker_name
+
+logger = logging.getLogger(__name__)
+
+def start_worker(index: int, concurrency: int):
+    """Process entry point: run one job worker until SIGTERM/SIGINT"""
+    async def main():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop_event.set)
+        await run_worker(worker_name(index), concurrency, stop_event)
+
+    asyncio.run(main())
+
+class Command(BaseCommand):
+    help = "Run agent job workers that execute queued agent runs from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=int(os.getenv('AGENT_JOB_PROCESSES', '1')),
+            help="Number of worker processes to run on this node."
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=int(os.getenv('AGENT_JOB_CONCURRENCY', '8')),
+            help="Number of jobs each worker process runs at once."
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        concurrency = options['concurrency']
+
+        if processes <= 1:
+            start_worker(0, concurrency)
+            return
+
+        # Children must not inherit the parent's database connections
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=start_worker, args=(index, concurrency), name=f"agent-job-worker-{index}")
+            for index in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {processes} agent job workers.")
+
+        def forward(sig, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    os.kill(worker.pid, sig)
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for worker in workers:
+            worker.join()
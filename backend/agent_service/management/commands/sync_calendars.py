@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from django.core.management.base import BaseCommand
+from asgiref.sync import sync_to_async
+from database_service.models import User
+from agent_service.toolbox.services.calendar_sync import sync_calendar
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = "Incrementally sync users' Google Calendars into the local event mirror."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calendar', action='append', default=None, help="Calendar id to sync (repeatable, default 'primary').")
+        parser.add_argument('--interval', type=float, default=0, help="Keep syncing every N seconds instead of once.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Number of calendars synced at once.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options['calendar'] or ['primary'], options['interval'], options['concurrency']))
+
+    async def run(self, calendars, interval, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def sync_one(token, calendar_id):
+            async with semaphore:
+                try:
+                    return await sync_calendar(token, calendar_id)
+                except Exception as e:
+                    logger.error(f"Failed to sync calendar {calendar_id} for user {token}: {e}", exc_info=True)
+                    return 0
+
+        while True:
+            tokens = await sync_to_async(list)(
+                User.objects.exclude(u_google_auth={}).values_list('u_id', flat=True)
+            )
+            changes = await asyncio.gather(*[
+                sync_one(str(token), calendar_id) for token in tokens for calendar_id in calendars
+            ])
+            self.stdout.write(f"Synced {len(changes)} calendars, {sum(changes)} changed events.")
+
+            if not interval:
+                break
+            await asyncio.sleep(interval)
@@ -1,3 +1,852 @@
-from django.test import TestCase
+import asyncio
+from datetime import datetime, timedelta, timezone
+from datetime import time as day_time
+import threading
+from unittest.mock import AsyncMock, Mock, patch
+import json
+import httplib2
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase
+from googleapiclient.errors import HttpError
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import HttpMockSequence
+from google.oauth2.credentials import Credentials
+from agent_service.toolbox.services import calendar_client
+from agent_service.toolbox.services.calendar_client import (
+    coalesce_requests, execute, RequestBatcher, get_discovery_document, _execute_batch_blocking,
+    ETagCache, execute_conditional
+)
+from agent_service.toolbox.services.calendar import event_diff, modify_event
+from agent_service.toolbox.services.conflicts import ConflictIndex
+from agent_service.toolbox import agent
+from agent_service.toolbox.executor import AgentExecutor, AgentQueueFull
+from agent_service.views import agent_view
+from rest_framework.test import APIRequestFactory
+from agent_service.toolbox import jobs
+from app_lib.utils.agent_jobs import (
+    enqueue_job, claim_jobs, extend_job_leases, complete_job, fail_job, VISIBILITY_TIMEOUT, RETRY_BACKOFF
+)
+from django.utils import timezone as django_timezone
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+from agent_service.toolbox.services.calendar_sync import sync_calendar, MIRROR_PAST_DAYS
+from agent_service.toolbox.services.prompts import PromptRegistry
+from agent_service.toolbox.services.encoding import encode_tool_result, encode_table, fit_budget, TOOL_RESULT_TEXT_CHARS
+from agent_service.toolbox.services.compaction import find_split, build_context, TOOL_RESULT_MAX_CHARS
+from agent_service.toolbox.services.scheduling import (
+    merge_intervals, working_windows, subtract_busy, compute_free_slots
+)
+from app_lib.utils.calendar_mirror import query_mirror
+from database_service.models import User, MirroredEvent, CalendarSyncState, Conversation, AgentJob
 
-# Create your tests here.
+class FakeRequest:
+    def __init__(self, handler):
+        self.handler = handler
+
+    def execute(self, **kwargs):
+        return self.handler()
+
+class FakeCalendar:
+    """
+    In-memory stand-in for the Calendar API's events().list, with sync token semantics:
+    a token is the change counter at the time it was issued, and tokens older than
+    `oldest_token` are rejected with 410 Gone.
+    """
+
+    def __init__(self):
+        self.stored = {}
+        self.changed_at = {}
+        self.counter = 0
+        self.oldest_token = 0
+        self.requests = []
+
+    def put(self, event_id: str, start: datetime, hours: int = 1, summary: str = "Event"):
+        self.counter += 1
+        self.stored[event_id] = {
+            'id': event_id,
+            'status': 'confirmed',
+            'summary': summary,
+            'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': (start + timedelta(hours=hours)).isoformat()},
+        }
+        self.changed_at[event_id] = self.counter
+
+    def cancel(self, event_id: str):
+        self.counter += 1
+        self.stored[event_id] = {'id': event_id, 'status': 'cancelled'}
+        self.changed_at[event_id] = self.counter
+
+    def expire_tokens(self):
+        self.oldest_token = self.counter + 1
+
+    def events(self):
+        return self
+
+    def list(self, calendarId, pageToken=None, syncToken=None, timeMin=None, maxResults=250, **kwargs):
+        self.requests.append({'syncToken': syncToken, 'timeMin': timeMin, 'pageToken': pageToken})
+        return FakeRequest(lambda: self._list(pageToken, syncToken, timeMin, maxResults))
+
+    def _list(self, page_token, sync_token, time_min, max_results):
+        if sync_token is not None:
+            if int(sync_token) < self.oldest_token:
+                raise HttpError(httplib2.Response({'status': 410}), b'{"error": {"code": 410}}')
+            items = [event for event_id, event in self.stored.items() if self.changed_at[event_id] > int(sync_token)]
+        else:
+            time_min = datetime.fromisoformat(time_min.replace('Z', '+00:00'))
+            items = [
+                event for event in self.stored.values()
+                if event['status'] != 'cancelled' and datetime.fromisoformat(event['end']['dateTime']) > time_min
+            ]
+
+        offset = int(page_token or 0)
+        page = {'items': items[offset:offset + max_results]}
+        if offset + max_results < len(items):
+            page['nextPageToken'] = str(offset + max_results)
+        else:
+            page['nextSyncToken'] = str(self.counter)
+        return page
+
+async def fake_execute(request):
+    return request.execute()
+
+class CalendarSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(u_email="sync@example.com")
+        self.token = str(self.user.u_id)
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.calendar = FakeCalendar()
+        for day in range(5):
+            self.calendar.put(f"event{day}", self.now + timedelta(days=day))
+
+        patchers = [
+            patch('agent_service.toolbox.services.calendar_sync.get_calendar_service', AsyncMock(return_value=self.calendar)),
+            patch('agent_service.toolbox.services.calendar_sync.execute', fake_execute),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def sync(self):
+        return async_to_sync(sync_calendar)(self.token, 'primary')
+
+    def mirrored_ids(self):
+        return set(MirroredEvent.objects.filter(u_id=self.user).values_list('me_event_id', flat=True))
+
+    def test_full_sync_loads_window_and_records_it(self):
+        self.calendar.put("old", self.now - timedelta(days=MIRROR_PAST_DAYS + 10))
+
+        self.sync()
+
+        self.assertEqual(self.mirrored_ids(), {f"event{day}" for day in range(5)})
+        state = CalendarSyncState.objects.get(u_id=self.user, cs_calendar_id='primary')
+        self.assertEqual(state.cs_sync_token, str(self.calendar.counter))
+        self.assertIsNotNone(self.calendar.requests[0]['timeMin'])
+        self.assertAlmostEqual(
+            state.cs_synced_from, self.now - timedelta(days=MIRROR_PAST_DAYS), delta=timedelta(minutes=1)
+        )
+
+        events = query_mirror(self.token, 'primary', self.now - timedelta(days=1), self.now + timedelta(days=7))
+        self.assertEqual([event['id'] for event in events], [f"event{day}" for day in range(5)])
+
+    def test_query_before_synced_window_falls_back(self):
+        self.sync()
+
+        start = self.now - timedelta(days=MIRROR_PAST_DAYS + 30)
+        self.assertIsNone(query_mirror(self.token, 'primary', start, self.now))
+
+    def test_incremental_sync_uses_sync_token(self):
+        self.sync()
+        token = CalendarSyncState.objects.get(u_id=self.user).cs_sync_token
+        self.calendar.put("event1", self.now + timedelta(days=1), summary="Moved")
+        self.calendar.put("event9", self.now + timedelta(days=9))
+
+        changed = self.sync()
+
+        self.assertEqual(changed, 2)
+        self.assertEqual(self.calendar.requests[-1]['syncToken'], token)
+        self.assertEqual(self.mirrored_ids(), {f"event{day}" for day in range(5)} | {"event9"})
+        moved = MirroredEvent.objects.get(u_id=self.user, me_event_id="event1")
+        self.assertEqual(moved.me_payload['summary'], "Moved")
+
+    def test_cancelled_event_removes_row(self):
+        self.sync()
+        self.calendar.cancel("event2")
+
+        self.sync()
+
+        self.assertNotIn("event2", self.mirrored_ids())
+        self.assertEqual(len(self.mirrored_ids()), 4)
+
+    def test_expired_sync_token_runs_full_sync(self):
+        self.sync()
+        self.calendar.cancel("event0")
+        self.calendar.put("event7", self.now + timedelta(days=7))
+        self.calendar.expire_tokens()
+
+        self.sync()
+
+        requests = self.calendar.requests
+        self.assertIsNotNone(requests[-2]['syncToken'])
+        self.assertIsNone(requests[-1]['syncToken'])
+        self.assertEqual(self.mirrored_ids(), {"event1", "event2", "event3", "event4", "event7"})
+        state = CalendarSyncState.objects.get(u_id=self.user)
+        self.assertEqual(state.cs_sync_token, str(self.calendar.counter))
+
+def at(day: int, hour: int, minute: int = 0) -> datetime:
+    """A UTC time in the week of Monday 2025-01-06"""
+    return datetime(2025, 1, day, hour, minute, tzinfo=timezone.utc)
+
+class FreeSlotTests(SimpleTestCase):
+    def test_merge_overlapping_and_adjacent(self):
+        merged = merge_intervals([
+            (at(6, 13), at(6, 14)),
+            (at(6, 9), at(6, 10)),
+            (at(6, 9, 30), at(6, 11)),
+            (at(6, 11), at(6, 12)),
+            (at(6, 9, 45), at(6, 10, 15)),
+        ])
+        self.assertEqual(merged, [(at(6, 9), at(6, 12)), (at(6, 13), at(6, 14))])
+
+    def test_subtract_busy_from_windows(self):
+        windows = [(at(6, 9), at(6, 17)), (at(7, 9), at(7, 17))]
+        busy = merge_intervals([(at(6, 8), at(6, 10)), (at(6, 12), at(6, 13)), (at(6, 16), at(7, 10))])
+        self.assertEqual(subtract_busy(windows, busy), [
+            (at(6, 10), at(6, 12)),
+            (at(6, 13), at(6, 16)),
+            (at(7, 10), at(7, 17)),
+        ])
+
+    def test_slots_shorter_than_duration_are_dropped(self):
+        busy = [(at(6, 9), at(6, 10)), (at(6, 10, 20), at(6, 16, 30))]
+        slots = compute_free_slots(
+            busy, at(6, 0), at(7, 0), timedelta(minutes=30), "UTC", day_time(9), day_time(17)
+        )
+        self.assertEqual(slots, [(at(6, 16, 30), at(6, 17))])
+
+    def test_working_hours_are_clipped_to_range_and_skip_weekends(self):
+        # Friday 11:00 until Monday 12:00
+        windows = working_windows(at(10, 11), at(13, 12), "UTC", day_time(9), day_time(17))
+        self.assertEqual(windows, [(at(10, 11), at(10, 17)), (at(13, 9), at(13, 12))])
+
+        with_weekends = working_windows(at(10, 11), at(13, 12), "UTC", day_time(9), day_time(17), True)
+        self.assertEqual(len(with_weekends), 4)
+
+    def test_dst_transition_day(self):
+        # New York skips 02:00-03:00 on 2025-03-09, so midnight to 05:00 local is four hours long
+        start = datetime(2025, 3, 9, 0, tzinfo=timezone.utc)
+        end = datetime(2025, 3, 10, 0, tzinfo=timezone.utc)
+        windows = working_windows(start, end, "America/New_York", day_time(0), day_time(5), True)
+        self.assertEqual(windows, [
+            (datetime(2025, 3, 9, 5, tzinfo=timezone.utc), datetime(2025, 3, 9, 9, tzinfo=timezone.utc)),
+        ])
+
+        slots = compute_free_slots(
+            [], start, end, timedelta(hours=4), "America/New_York", day_time(9), day_time(17), True
+        )
+        self.assertEqual(slots, [
+            (datetime(2025, 3, 9, 13, tzinfo=timezone.utc), datetime(2025, 3, 9, 21, tzinfo=timezone.utc)),
+        ])
+
+def tool_chain(call_id: str, result: str) -> list:
+    return [
+        {"role": "assistant", "content": "", "tool_calls": [{"id": call_id, "function": {"name": "ListEvents"}}]},
+        {"role": "tool", "tool_call_id": call_id, "content": result},
+    ]
+
+class CompactionSplitTests(SimpleTestCase):
+    def setUp(self):
+        self.long_result = "x" * (TOOL_RESULT_MAX_CHARS * 2)
+        self.messages = [
+            {"role": "user", "content": "What is on today?"},
+            *tool_chain("call1", self.long_result),
+            {"role": "assistant", "content": "Two meetings."},
+            {"role": "user", "content": "Move the first one."},
+            *tool_chain("call2", self.long_result),
+            *tool_chain("call3", self.long_result),
+        ]
+
+    def test_split_moves_forward_to_next_user_message(self):
+        self.assertEqual(find_split(self.messages, 1), 4)
+        self.assertEqual(find_split(self.messages, 4), 4)
+
+    def test_trailing_tool_chain_is_not_split(self):
+        # The turn from index 4 on has no later user message; it stays whole
+        self.assertEqual(find_split(self.messages, 6), 4)
+        self.assertEqual(find_split(self.messages, len(self.messages)), 4)
+
+    def test_no_user_message_keeps_everything(self):
+        self.assertEqual(find_split(tool_chain("call1", "{}"), 1), 0)
+
+    def test_build_context_keeps_in_flight_turn_verbatim(self):
+        split = find_split(self.messages, 6)
+        context = build_context("Earlier summary", self.messages, 0, split)
+
+        self.assertEqual(context[0]["role"], "system")
+        self.assertTrue(context[3]["content"].endswith("...[truncated]"))
+        self.assertEqual(context[1 + split:], self.messages[split:])
+        self.assertEqual(context[-1]["content"], self.long_result)
+
+class PromptRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = PromptRegistry()
+        self.fetch_threads = []
+
+        def fetch(name, type, version, fallback):
+            self.fetch_threads.append(threading.current_thread())
+            return f"{name} prompt"
+
+        patchers = [
+            patch.object(self.registry, '_fetch', side_effect=fetch),
+            patch.object(self.registry, '_start_refresher'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_aget_fetches_off_the_event_loop_once(self):
+        async def run():
+            loop_thread = threading.current_thread()
+            first = await self.registry.aget("MainAgent_SystemContext", type="chat")
+            second = await self.registry.aget("MainAgent_SystemContext", type="chat")
+            return loop_thread, first, second
+
+        loop_thread, first, second = async_to_sync(run)()
+
+        self.assertEqual(first, "MainAgent_SystemContext prompt")
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.fetch_threads), 1)
+        self.assertIsNot(self.fetch_threads[0], loop_thread)
+        self.assertEqual(self.registry.stats()["hits"], 1)
+
+    def test_get_and_aget_share_the_cache(self):
+        self.registry.get("NamingAgent_SystemContext", type="chat")
+        async_to_sync(self.registry.aget)("NamingAgent_SystemContext", type="chat")
+        self.assertEqual(len(self.fetch_threads), 1)
+
+def batch_response(*parts) -> tuple:
+    """A multipart batch response for HttpMockSequence, one (status, body) part per request id"""
+    chunks = []
+    for request_id, (status, body) in enumerate(parts):
+        chunks.append(
+            "--batch_boundary\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <response-batch + {request_id}>\r\n\r\n"
+            f"HTTP/1.1 {status} Status\r\n"
+            "Content-Type: application/json\r\n\r\n"
+            f"{json.dumps(body)}\r\n"
+        )
+    chunks.append("--batch_boundary--")
+    return {"status": "200", "content-type": "multipart/mixed; boundary=batch_boundary"}, "".join(chunks)
+
+def calendar_service(token: str = "access"):
+    return build_from_document(get_discovery_document(), credentials=Credentials(token=token))
+
+class RequestBatcherTests(SimpleTestCase):
+    def setUp(self):
+        # Authorized connection per set of credentials, handed out by the patched _authorized_http
+        self.connections = {}
+        patcher = patch.object(calendar_client, '_authorized_http', side_effect=lambda creds: self.connections[id(creds)])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self, service, *responses):
+        http = self.connections[id(service._http.credentials)] = HttpMockSequence(list(responses))
+        return http
+
+    def get(self, service, event_id: str):
+        return service.events().get(calendarId='primary', eventId=event_id)
+
+    def test_concurrent_requests_share_one_round_trip(self):
+        service = calendar_service()
+        http = self.connect(service, batch_response((200, {"id": "a"}), (200, {"id": "b"})))
+
+        async def run():
+            with coalesce_requests():
+                return await asyncio.gather(execute(self.get(service, "a")), execute(self.get(service, "b")))
+
+        self.assertEqual(async_to_sync(run)(), [{"id": "a"}, {"id": "b"}])
+        self.assertEqual(http._iterable, [])
+
+    def test_errors_reach_only_their_own_caller(self):
+        service = calendar_service()
+        self.connect(service, batch_response((200, {"id": "a"}), (404, {"error": {"code": 404}})))
+
+        async def run():
+            with coalesce_requests():
+                return await asyncio.gather(
+                    execute(self.get(service, "a")), execute(self.get(service, "missing")), return_exceptions=True
+                )
+
+        found, missing = async_to_sync(run)()
+        self.assertEqual(found, {"id": "a"})
+        self.assertIsInstance(missing, HttpError)
+        self.assertEqual(missing.resp.status, 404)
+
+    def test_failed_batch_fails_every_caller(self):
+        service = calendar_service()
+        self.connect(service, ({"status": "500"}, b'{"error": {"code": 500}}'))
+
+        async def run():
+            with coalesce_requests():
+                return await asyncio.gather(
+                    execute(self.get(service, "a")), execute(self.get(service, "b")), return_exceptions=True
+                )
+
+        for result in async_to_sync(run)():
+            self.assertIsInstance(result, HttpError)
+            self.assertEqual(result.resp.status, 500)
+
+    def test_requests_of_different_users_are_batched_apart(self):
+        alice, bob = calendar_service("alice"), calendar_service("bob")
+        alice_http = self.connect(alice, ({"status": "200"}, b'{"id": "a"}'))
+        bob_http = self.connect(bob, ({"status": "200"}, b'{"id": "b"}'))
+
+        async def run():
+            batcher = RequestBatcher()
+            return await asyncio.gather(
+                batcher.submit(self.get(alice, "a")), batcher.submit(self.get(bob, "b"))
+            )
+
+        self.assertEqual(async_to_sync(run)(), [{"id": "a"}, {"id": "b"}])
+        self.assertEqual(alice_http._iterable, [])
+        self.assertEqual(bob_http._iterable, [])
+
+    def test_batch_refuses_mixed_credentials(self):
+        with self.assertRaises(ValueError):
+            _execute_batch_blocking([self.get(calendar_service("alice"), "a"), self.get(calendar_service("bob"), "b")])
+
+def http_error(status: int) -> HttpError:
+    return HttpError(httplib2.Response({'status': status}), b'{"error": {}}')
+
+class ConditionalRequestTests(SimpleTestCase):
+    def setUp(self):
+        self.service = calendar_service()
+        self.cache = ETagCache()
+        patcher = patch.object(calendar_client, 'etag_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_not_modified_serves_the_stored_response(self):
+        stored = {"id": "a", "etag": '"1"', "summary": "Standup"}
+        first = self.service.events().get(calendarId='primary', eventId='a')
+        second = self.service.events().get(calendarId='primary', eventId='a')
+
+        with patch.object(calendar_client, 'execute', AsyncMock(side_effect=[stored, http_error(304)])):
+            fetched = async_to_sync(execute_conditional)("token", first)
+            revalidated = async_to_sync(execute_conditional)("token", second)
+
+        self.assertNotIn('If-None-Match', first.headers)
+        self.assertEqual(second.headers['If-None-Match'], '"1"')
+        self.assertEqual(revalidated, stored)
+        # Callers get copies, so mutating one leaves the cached response alone
+        revalidated["summary"] = "Changed"
+        self.assertEqual(self.cache.get(("token", second.method, second.uri))["summary"], "Standup")
+        self.assertEqual(fetched, stored)
+        self.assertEqual(self.cache.stats()["not_modified"], 1)
+
+    def test_not_modified_without_stored_response_is_raised(self):
+        request = self.service.events().get(calendarId='primary', eventId='a')
+        with patch.object(calendar_client, 'execute', AsyncMock(side_effect=http_error(304))):
+            with self.assertRaises(HttpError):
+                async_to_sync(execute_conditional)("token", request)
+
+def stored_event(etag: str, **fields) -> dict:
+    event = {
+        "id": "a",
+        "etag": etag,
+        "summary": "[W] Review",
+        "colorId": "5",
+        "start": {"dateTime": "2025-01-06T10:00:00Z"},
+        "end": {"dateTime": "2025-01-06T11:00:00Z"},
+        "reminders": {"useDefault": True},
+    }
+    event.update(fields)
+    return event
+
+class EventDiffTests(SimpleTestCase):
+    def test_unchanged_event_has_no_diff(self):
+        desired = {
+            "id": "a",
+            "summary": "[W] Review",
+            "colorId": 5,
+            "start": {"dateTime": "2025-01-06T05:00:00-05:00", "timeZone": "America/New_York"},
+            "end": {"dateTime": "2025-01-06T11:00:00Z"},
+            "reminders": {"useDefault": True, "overrides": []},
+        }
+        self.assertEqual(event_diff(stored_event('"1"'), desired), {})
+
+    def test_reminder_overrides_compare_regardless_of_order(self):
+        current = stored_event('"1"', reminders={"useDefault": False, "overrides": [
+            {"method": "popup", "minutes": 10}, {"method": "email", "minutes": 60},
+        ]})
+        same = {"reminders": {"useDefault": False, "overrides": [
+            {"method": "email", "minutes": 60}, {"method": "popup", "minutes": 10},
+        ]}}
+        changed = {"reminders": {"useDefault": False, "overrides": [{"method": "popup", "minutes": 30}]}}
+
+        self.assertEqual(event_diff(current, same), {})
+        self.assertEqual(event_diff(current, changed), changed)
+
+    def test_switch_to_all_day_nulls_the_time(self):
+        changes = event_diff(stored_event('"1"'), {"start": {"date": "2025-01-06"}, "end": {"date": "2025-01-07"}})
+        self.assertEqual(changes["start"], {"date": "2025-01-06", "dateTime": None})
+        self.assertEqual(changes["end"], {"date": "2025-01-07", "dateTime": None})
+
+class ModifyEventTests(SimpleTestCase):
+    def setUp(self):
+        self.service = calendar_service()
+        self.execute = AsyncMock()
+        self.get_event = AsyncMock()
+        module = 'agent_service.toolbox.services.calendar'
+        patchers = [
+            patch(f'{module}.get_calendar_service', AsyncMock(return_value=self.service)),
+            patch(f'{module}.get_category_by_event', Mock(return_value={'cat_color_id': '5', 'cat_event_prefix': '[W]'})),
+            patch(f'{module}.get_event', self.get_event),
+            patch(f'{module}.execute', self.execute),
+            patch(f'{module}.write_through', Mock()),
+            patch(f'{module}.find_conflicts', AsyncMock(return_value=[])),
+            patch(f'{module}.conflict_index', Mock()),
+            patch(f'{module}.etag_cache', ETagCache()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def modify(self, **fields):
+        return async_to_sync(modify_event)("token", "a", {"summary": "Review", **fields})
+
+    def test_precondition_failure_retries_against_new_version(self):
+        moved = {"start": {"dateTime": "2025-01-06T12:00:00Z"}, "end": {"dateTime": "2025-01-06T13:00:00Z"}}
+        # Someone renamed the event between our read and our write
+        self.get_event.side_effect = [stored_event('"1"'), stored_event('"2"', summary="[W] Renamed")]
+        updated = stored_event('"3"', **moved)
+        self.execute.side_effect = [http_error(412), updated]
+
+        result = self.modify(**moved)
+
+        self.assertEqual(result["event_details"], updated)
+        first, second = [call.args[0] for call in self.execute.call_args_list]
+        self.assertEqual(first.headers['If-Match'], '"1"')
+        self.assertEqual(second.headers['If-Match'], '"2"')
+        self.assertEqual(set(json.loads(first.body)), {"start", "end"})
+        self.assertEqual(set(json.loads(second.body)), {"start", "end", "summary"})
+
+    def test_second_precondition_failure_is_raised(self):
+        self.get_event.side_effect = [stored_event('"1"'), stored_event('"2"')]
+        self.execute.side_effect = [http_error(412), http_error(412)]
+
+        with self.assertRaises(HttpError):
+            self.modify(start={"dateTime": "2025-01-06T12:00:00Z"})
+
+    def test_no_op_modify_skips_the_patch(self):
+        self.get_event.side_effect = [stored_event('"1"')]
+
+        result = self.modify(colorId=5, reminders={"useDefault": True})
+
+        self.execute.assert_not_called()
+        self.assertEqual(result["event_details"]["etag"], '"1"')
+
+def timed_event(event_id: str, start: datetime, end: datetime) -> dict:
+    return {"id": event_id, "start": {"dateTime": start.isoformat()}, "end": {"dateTime": end.isoformat()}}
+
+class ConflictIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = ConflictIndex()
+
+    def test_overlaps_across_calendars(self):
+        self.index.add("token", "primary", timed_event("a", at(6, 9), at(6, 10)))
+        self.index.add("token", "work", timed_event("b", at(6, 9, 30), at(6, 11)))
+        self.index.add("token", "work", timed_event("c", at(6, 11), at(6, 12)))
+
+        found = self.index.find("token", at(6, 9, 45), at(6, 11))
+        self.assertEqual([(event["calendarId"], event["id"]) for event in found], [("primary", "a"), ("work", "b")])
+        self.assertEqual(self.index.find("token", at(6, 9), at(6, 12), exclude_id="b")[1]["id"], "c")
+
+    def test_search_bound_shrinks_when_long_event_goes(self):
+        self.index.add("token", "primary", timed_event("trip", at(6, 0), at(10, 0)))
+        self.index.add("token", "primary", timed_event("a", at(6, 9), at(6, 10)))
+        self.index.add("token", "primary", timed_event("b", at(7, 9), at(7, 11)))
+        user = self.index._users["token"]
+        self.assertEqual(user.max_duration, timedelta(days=4))
+
+        self.index.remove("token", "primary", "trip")
+        self.assertEqual(user.max_duration, timedelta(hours=2))
+
+        # Moving the longest event shorter also lowers the bound
+        self.index.add("token", "primary", timed_event("b", at(7, 9), at(7, 9, 30)))
+        self.assertEqual(user.max_duration, timedelta(hours=1))
+        self.assertEqual([event["id"] for event in self.index.find("token", at(6, 9, 30), at(7, 9, 15))], ["a", "b"])
+
+def tool_call(call_id: str, name: str, **arguments) -> ChatCompletionMessageToolCall:
+    return ChatCompletionMessageToolCall(
+        id=call_id, type="function", function=Function(name=name, arguments=json.dumps(arguments))
+    )
+
+class ToolCallTests(SimpleTestCase):
+    def setUp(self):
+        self.running = 0
+        self.peak = 0
+
+        async def slow(delay: float, token: str):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            await asyncio.sleep(delay)
+            self.running -= 1
+            return {"slept": delay}
+
+        async def broken(token: str):
+            raise ValueError("calendar unavailable")
+
+        patcher = patch.dict(agent.tool_map, {"Slow": slow, "Broken": broken})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ws_client = Mock(send_message=AsyncMock())
+
+    def run_calls(self, calls):
+        messages = []
+        async_to_sync(agent.run_tool_calls)(calls, "token", messages, self.ws_client)
+        return messages
+
+    def test_results_are_recorded_in_call_order(self):
+        messages = self.run_calls([
+            tool_call("first", "Slow", delay=0.05),
+            tool_call("second", "Slow", delay=0.01),
+            tool_call("third", "Broken"),
+        ])
+
+        self.assertEqual([message["tool_call_id"] for message in messages], ["first", "second", "third"])
+        self.assertEqual(json.loads(messages[0]["content"]), {"slept": 0.05})
+        self.assertEqual(messages[2]["content"], "Error: calendar unavailable")
+        sent = [call.kwargs["message"]["tool_call_id"] for call in self.ws_client.send_message.call_args_list]
+        self.assertEqual(sent, ["first", "second", "third"])
+
+    def test_calls_run_concurrently_up_to_the_limit(self):
+        with patch.object(agent, 'TOOL_CONCURRENCY', 2):
+            self.run_calls([tool_call(f"call{index}", "Slow", delay=0.02) for index in range(5)])
+        self.assertEqual(self.peak, 2)
+
+    def test_unknown_tool_and_bad_arguments_become_errors(self):
+        bad_arguments = ChatCompletionMessageToolCall(
+            id="bad", type="function", function=Function(name="Slow", arguments="{not json")
+        )
+        messages = self.run_calls([tool_call("unknown", "Missing"), bad_arguments])
+        self.assertTrue(all(message["content"].startswith("Error:") for message in messages))
+
+class AgentExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = AgentExecutor(workers=1, concurrency=1, queue_size=1)
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+
+    async def blocked(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.gate.wait)
+        return "done"
+
+    def test_rejects_runs_beyond_workers_and_queue(self):
+        running = self.executor.submit(self.blocked)
+        queued = self.executor.submit(self.blocked)
+
+        self.assertFalse(self.executor.has_capacity())
+        with self.assertRaises(AgentQueueFull):
+            self.executor.submit(self.blocked)
+
+        self.gate.set()
+        self.assertEqual(running.result(timeout=5), "done")
+        self.assertEqual(queued.result(timeout=5), "done")
+        self.assertTrue(self.executor.has_capacity())
+        stats = self.executor.stats()
+        self.assertEqual((stats["submitted"], stats["rejected"], stats["completed"]), (2, 1, 2))
+
+    def test_failed_run_frees_its_slot(self):
+        async def broken():
+            raise RuntimeError("boom")
+
+        self.assertIsNone(self.executor.submit(broken).result(timeout=5))
+        self.assertEqual(self.executor.stats()["failed"], 1)
+        self.assertEqual(self.executor.stats()["running"], 0)
+
+class AgentAdmissionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(u_email="agent@example.com")
+        self.request = APIRequestFactory().post(
+            '/request/', {"token": str(self.user.u_id), "userPrompt": "Plan my week"}, format='json'
+        )
+        patcher = patch.object(
+            agent_view, 'create_blank_conversation',
+            side_effect=lambda user: Conversation.objects.create(u_id=user).c_id
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_full_executor_answers_503_before_creating_a_conversation(self):
+        with patch.object(agent_view, 'has_capacity', return_value=False):
+            response = agent_view.AgentView.as_view()(self.request)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data, agent_view.BUSY_RESPONSE)
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_queue_full_on_submit_answers_503_and_drops_the_conversation(self):
+        with patch.object(agent_view, 'has_capacity', return_value=True), \
+                patch.object(agent_view, 'process', side_effect=AgentQueueFull()):
+            response = agent_view.AgentView.as_view()(self.request)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_message_to_full_executor_answers_503(self):
+        request = APIRequestFactory().post(
+            '/message/', {"token": str(self.user.u_id), "userPrompt": "And next week?", "conversationId": 1},
+            format='json'
+        )
+        with patch.object(agent_view, 'process', side_effect=AgentQueueFull()):
+            response = agent_view.AgentMessageView.as_view()(request)
+        self.assertEqual(response.status_code, 503)
+
+class AgentJobTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(u_email="jobs@example.com")
+        self.conversation = Conversation.objects.create(u_id=user, c_last_seq=4)
+
+    def enqueue(self, **payload) -> AgentJob:
+        return enqueue_job(self.conversation.c_id, AgentJob.KIND_AGENT_ACTION, payload)
+
+    def expire_lease(self, job: AgentJob):
+        AgentJob.objects.filter(j_id=job.j_id).update(j_locked_until=django_timezone.now() - timedelta(seconds=1))
+
+    def test_claim_takes_due_jobs_in_order_and_leases_them(self):
+        first, second = self.enqueue(), self.enqueue()
+        AgentJob.objects.filter(j_id=second.j_id).update(j_run_after=django_timezone.now() + timedelta(minutes=5))
+
+        claimed = claim_jobs("worker-a", 5)
+
+        self.assertEqual([job.j_id for job in claimed], [first.j_id])
+        job = AgentJob.objects.get(j_id=first.j_id)
+        self.assertEqual((job.j_status, job.j_attempts, job.j_locked_by), (AgentJob.STATUS_RUNNING, 1, "worker-a"))
+        self.assertAlmostEqual(
+            job.j_locked_until, django_timezone.now() + timedelta(seconds=VISIBILITY_TIMEOUT), delta=timedelta(seconds=5)
+        )
+        # Leased and not yet due jobs are left alone
+        self.assertEqual(claim_jobs("worker-b", 5), [])
+
+    def test_claim_respects_limit(self):
+        for _ in range(3):
+            self.enqueue()
+        self.assertEqual(len(claim_jobs("worker-a", 2)), 2)
+        self.assertEqual(len(claim_jobs("worker-b", 2)), 1)
+
+    def test_heartbeat_extends_only_own_running_jobs(self):
+        job = self.enqueue()
+        claim_jobs("worker-a", 1)
+        self.expire_lease(job)
+
+        self.assertEqual(extend_job_leases([job.j_id], "worker-b"), 0)
+        self.assertEqual(extend_job_leases([job.j_id], "worker-a"), 1)
+        self.assertGreater(AgentJob.objects.get(j_id=job.j_id).j_locked_until, django_timezone.now())
+        self.assertEqual(claim_jobs("worker-b", 1), [])
+
+    def test_expired_lease_is_reclaimed_until_attempts_run_out(self):
+        job = self.enqueue(prompt="hi")
+        for attempt, worker in enumerate(["worker-a", "worker-b", "worker-c"], start=1):
+            claimed = claim_jobs(worker, 1)
+            self.assertEqual([(claimed_job.j_attempts, claimed_job.j_locked_by) for claimed_job in claimed], [(attempt, worker)])
+            self.expire_lease(job)
+
+        self.assertEqual(claim_jobs("worker-d", 1), [])
+        job.refresh_from_db()
+        self.assertEqual(job.j_status, AgentJob.STATUS_FAILED)
+        self.assertEqual(job.j_payload, {})
+
+    def test_failure_requeues_with_backoff_then_fails(self):
+        job = self.enqueue(prompt="hi")
+        claimed = claim_jobs("worker-a", 1)[0]
+
+        fail_job(claimed, "timeout")
+        job.refresh_from_db()
+        self.assertEqual(job.j_status, AgentJob.STATUS_QUEUED)
+        self.assertAlmostEqual(
+            job.j_run_after, django_timezone.now() + timedelta(seconds=RETRY_BACKOFF), delta=timedelta(seconds=5)
+        )
+
+        AgentJob.objects.filter(j_id=job.j_id).update(j_run_after=django_timezone.now(), j_attempts=job.j_max_attempts - 1)
+        last = claim_jobs("worker-a", 1)[0]
+        fail_job(last, "timeout")
+        job.refresh_from_db()
+        self.assertEqual((job.j_status, job.j_payload, job.j_error), (AgentJob.STATUS_FAILED, {}, "timeout"))
+
+    def test_stale_worker_cannot_complete_reclaimed_job(self):
+        job = self.enqueue(prompt="hi")
+        stale = claim_jobs("worker-a", 1)[0]
+        self.expire_lease(job)
+        current = claim_jobs("worker-b", 1)[0]
+
+        complete_job(stale)
+        self.assertEqual(AgentJob.objects.get(j_id=job.j_id).j_status, AgentJob.STATUS_RUNNING)
+        complete_job(current)
+        job.refresh_from_db()
+        self.assertEqual((job.j_status, job.j_payload), (AgentJob.STATUS_DONE, {}))
+
+    def test_retry_resumes_after_first_attempt_seq(self):
+        handler = AsyncMock(side_effect=[RuntimeError("crashed"), None])
+        job = self.enqueue(prompt="hi")
+
+        with patch.dict(jobs.JOB_HANDLERS, {AgentJob.KIND_AGENT_ACTION: handler}):
+            async_to_sync(jobs.run_job)(claim_jobs("worker-a", 1)[0])
+            # The first attempt wrote messages before crashing
+            Conversation.objects.filter(c_id=self.conversation.c_id).update(c_last_seq=9)
+            AgentJob.objects.filter(j_id=job.j_id).update(j_run_after=django_timezone.now())
+            async_to_sync(jobs.run_job)(claim_jobs("worker-a", 1)[0])
+
+        self.assertNotIn("resume_after_seq", handler.call_args_list[0].kwargs)
+        self.assertEqual(handler.call_args_list[1].kwargs, {"prompt": "hi", "resume_after_seq": 4})
+        self.assertEqual(AgentJob.objects.get(j_id=job.j_id).j_status, AgentJob.STATUS_DONE)
+
+def listed_event(index: int, **fields) -> dict:
+    event = {
+        'id': f"event{index}",
+        'description': 'No description.',
+        'location': 'No location.',
+        'attendees': [],
+        'summary': f"Meeting {index}",
+        'start': f"2025-01-06T{9 + index:02d}:00:00Z",
+        'end': f"2025-01-06T{10 + index:02d}:00:00Z",
+    }
+    event.update(fields)
+    return event
+
+class ToolResultEncodingTests(SimpleTestCase):
+    def test_records_become_a_table_without_empty_columns(self):
+        events = [listed_event(0), listed_event(1, location="Room 4", attendees=[{"email": "a@example.com"}, {"email": "b@example.com"}])]
+
+        table = json.loads(encode_tool_result(events))
+
+        self.assertEqual(table["columns"], ["id", "location", "attendees", "summary", "start", "end"])
+        self.assertEqual(table["rows"][0], ["event0", None, None, "Meeting 0", "2025-01-06T09:00:00Z", "2025-01-06T10:00:00Z"])
+        self.assertEqual(table["rows"][1][1:3], ["Room 4", "a@example.com,b@example.com"])
+        self.assertNotIn("truncated", table)
+        # The listing the frontend and the cache hold is not modified
+        self.assertEqual(events[0]["description"], "No description.")
+
+    def test_long_text_is_shortened(self):
+        table = encode_table([listed_event(0, description="word  " * TOOL_RESULT_TEXT_CHARS)])
+        description = table["rows"][0][table["columns"].index("description")]
+        self.assertEqual(len(description), TOOL_RESULT_TEXT_CHARS + 1)
+        self.assertTrue(description.endswith("…"))
+
+    def test_over_budget_drops_trailing_rows(self):
+        table = encode_table([listed_event(index) for index in range(10)])
+        full = fit_budget(table, 100000)
+        budget = len(full) // 2
+
+        fitted = fit_budget(table, budget)
+        decoded = json.loads(fitted)
+
+        self.assertLessEqual(len(fitted), budget)
+        self.assertEqual(decoded["rows"], table["rows"][:len(decoded["rows"])])
+        self.assertEqual(decoded["truncated"], 10 - len(decoded["rows"]))
+        self.assertGreater(len(decoded["rows"]), 0)
+
+    def test_other_results_keep_their_shape(self):
+        result = {"event_details": {"id": "a", "summary": "Review"}, "conflicts": []}
+        self.assertEqual(json.loads(encode_tool_result(result)), result)
+        self.assertEqual(encode_tool_result([]), "[]")
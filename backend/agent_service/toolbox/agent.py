@@ -5,10 +5,15 @@ import logging
 from dotenv import load_dotenv
 
 from agent_service.clients.conversation_ws import DBConversationWebSocketClient
-from .services.tools import tools, tool_map, get_environmental_context_prompt
+from .services.tools import tools, tool_map, get_environmental_context_prompt, WRITE_TOOLS
+from .services.compaction import compact_messages
+from .services.calendar_client import coalesce_requests
+from .services.encoding import encode_tool_result
 from agent_service.apps import AgentServiceConfig
-from app_lib.utils.conversations import fetch_previous_messages
+from app_lib.utils.conversations import fetch_previous_messages, fetch_messages_since
 from asgiref.sync import sync_to_async
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 
 from typing import List
 
@@ -16,17 +21,30 @@ from typing import List
 logger = logging.getLogger(__name__)
 load_dotenv()
 
-openai_client = AgentServiceConfig.openai_client
 MODEL = os.getenv('OPENAI_LLM_STANDARD')
+STREAMING = os.getenv('AGENT_STREAMING', 'true').lower() == 'true'
+TOOL_CONCURRENCY = int(os.getenv('AGENT_TOOL_CONCURRENCY', '4'))
 
-async def agent_action(prompt: str, images: List[str], token: str, conv_id: int, iana_timezone: str = "UTC"):
-    """Main agent execution with proper async handling"""
+async def agent_action(prompt: str, images: List[str], token: str, conv_id: int, iana_timezone: str = "UTC",
+                       resume_after_seq: int = None):
+    """
+    Main agent execution with proper async handling.
+
+    A retried job passes the conversation's seq from before its first attempt; whatever
+    that attempt already persisted is picked up instead of being sent and executed again.
+    """
     logger.info("Starting agent action for conversation %s", conv_id)
     
-    messages = get_environmental_context_prompt(iana_timezone)
-    
+    messages = await get_environmental_context_prompt(iana_timezone)
+
+    resumed = []
+    if resume_after_seq is not None:
+        resumed = await sync_to_async(fetch_messages_since)(conv_id, resume_after_seq)
+        logger.info(f"Resuming conversation {conv_id} with {len(resumed)} messages from the previous attempt.")
+
     # Get the new conversation id
     prev_messages = await sync_to_async(fetch_previous_messages)(conv_id)
+    prev_messages = await compact_messages(conv_id, prev_messages)
     for prev_message in prev_messages:
         messages.append(prev_message)
 
@@ -41,7 +59,8 @@ async def agent_action(prompt: str, images: List[str], token: str, conv_id: int,
             })
             logger.info(f"Image string: {image_string}")
 
-    messages.append({"role": "user", "content": message_content})
+    if not resumed:
+        messages.append({"role": "user", "content": message_content})
     for message in messages:
         if message["role"] == "assistant" and "tool_calls" in message:
             for index in range(len(message["tool_calls"])):
@@ -54,40 +73,37 @@ async def agent_action(prompt: str, images: List[str], token: str, conv_id: int,
         async with DBConversationWebSocketClient(conv_id) as ws_client:
             logger.debug("WebSocket connection established")
             
-            # Send initial message
-            await ws_client.send_message(
-                message_type='conversation_message',
-                message={"role": "user", "content": message_content}
-            )
+            if resumed:
+                done = await resume_turn(messages, token, ws_client)
+            else:
+                # Send initial message
+                await ws_client.send_message(
+                    message_type='conversation_message',
+                    message={"role": "user", "content": message_content}
+                )
+                done = False
 
-            done = False
             while not done:
                 logger.debug("Current conversation state: %s", messages)
                 
                 try:
-                    response = openai_client.chat.completions.create(
-                        model=MODEL,
-                        messages=messages,
-                        tools=tools,
-                        tool_choice="auto",
-                        temperature=0.0,
-                    )
+                    if STREAMING:
+                        content, tool_calls = await stream_completion(messages, ws_client)
+                    else:
+                        content, tool_calls = await request_completion(messages)
                 except Exception as e:
                     logger.error(f"API request failed: {e}", exc_info=True)
                     raise
-                
-                logger.debug("Received response: %s", response.choices)
 
-                for choice in response.choices:
-                    if choice.message.tool_calls:
-                        await handle_tool_calls(choice.message.tool_calls, token, messages, ws_client)
-                    else:
-                        await handle_assistant_response(choice.message.content, messages, ws_client)
-                        done = True
-                
-                if done:
-                    break
-                
+                if tool_calls:
+                    await handle_tool_calls(tool_calls, token, messages, ws_client)
+                else:
+                    await handle_assistant_response(content, messages, ws_client)
+                    done = True
+
+            # The consumer holds messages briefly to write them together; the turn is over
+            await ws_client.send_message(message_type='conversation_flush', message={})
+
             logger.info("Final conversation state: %s", messages)
             return messages
 
@@ -95,6 +111,74 @@ async def agent_action(prompt: str, images: List[str], token: str, conv_id: int,
         logger.error(f"Agent action failed: {e}", exc_info=True)
         raise
 
+async def request_completion(messages):
+    """Request a full completion without streaming"""
+    response = await AgentServiceConfig.get_async_openai_client().chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        temperature=0.0,
+    )
+    logger.debug("Received response: %s", response.choices)
+
+    message = response.choices[0].message
+    return message.content, message.tool_calls
+
+async def stream_completion(messages, ws_client):
+    """Stream a completion, forwarding content deltas as they arrive.
+
+    Returns the assembled content and tool calls; persisting them is left to the caller
+    so that the final message is written once.
+    """
+    stream = await AgentServiceConfig.get_async_openai_client().chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        temperature=0.0,
+        stream=True,
+    )
+
+    content_parts = []
+    tool_call_parts = {}
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            content_parts.append(delta.content)
+            try:
+                await ws_client.send_message(
+                    message_type='conversation_stream',
+                    message={"role": "assistant", "delta": delta.content}
+                )
+            except Exception as e:
+                logger.warning("Failed to forward stream delta: %s", str(e))
+
+        # Tool calls arrive as fragments keyed by their position in the final list
+        for tool_call_delta in delta.tool_calls or []:
+            part = tool_call_parts.setdefault(
+                tool_call_delta.index,
+                {"id": None, "type": "function", "name": "", "arguments": ""}
+            )
+            if tool_call_delta.id:
+                part["id"] = tool_call_delta.id
+            if tool_call_delta.function:
+                part["name"] += tool_call_delta.function.name or ""
+                part["arguments"] += tool_call_delta.function.arguments or ""
+
+    tool_calls = [
+        ChatCompletionMessageToolCall(
+            id=part["id"],
+            type=part["type"],
+            function=Function(name=part["name"], arguments=part["arguments"])
+        )
+        for _, part in sorted(tool_call_parts.items())
+    ]
+    return "".join(content_parts), tool_calls
+
 async def handle_tool_calls(tool_calls, token, messages, ws_client):
     """Handle tool call responses"""
     messages.append({
@@ -126,44 +210,106 @@ async def handle_tool_calls(tool_calls, token, messages, ws_client):
         logger.error(f"Failed to send tool call message: {e}", exc_info=True)
         raise
 
-    for call in tool_calls:
-        try:
-            tool_name = call.function.name
-            args = json.loads(call.function.arguments)
-            args['token'] = token
-            logger.info("Executing tool %s with args %s", tool_name, args)
-            
-            result = await tool_map[tool_name](**args)
-            logger.debug("Tool %s returned: %s", tool_name, result)
+    await run_tool_calls(tool_calls, token, messages, ws_client)
 
-            tool_response = {
-                "role": "tool",
-                "tool_call_id": call.id,
-                "content": json.dumps(result)
-            }
-            
-            messages.append(tool_response)
+async def run_tool_calls(tool_calls, token, messages, ws_client):
+    """Execute tool calls and record their results"""
+    # Independent tool calls run concurrently, but results are recorded in call order
+    # and their Calendar requests are coalesced into shared batch round trips
+    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+    with coalesce_requests():
+        results = await asyncio.gather(*[
+            execute_tool_call(call, token, semaphore) for call in tool_calls
+        ])
+
+    for call, (result, error) in zip(tool_calls, results):
+        if error is not None:
+            await handle_tool_error(call.id, error, messages, ws_client)
+            continue
+
+        tool_response = {
+            "role": "tool",
+            "tool_call_id": call.id,
+            "content": encode_tool_result(result)
+        }
+
+        messages.append(tool_response)
+        try:
             await ws_client.send_message(
                 message_type='conversation_message',
                 message=tool_response
             )
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON arguments: {str(e)}", exc_info=True)
-            await handle_tool_error(call.id, e, messages, ws_client)
-        except KeyError as e:
-            logger.error(f"Unknown tool {tool_name}", exc_info=True)
-            await handle_tool_error(call.id, e, messages, ws_client)
         except Exception as e:
-            logger.error(f"Tool execution error: {str(e)}", exc_info=True)
-            await handle_tool_error(call.id, e, messages, ws_client)
+            logger.error(f"Failed to send tool response: {e}", exc_info=True)
+
+async def resume_turn(messages, token, ws_client) -> bool:
+    """
+    Settle tool calls of the previous attempt that never got a result, and report whether
+    its turn already ended with an answer. Read-only calls run again; write calls may have
+    reached Google, so the model is told they were interrupted rather than repeating them.
+    """
+    last = messages[-1]
+    if last["role"] == "assistant" and not last.get("tool_calls"):
+        return True
+
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index]["role"] == "assistant" and messages[index].get("tool_calls"):
+            break
+    else:
+        return False
+
+    answered = {message.get("tool_call_id") for message in messages[index + 1:] if message["role"] == "tool"}
+    pending = [
+        ChatCompletionMessageToolCall.model_validate(call)
+        for call in messages[index]["tool_calls"] if call["id"] not in answered
+    ]
+    rerun = []
+    for call in pending:
+        if call.function.name in WRITE_TOOLS:
+            logger.warning(f"Tool call {call.id} ({call.function.name}) was interrupted, not replaying it.")
+            await handle_tool_error(
+                call.id,
+                "the previous attempt was interrupted while running this call, so it may or may not "
+                "have been applied. Check the calendar before trying again.",
+                messages,
+                ws_client
+            )
+        else:
+            rerun.append(call)
+
+    if rerun:
+        await run_tool_calls(rerun, token, messages, ws_client)
+    return False
+
+async def execute_tool_call(call, token, semaphore):
+    """Run a single tool call, returning its result and the error it raised, if any"""
+    tool_name = call.function.name
+    try:
+        args = json.loads(call.function.arguments)
+        args['token'] = token
+        logger.info("Executing tool %s with args %s", tool_name, args)
+
+        async with semaphore:
+            result = await tool_map[tool_name](**args)
+        logger.debug("Tool %s returned: %s", tool_name, result)
+        return result, None
+
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON arguments: {str(e)}", exc_info=True)
+        return None, e
+    except KeyError as e:
+        logger.error(f"Unknown tool {tool_name}", exc_info=True)
+        return None, e
+    except Exception as e:
+        logger.error(f"Tool execution error: {str(e)}", exc_info=True)
+        return None, e
 
 async def handle_tool_error(tool_call_id, error, messages, ws_client):
     """Handle tool execution errors"""
     error_response = {
         "role": "tool",
         "tool_call_id": tool_call_id,
-        "content": error
+        "content": f"Error: {error}"
     }
     
     messages.append(error_response)
@@ -193,15 +339,3 @@ async def handle_assistant_response(content, messages, ws_client):
     except Exception as e:
         logger.error(f"Failed to send assistant response: {e}", exc_info=True)
         raise
-
-def start_agent_action(prompt: str, images: List[int], token: str, conv_id: int, iana_timezone: str = "UTC"):
-    """Thread entry point with proper event loop handling"""
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(agent_action(prompt, images, token, conv_id, iana_timezone))
-    except Exception as e:
-        logger.error(f"Agent thread failed: {e}", exc_info=True)
-    finally:
-        if loop.is_running():
-            loop.close()
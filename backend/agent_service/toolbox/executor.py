@@ -0,0 +1,139 @@
+import os
+import asyncio
+import logging
+import threading
+from dotenv import load_dotenv
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+AGENT_WORKERS = int(os.getenv('AGENT_WORKERS', '2'))
+AGENT_WORKER_CONCURRENCY = int(os.getenv('AGENT_WORKER_CONCURRENCY', '32'))
+AGENT_QUEUE_SIZE = int(os.getenv('AGENT_QUEUE_SIZE', '256'))
+
+class AgentQueueFull(Exception):
+    """Raised when the executor cannot admit another agent run"""
+
+class AgentWorker:
+    """A long-lived thread running one event loop that multiplexes many agent coroutines"""
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.load = 0
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self._ready.set()
+        self.loop.run_forever()
+
+class AgentExecutor:
+    """
+    Fixed pool of event-loop workers for agent runs.
+
+    Each worker runs up to `concurrency` coroutines at once; further submissions wait in the
+    worker's queue. Once `queue_size` runs are waiting, new submissions are rejected with
+    AgentQueueFull so callers can answer with an admission-control response.
+    """
+
+    def __init__(self, workers: int = AGENT_WORKERS, concurrency: int = AGENT_WORKER_CONCURRENCY,
+                 queue_size: int = AGENT_QUEUE_SIZE):
+        self.workers = [AgentWorker(f"agent-worker-{index}", concurrency) for index in range(workers)]
+        self.queue_size = queue_size
+        self.capacity = workers * concurrency + queue_size
+
+        self._lock = threading.Lock()
+        self._started = False
+        self._queued = 0
+        self._running = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for worker in self.workers:
+                worker.start()
+            self._started = True
+            logger.info("Agent executor started with %s workers.", len(self.workers))
+
+    def has_capacity(self) -> bool:
+        with self._lock:
+            return self._queued + self._running < self.capacity
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Schedule `func(*args, **kwargs)` on the least loaded worker.
+
+        `func` must be a coroutine function; it is only called once the run is admitted.
+        Returns a concurrent.futures.Future for the run.
+        """
+        self.start()
+        with self._lock:
+            if self._queued + self._running >= self.capacity:
+                self._rejected += 1
+                raise AgentQueueFull("Agent executor queue is full.")
+
+            worker = min(self.workers, key=lambda w: w.load)
+            worker.load += 1
+            self._queued += 1
+            self._submitted += 1
+
+        return asyncio.run_coroutine_threadsafe(self._run(worker, func, args, kwargs), worker.loop)
+
+    async def _run(self, worker: AgentWorker, func, args, kwargs):
+        async with worker.semaphore:
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+
+            try:
+                result = await func(*args, **kwargs)
+                with self._lock:
+                    self._completed += 1
+                return result
+            except Exception as e:
+                logger.error(f"Agent run {func.__name__} failed: {e}", exc_info=True)
+                with self._lock:
+                    self._failed += 1
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    worker.load -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": len(self.workers),
+                "capacity": self.capacity,
+                "queued": self._queued,
+                "running": self._running,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_agent_executor() -> AgentExecutor:
+    """Return the process-wide agent executor, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = AgentExecutor()
+        return _executor
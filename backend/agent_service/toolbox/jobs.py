@@ -0,0 +1,90 @@
+import os
+import asyncio
+import logging
+import socket
+from dotenv import load_dotenv
+from asgiref.sync import sync_to_async
+
+from database_service.models import AgentJob
+from agent_service.toolbox.agent import agent_action
+from agent_service.toolbox.services.conversations import name_conversation
+from app_lib.utils.agent_jobs import (
+    claim_jobs, extend_job_leases, complete_job, fail_job, record_start_seq, VISIBILITY_TIMEOUT
+)
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+POLL_INTERVAL = float(os.getenv('AGENT_JOB_POLL_INTERVAL', '1.0'))
+
+# Each job kind maps to the coroutine function its payload is passed to as keyword arguments
+JOB_HANDLERS = {
+    AgentJob.KIND_AGENT_ACTION: agent_action,
+    AgentJob.KIND_CONVERSATION_NAME: name_conversation,
+}
+
+def worker_name(index: int = 0) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+async def run_job(job: AgentJob):
+    try:
+        handler = JOB_HANDLERS[job.j_kind]
+        payload = job.j_payload
+        if job.j_kind == AgentJob.KIND_AGENT_ACTION:
+            # Retries resume after what earlier attempts persisted rather than repeating their side effects
+            start_seq = await sync_to_async(record_start_seq)(job)
+            if job.j_attempts > 1:
+                payload = {**payload, "resume_after_seq": start_seq}
+        await handler(**payload)
+        await sync_to_async(complete_job)(job)
+        logger.info(f"Job {job.j_id} ({job.j_kind}) completed.")
+    except Exception as e:
+        logger.error(f"Job {job.j_id} ({job.j_kind}) failed: {e}", exc_info=True)
+        await sync_to_async(fail_job)(job, str(e))
+
+async def run_worker(worker_id: str, concurrency: int, stop_event: asyncio.Event, poll_interval: float = POLL_INTERVAL):
+    """
+    Claim and execute jobs until `stop_event` is set, keeping leases of running jobs alive.
+
+    On shutdown no new jobs are claimed and in-flight jobs are awaited; jobs cut short by
+    a crash are picked up again by any worker once their lease expires.
+    """
+    running = {}
+    heartbeat_interval = max(VISIBILITY_TIMEOUT / 3, 1)
+    loop = asyncio.get_running_loop()
+    last_heartbeat = loop.time()
+
+    logger.info(f"Agent job worker {worker_id} started with concurrency {concurrency}.")
+    while not stop_event.is_set():
+        claimed = []
+        free_slots = concurrency - len(running)
+        if free_slots > 0:
+            try:
+                claimed = await sync_to_async(claim_jobs)(worker_id, free_slots)
+            except Exception as e:
+                logger.error(f"Failed to claim jobs: {e}", exc_info=True)
+
+        for job in claimed:
+            task = asyncio.create_task(run_job(job))
+            running[job.j_id] = task
+            task.add_done_callback(lambda _, job_id=job.j_id: running.pop(job_id, None))
+
+        if loop.time() - last_heartbeat >= heartbeat_interval:
+            try:
+                await sync_to_async(extend_job_leases)(list(running), worker_id)
+            except Exception as e:
+                logger.error(f"Failed to extend job leases: {e}", exc_info=True)
+            last_heartbeat = loop.time()
+
+        if not claimed:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    while running:
+        logger.info(f"Worker {worker_id} waiting for {len(running)} running jobs.")
+        await asyncio.wait(list(running.values()), timeout=heartbeat_interval)
+        await sync_to_async(extend_job_leases)(list(running), worker_id)
+    logger.info(f"Agent job worker {worker_id} stopped.")
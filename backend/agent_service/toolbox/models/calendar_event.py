@@ -107,28 +107,94 @@ class CreateCalendarEvent(BaseModel):
         description="Identifier of the calendar where the event should be added (e.g., 'primary')."
     )
 
-class GetTodayEvents(BaseModel):
+class CreateCalendarEvents(BaseModel):
+    events: List[CalendarEvent] = Field(
+        ...,
+        description="The calendar events to be created, e.g. every session of a syllabus or schedule."
+    )
     calendarId: str = Field(
         ...,
-        description="Identifier of the calendar to fetch events from (e.g., 'primary')."
+        description="Identifier of the calendar where the events should be added (e.g., 'primary')."
+    )
+
+class GetTodayEvents(BaseModel):
+    calendarId: Union[str, List[str]] = Field(
+        ...,
+        description="Calendar to fetch events from (e.g., 'primary'), a list of calendar ids, or 'all' for every calendar of the user."
     )
 
 class GetTomorrowEvents(BaseModel):
-    calendarId: str = Field(
+    calendarId: Union[str, List[str]] = Field(
         ...,
-        description="Identifier of the calendar to fetch events from (e.g., 'primary')."
+        description="Calendar to fetch events from (e.g., 'primary'), a list of calendar ids, or 'all' for every calendar of the user."
     )
 
 class GetThisWeekEvents(BaseModel):
-    calendarId: str = Field(
+    calendarId: Union[str, List[str]] = Field(
         ...,
-        description="Identifier of the calendar to fetch events from (e.g., 'primary')."
+        description="Calendar to fetch events from (e.g., 'primary'), a list of calendar ids, or 'all' for every calendar of the user."
     )
 
 class GetNextWeekEvents(BaseModel):
-    calendarId: str = Field(
+    calendarId: Union[str, List[str]] = Field(
+        ...,
+        description="Calendar to fetch events from (e.g., 'primary'), a list of calendar ids, or 'all' for every calendar of the user."
+    )
+
+class GetEventsInRange(BaseModel):
+    start: str = Field(
+        ...,
+        description="Start of the range in RFC3339 format (e.g., '2025-02-10T00:00:00-05:00')."
+    )
+    end: str = Field(
+        ...,
+        description="End of the range in RFC3339 format (e.g., '2025-03-10T00:00:00-05:00'). Must be after start."
+    )
+    calendarId: Union[str, List[str]] = Field(
+        ...,
+        description="Calendar to fetch events from (e.g., 'primary'), a list of calendar ids, or 'all' for every calendar of the user."
+    )
+    maxResults: int = Field(
+        ...,
+        description="Maximum number of events to return, earliest first (e.g., 50). Keep it small for long ranges."
+    )
+
+class FindFreeSlots(BaseModel):
+    start: str = Field(
+        ...,
+        description="Start of the search range in RFC3339 format (e.g., '2025-02-10T00:00:00-05:00')."
+    )
+    end: str = Field(
+        ...,
+        description="End of the search range in RFC3339 format (e.g., '2025-02-17T00:00:00-05:00')."
+    )
+    durationMinutes: int = Field(
+        ...,
+        description="Minimum length of a free slot in minutes (e.g., 60)."
+    )
+    calendarIds: List[str] = Field(
+        ...,
+        description="Calendars whose events count as busy time (e.g., ['primary']), or ['all'] for every calendar of the user."
+    )
+    workingHoursStart: str = Field(
+        ...,
+        description="Local start of working hours in HH:MM format (e.g., '09:00')."
+    )
+    workingHoursEnd: str = Field(
+        ...,
+        description="Local end of working hours in HH:MM format (e.g., '17:00')."
+    )
+    timeZone: str = Field(
+        ...,
+        description="Time zone of the working hours in IANA format (e.g., 'America/New_York')."
+    )
+    includeWeekends: bool = Field(
+        ...,
+        description="Whether Saturdays and Sundays can be used."
+    )
+    maxResults: int = Field(
         ...,
-        description="Identifier of the calendar to fetch events from (e.g., 'primary')."
+        description="Maximum number of candidate slots to return (e.g., 5)."
     )
 
 class ModifyEvent(BaseModel):
@@ -138,7 +204,7 @@ class ModifyEvent(BaseModel):
     )
     modifiedEvent: CalendarEvent = Field(
         ...,
-        description="The calendar event details that replace the old event - like a PUT request."
+        description="The desired event details. Only fields that differ from the current event are changed; repeat unchanged values as they are."
     )
 
 class DeleteEvent(BaseModel):
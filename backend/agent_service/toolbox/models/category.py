@@ -1,4 +1,12 @@
+from typing import List
 from pydantic import BaseModel, Field
 
 class Category(BaseModel):
     cat_id: int = Field(..., title="Category ID")
+
+class EventCategory(BaseModel):
+    index: int = Field(..., title="Event index")
+    cat_id: int = Field(..., title="Category ID")
+
+class CategoryBatch(BaseModel):
+    categories: List[EventCategory] = Field(..., title="Category of each event")
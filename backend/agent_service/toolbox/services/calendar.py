@@ -1,52 +1,29 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
 import os
 from dotenv import load_dotenv
 from django.conf import settings
 from agent_service.toolbox.models.calendar_event import CalendarEvent
-from app_lib.utils.users import fetch_user
+from agent_service.toolbox.services.calendar_client import get_calendar_service, execute, execute_batch, execute_conditional, etag_cache, etag_key
+from googleapiclient.errors import HttpError
+from agent_service.toolbox.services.calendar_cache import event_cache, calendar_list_cache, invalidate_for_event, parse_event_time
+from agent_service.toolbox.services.conflicts import conflict_index, event_interval
+from app_lib.utils.calendar_mirror import query_mirror, write_through
+import heapq
+import asyncio
 import logging
+from itertools import islice
+from typing import List, Union
 from datetime import datetime, timedelta, timezone
-from agent_service.toolbox.services.categories import get_category_by_event
+from agent_service.toolbox.services.categories import get_category_by_event, get_categories_by_events
 from asgiref.sync import sync_to_async
 
 load_dotenv()
 CALENDAR = os.getenv('CALENDAR')
-GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
-GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
 BASE_DIR = settings.BASE_DIR
+MAX_PAGE_SIZE = 250
+MAX_RANGE_RESULTS = int(os.getenv('CALENDAR_MAX_RANGE_RESULTS', '500'))
 
 logger = logging.getLogger(__name__)
 
-async def get_calendar_service(token: str):
-    user = await sync_to_async(fetch_user)(token)
-    auth_data = user.u_google_auth
-    auth_data["client_id"] = GOOGLE_CLIENT_ID
-    auth_data["client_secret"] = GOOGLE_CLIENT_SECRET
-    creds = Credentials.from_authorized_user_info(auth_data)
-
-    if creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
-            # Update the u_google_auth attribute
-            user.u_google_auth = {
-                'token': creds.token,
-                'refresh_token': creds.refresh_token,
-                'token_uri': creds.token_uri,
-                'client_id': creds.client_id,
-                'client_secret': creds.client_secret,
-                'scopes': creds.scopes
-            }
-            await sync_to_async(user.save)()  # Save the updated user
-            logger.info("Token refreshed successfully.")
-        except Exception as e:
-            logger.error(f"Failed to refresh token: {e}", exc_info=True)
-
-    # Build calendar service
-    service = build('calendar', 'v3', credentials=creds)
-    return service
-
 def simplify_event(event):
     """Extract only essential information from event"""
     simplified = {
@@ -61,19 +38,223 @@ def simplify_event(event):
     return simplified
 
 async def create_event(event: CalendarEvent, token: str, calendarId: str = 'primary'):
-    color_category = get_category_by_event(event.get('summary', ''), event.get('description', ''), token)
+    color_category = await sync_to_async(get_category_by_event, thread_sensitive=False)(event.get('summary', ''), event.get('description', ''), token)
     logger.info(f"Color category: {color_category}")
 
     event['colorId'] = color_category['cat_color_id']
     event['summary'] = f"{color_category['cat_event_prefix']} {event['summary']}"
 
     service = await get_calendar_service(token)
-    event = service.events().insert(calendarId=calendarId, body=event).execute()
-    return event
+    event = await execute(service.events().insert(calendarId=calendarId, body=event))
+    remember_event(token, service, calendarId, event)
+    invalidate_for_event(token, calendarId, event)
+    await sync_to_async(write_through, thread_sensitive=False)(token, calendarId, event)
+
+    conflicts = await find_conflicts(token, calendarId, event)
+    conflict_index.add(token, calendarId, event)
+    return {"event_details": event, "conflicts": conflicts}
+
+async def create_events(token: str, events: list, calendarId: str = 'primary'):
+    """
+    Create many events with one classification call and batched inserts.
+
+    Every event gets its own entry in the result, so a failed insert does not hide
+    the ones that went through.
+    """
+    color_categories = await sync_to_async(get_categories_by_events, thread_sensitive=False)(
+        [(event.get('summary', ''), event.get('description', '')) for event in events], token
+    )
+    for event, color_category in zip(events, color_categories):
+        event['colorId'] = color_category['cat_color_id']
+        event['summary'] = f"{color_category['cat_event_prefix']} {event['summary']}"
 
-async def get_today_events(token: str, calendarId: str = 'primary'):
     service = await get_calendar_service(token)
-    
+    responses = await execute_batch([
+        service.events().insert(calendarId=calendarId, body=event) for event in events
+    ])
+
+    results = []
+    for index, (event, (created, error)) in enumerate(zip(events, responses)):
+        if error is not None or created is None:
+            logger.error(f"Failed to create event {event.get('summary')}: {error}")
+            results.append({"index": index, "status": "failed", "summary": event.get('summary'), "error": str(error)})
+            continue
+
+        remember_event(token, service, calendarId, created)
+        invalidate_for_event(token, calendarId, created)
+        await sync_to_async(write_through, thread_sensitive=False)(token, calendarId, created)
+        conflicts = await find_conflicts(token, calendarId, created)
+        conflict_index.add(token, calendarId, created)
+        results.append({"index": index, "status": "created", "event_details": created, "conflicts": conflicts})
+
+    created_count = sum(1 for result in results if result["status"] == "created")
+    logger.info(f"Created {created_count} of {len(events)} events in calendar {calendarId}.")
+    return {"created": created_count, "failed": len(events) - created_count, "results": results}
+
+async def find_conflicts(token: str, calendarId: str, event: dict):
+    """
+    Known events overlapping a written event: those in the conflict index across all
+    calendars, plus the fresh mirror of the written calendar.
+    """
+    interval = event_interval(event)
+    if interval is None:
+        return []
+    start, end = interval
+
+    conflicts = {
+        (conflict['calendarId'], conflict['id']): conflict
+        for conflict in conflict_index.find(token, start, end, exclude_id=event.get('id'))
+    }
+
+    mirrored = await sync_to_async(query_mirror, thread_sensitive=False)(token, calendarId, start, end)
+    for mirrored_event in mirrored or []:
+        if mirrored_event.get('id') != event.get('id') and event_interval(mirrored_event):
+            conflicts.setdefault((calendarId, mirrored_event.get('id')), {
+                'id': mirrored_event.get('id'),
+                'calendarId': calendarId,
+                'summary': mirrored_event.get('summary', 'No Title'),
+                'start': mirrored_event['start'].get('dateTime'),
+                'end': mirrored_event['end'].get('dateTime'),
+            })
+
+    if conflicts:
+        logger.info(f"Event {event.get('id')} overlaps {len(conflicts)} existing events.")
+    return sorted(conflicts.values(), key=lambda conflict: conflict['start'] or '')
+
+def to_rfc3339(value: datetime) -> str:
+    return value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+async def iter_events(token: str, service, calendarId: str, start: datetime, end: datetime, page_size: int = 250):
+    """Yield raw events of a time window page by page, following nextPageToken; unchanged pages come back as 304s"""
+    page_token = None
+    while True:
+        events_result = await execute_conditional(token, service.events().list(
+            calendarId=calendarId,
+            timeMin=to_rfc3339(start),
+            timeMax=to_rfc3339(end),
+            singleEvents=True,
+            orderBy='startTime',
+            maxResults=page_size,
+            pageToken=page_token
+        ))
+
+        for event in events_result.get('items', []):
+            yield event
+
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            return
+
+async def list_events(token: str, calendarId: str, start: datetime, end: datetime, max_results: int = None):
+    """
+    Simplified events of a calendar between two datetimes, at most `max_results` of them.
+
+    Served from the local mirror when it is fresh, then from the range cache, and only
+    then from Google, whose pages are consumed only until the result budget is reached.
+    """
+    start = start.astimezone(timezone.utc)
+    end = end.astimezone(timezone.utc)
+
+    mirrored = await sync_to_async(query_mirror, thread_sensitive=False)(token, calendarId, start, end, max_results)
+    if mirrored is not None:
+        simplified_events = [simplify_event(event) for event in mirrored]
+        if not max_results or len(simplified_events) < max_results:
+            conflict_index.replace_window(token, calendarId, start, end, simplified_events)
+        return simplified_events
+
+    cached = event_cache.get(token, calendarId, start, end)
+    if cached is not None:
+        return cached[:max_results]
+
+    service = await get_calendar_service(token)
+    page_size = min(max_results, MAX_PAGE_SIZE) if max_results else MAX_PAGE_SIZE
+
+    # Simplify events to only include essential information
+    simplified_events = []
+    complete = True
+    async for event in iter_events(token, service, calendarId, start, end, page_size):
+        simplified_events.append(simplify_event(event))
+        if max_results and len(simplified_events) >= max_results:
+            complete = False
+            break
+
+    # Only whole windows are cached, so a later call with a larger budget is not short-changed
+    if complete:
+        event_cache.put(token, calendarId, start, end, simplified_events)
+        conflict_index.replace_window(token, calendarId, start, end, simplified_events)
+
+    return simplified_events
+
+async def get_calendar_ids(token: str) -> list:
+    """Ids of every calendar in the user's calendar list, cached per user"""
+    calendar_ids = calendar_list_cache.get(token)
+    if calendar_ids is not None:
+        return calendar_ids
+
+    service = await get_calendar_service(token)
+    calendar_ids = []
+    page_token = None
+    while True:
+        result = await execute_conditional(token, service.calendarList().list(pageToken=page_token))
+        calendar_ids += [calendar['id'] for calendar in result.get('items', []) if not calendar.get('deleted')]
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            break
+
+    calendar_list_cache.put(token, calendar_ids)
+    return calendar_ids
+
+async def resolve_calendar_ids(token: str, calendarId: Union[str, List[str]]) -> list:
+    """Expand a calendar id, a list of ids or 'all' into a list of distinct ids"""
+    requested = [calendarId] if isinstance(calendarId, str) else list(calendarId or ['primary'])
+    calendar_ids = []
+    for calendar_id in requested:
+        expanded = await get_calendar_ids(token) if calendar_id == 'all' else [calendar_id]
+        calendar_ids += [expanded_id for expanded_id in expanded if expanded_id not in calendar_ids]
+    return calendar_ids
+
+def _start_key(event: dict) -> datetime:
+    return parse_event_time(event.get('start')) or datetime.min.replace(tzinfo=timezone.utc)
+
+async def list_calendars_events(token: str, calendarId: Union[str, List[str]], start: datetime, end: datetime,
+                                max_results: int = None):
+    """
+    Simplified events of one or more calendars in one time-ordered list.
+
+    Calendars are fetched concurrently and their already sorted results are k-way
+    merged; with several calendars every event is tagged with its calendarId.
+    """
+    calendar_ids = await resolve_calendar_ids(token, calendarId)
+    if len(calendar_ids) == 1:
+        return await list_events(token, calendar_ids[0], start, end, max_results)
+
+    per_calendar = await asyncio.gather(*[
+        list_events(token, calendar_id, start, end, max_results) for calendar_id in calendar_ids
+    ])
+    tagged = [
+        [{**event, 'calendarId': calendar_id} for event in events]
+        for calendar_id, events in zip(calendar_ids, per_calendar)
+    ]
+
+    # An event shared between calendars is listed once, under the first calendar that has it
+    seen = set()
+    merged = (
+        event for event in heapq.merge(*tagged, key=_start_key)
+        if not (event['id'] in seen or seen.add(event['id']))
+    )
+    return list(islice(merged, max_results))
+
+async def get_events_in_range(token: str, start: str, end: str, calendarId: Union[str, List[str]] = 'primary', maxResults: int = 250):
+    start_datetime = parse_event_time(start)
+    end_datetime = parse_event_time(end)
+    if start_datetime is None or end_datetime is None:
+        raise ValueError("start and end must be RFC3339 timestamps or dates.")
+    if end_datetime <= start_datetime:
+        raise ValueError("end must be after start.")
+
+    return await list_calendars_events(token, calendarId, start_datetime, end_datetime, max(1, min(maxResults, MAX_RANGE_RESULTS)))
+
+async def get_today_events(token: str, calendarId: Union[str, List[str]] = 'primary'):
     # Get current date in the correct timezone
     now = datetime.now()
     today = now.date()
@@ -82,54 +263,18 @@ async def get_today_events(token: str, calendarId: str = 'primary'):
     start_of_day = datetime.combine(today, datetime.min.time())
     end_of_day = datetime.combine(today, datetime.max.time())
     
-    # Format to RFC3339 timestamp
-    start_time_str = start_of_day.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
-    end_time_str = end_of_day.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
-    
-    # Call the Calendar API
-    events_result = service.events().list(
-        calendarId=calendarId,
-        timeMin=start_time_str,
-        timeMax=end_time_str,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    
-    events = events_result.get('items', [])
-    
-    # Simplify events to only include essential information
-    simplified_events = [simplify_event(event) for event in events]
-    
-    return simplified_events
+    return await list_calendars_events(token, calendarId, start_of_day, end_of_day)
 
-async def get_tomorrow_events(token: str, calendarId: str = 'primary'):
-    service = await get_calendar_service(token)
-    
+async def get_tomorrow_events(token: str, calendarId: Union[str, List[str]] = 'primary'):
     now = datetime.now()
     tomorrow = now.date() + timedelta(days=1)
     
     start_of_day = datetime.combine(tomorrow, datetime.min.time())
     end_of_day = datetime.combine(tomorrow, datetime.max.time())
     
-    start_time_str = start_of_day.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
-    end_time_str = end_of_day.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
-    
-    events_result = service.events().list(
-        calendarId=calendarId,
-        timeMin=start_time_str,
-        timeMax=end_time_str,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    
-    events = events_result.get('items', [])
-    simplified_events = [simplify_event(event) for event in events]
-    
-    return simplified_events
-    
-async def get_this_week_events(token: str, calendarId: str = 'primary'):
-    service = await get_calendar_service(token)
+    return await list_calendars_events(token, calendarId, start_of_day, end_of_day)
     
+async def get_this_week_events(token: str, calendarId: Union[str, List[str]] = 'primary'):
     # Get current date
     now = datetime.now()
     today = now.date()
@@ -141,29 +286,9 @@ async def get_this_week_events(token: str, calendarId: str = 'primary'):
     start_datetime = datetime.combine(start_of_week, datetime.min.time())
     end_datetime = datetime.combine(end_of_week, datetime.max.time())
     
-    # Format to RFC3339 timestamp
-    start_time_str = start_datetime.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
-    end_time_str = end_datetime.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
-    
-    # Call the Calendar API
-    events_result = service.events().list(
-        calendarId=calendarId,
-        timeMin=start_time_str,
-        timeMax=end_time_str,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    
-    events = events_result.get('items', [])
-    
-    # Simplify events to only include essential information
-    simplified_events = [simplify_event(event) for event in events]
-    
-    return simplified_events
-
-async def get_next_week_events(token: str, calendarId: str = 'primary'):
-    service = await get_calendar_service(token)
+    return await list_calendars_events(token, calendarId, start_datetime, end_datetime)
 
+async def get_next_week_events(token: str, calendarId: Union[str, List[str]] = 'primary'):
     now = datetime.now()
     today = now.date()
 
@@ -174,35 +299,94 @@ async def get_next_week_events(token: str, calendarId: str = 'primary'):
     start_datetime = datetime.combine(start_of_next_week, datetime.min.time())
     end_datetime = datetime.combine(end_of_next_week, datetime.max.time())
 
-    start_time_str = start_datetime.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
-    end_time_str = end_datetime.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+    return await list_calendars_events(token, calendarId, start_datetime, end_datetime)
 
-    events_result = service.events().list(
-        calendarId=calendarId,
-        timeMin=start_time_str,
-        timeMax=end_time_str,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
+def remember_event(token: str, service, calendarId: str, event: dict):
+    """Keep a written event as the known version of its GET, so the next read can be conditional"""
+    etag_cache.put(etag_key(token, service.events().get(calendarId=calendarId, eventId=event['id'])), event)
 
-    events = events_result.get('items', [])
-    simplified_events = [simplify_event(event) for event in events]
+async def get_event(token: str, service, calendarId: str, eventId: str):
+    return await execute_conditional(token, service.events().get(calendarId=calendarId, eventId=eventId))
 
-    return simplified_events
+def _comparable(field: str, value):
+    if field == 'attendees':
+        return sorted((attendee.get('email') or '').lower() for attendee in value or [])
+    if field in ('start', 'end'):
+        return (value or {}).get('date') or parse_event_time(value)
+    if field == 'reminders':
+        # Google omits reminders, or overrides, on events that use the calendar's defaults
+        value = value or {'useDefault': True}
+        if value.get('useDefault'):
+            return True
+        return sorted((override.get('method'), int(override.get('minutes', 0))) for override in value.get('overrides') or [])
+    if field == 'colorId':
+        return str(value) if value else None
+    return value or None
+
+def _replace_time(current: dict, desired: dict) -> dict:
+    """
+    PATCH merges nested objects, so a start or end switching between all-day and timed
+    must null the keys of the kind it replaces, or Google gets both a date and a dateTime
+    """
+    replaced = dict(desired or {})
+    for key in ('date', 'dateTime', 'timeZone'):
+        if key in (current or {}) and key not in replaced:
+            replaced[key] = None
+    return replaced
+
+def event_diff(current: dict, desired: dict) -> dict:
+    """Fields of `desired` whose value differs from the current version of the event"""
+    changes = {
+        field: value for field, value in desired.items()
+        if field != 'id' and _comparable(field, value) != _comparable(field, current.get(field))
+    }
+    for field in ('start', 'end'):
+        if field in changes:
+            changes[field] = _replace_time(current.get(field), changes[field])
+    return changes
 
 async def modify_event(token: str, eventId: str, modifiedEvent: CalendarEvent, calendarId: str = 'primary'):
     service = await get_calendar_service(token)
 
-    modifiedEvent['id'] = eventId
-    
-    color_category = get_category_by_event(modifiedEvent.get('summary', ''), modifiedEvent.get('description', ''), token)
+    color_category = await sync_to_async(get_category_by_event, thread_sensitive=False)(modifiedEvent.get('summary', ''), modifiedEvent.get('description', ''), token)
     logger.info(f"Color category: {color_category}")
 
     modifiedEvent['colorId'] = color_category['cat_color_id']
     modifiedEvent['summary'] = f"{color_category['cat_event_prefix']} {modifiedEvent['summary']}"
 
-    return service.events().update(calendarId=calendarId, eventId=eventId, body=modifiedEvent).execute()
+    # Send only what changed, guarded by the ETag it was computed against; if someone
+    # else changed the event in between, diff against their version and try once more
+    for attempt in range(2):
+        current = await get_event(token, service, calendarId, eventId)
+        changes = event_diff(current, modifiedEvent)
+        if not changes:
+            logger.info(f"Event {eventId} already matches the requested changes.")
+            updated = current
+            break
+
+        request = service.events().patch(calendarId=calendarId, eventId=eventId, body=changes)
+        request.headers['If-Match'] = current['etag']
+        try:
+            updated = await execute(request)
+            break
+        except HttpError as e:
+            if e.resp.status != 412 or attempt:
+                raise
+            logger.warning(f"Event {eventId} changed concurrently, retrying against the new version.")
+
+    logger.info(f"Patched event {eventId}: {sorted(changes)}")
+    remember_event(token, service, calendarId, updated)
+    invalidate_for_event(token, calendarId, updated, eventId)
+    await sync_to_async(write_through, thread_sensitive=False)(token, calendarId, updated)
+
+    conflicts = await find_conflicts(token, calendarId, updated)
+    conflict_index.add(token, calendarId, updated)
+    return {"event_details": updated, "conflicts": conflicts}
 
 async def delete_event(token: str, eventId: str, calendarId: str = 'primary'):
     service = await get_calendar_service(token)
-    return service.events().delete(calendarId=calendarId, eventId=eventId).execute()
+    result = await execute(service.events().delete(calendarId=calendarId, eventId=eventId))
+    invalidate_for_event(token, calendarId, event_id=eventId)
+    await sync_to_async(write_through, thread_sensitive=False)(token, calendarId, deleted_event_id=eventId)
+    conflict_index.remove(token, calendarId, eventId)
+    return result
@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+CALENDAR_CACHE_TTL = int(os.getenv('CALENDAR_CACHE_TTL', '60'))
+CALENDAR_CACHE_SIZE = int(os.getenv('CALENDAR_CACHE_SIZE', '1024'))
+CALENDAR_LIST_TTL = int(os.getenv('CALENDAR_LIST_TTL', '600'))
+
+logger = logging.getLogger(__name__)
+
+def parse_event_time(value) -> datetime:
+    """Parse an RFC3339 dateTime or an all-day date into an aware UTC datetime"""
+    if isinstance(value, dict):
+        value = value.get('dateTime') or value.get('date')
+    if not value or value == 'Unknown':
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+class EventRangeCache:
+    """
+    Short-lived cache of simplified events per user, calendar and time window.
+
+    Writes invalidate only the windows they can affect: windows overlapping the event's
+    new interval and windows that already contained the event.
+    """
+
+    def __init__(self, ttl: int = CALENDAR_CACHE_TTL, max_size: int = CALENDAR_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, token: str, calendar_id: str, start: datetime, end: datetime):
+        key = (token, calendar_id, start, end)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry["expires_at"] <= time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return list(entry["events"])
+
+    def put(self, token: str, calendar_id: str, start: datetime, end: datetime, events: list):
+        key = (token, calendar_id, start, end)
+        with self._lock:
+            self._entries[key] = {
+                "events": list(events),
+                "event_ids": {event.get('id') for event in events},
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, token: str, calendar_id: str, start: datetime = None, end: datetime = None,
+                   event_id: str = None, everything: bool = False):
+        """
+        Drop cached windows of one calendar affected by a write.
+
+        A window is dropped when it overlaps [start, end), when it contains `event_id`,
+        or unconditionally with `everything` (e.g. recurring events).
+        """
+        with self._lock:
+            stale = []
+            for key, entry in self._entries.items():
+                entry_token, entry_calendar, entry_start, entry_end = key
+                if entry_token != token or entry_calendar != calendar_id:
+                    continue
+                overlaps = start is not None and end is not None and entry_start < end and start < entry_end
+                if everything or overlaps or (event_id and event_id in entry["event_ids"]):
+                    stale.append(key)
+
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+
+        if stale:
+            logger.debug(f"Invalidated {len(stale)} cached windows of calendar {calendar_id}.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "expirations": self._expirations,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+event_cache = EventRangeCache()
+
+class CalendarListCache:
+    """Calendar ids of each user, kept for CALENDAR_LIST_TTL seconds"""
+
+    def __init__(self, ttl: int = CALENDAR_LIST_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            return list(entry[0])
+
+    def put(self, token: str, calendar_ids: list):
+        with self._lock:
+            self._entries[token] = (list(calendar_ids), time.monotonic() + self.ttl)
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+calendar_list_cache = CalendarListCache()
+
+def invalidate_for_event(token: str, calendar_id: str, event: dict = None, event_id: str = None):
+    """Invalidate the windows a created, modified or deleted event can affect"""
+    event = event or {}
+    if event.get('recurrence'):
+        event_cache.invalidate(token, calendar_id, everything=True)
+        return
+
+    start = parse_event_time(event.get('start'))
+    end = parse_event_time(event.get('end'))
+    # All-day dates carry no timezone, so widen them to cover every offset
+    if start and not (event.get('start') or {}).get('dateTime'):
+        start -= timedelta(days=1)
+    if end and not (event.get('end') or {}).get('dateTime'):
+        end += timedelta(days=1)
+
+    event_cache.invalidate(token, calendar_id, start=start, end=end, event_id=event_id or event.get('id'))
@@ -0,0 +1,424 @@
+import os
+import copy
+import json
+import asyncio
+import logging
+import functools
+import threading
+import weakref
+import contextlib
+import contextvars
+import httplib2
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+from google.auth.exceptions import RefreshError
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import BatchHttpRequest
+from googleapiclient.errors import HttpError
+from asgiref.sync import sync_to_async
+from app_lib.utils.users import fetch_user, update_google_auth
+
+load_dotenv()
+GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
+GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
+SERVICE_CACHE_SIZE = int(os.getenv('CALENDAR_SERVICE_CACHE_SIZE', '256'))
+# Refresh access tokens this long before they expire instead of after a failed call
+TOKEN_REFRESH_MARGIN = timedelta(seconds=int(os.getenv('GOOGLE_TOKEN_REFRESH_MARGIN', '300')))
+CALENDAR_IO_THREADS = int(os.getenv('CALENDAR_IO_THREADS', '16'))
+# How long a tool turn waits for more Calendar calls before sending them as one batch
+CALENDAR_BATCH_WINDOW = int(os.getenv('CALENDAR_BATCH_WINDOW_MS', '10')) / 1000
+CALENDAR_BATCH_URI = "https://www.googleapis.com/batch/calendar/v3"
+ETAG_CACHE_SIZE = int(os.getenv('CALENDAR_ETAG_CACHE_SIZE', '2048'))
+
+logger = logging.getLogger(__name__)
+
+# Blocking googleapiclient calls run here so a slow Google response never stalls an event loop
+io_pool = ThreadPoolExecutor(max_workers=CALENDAR_IO_THREADS, thread_name_prefix="calendar-io")
+_thread_local = threading.local()
+
+@functools.lru_cache(maxsize=None)
+def get_discovery_document() -> dict:
+    """Calendar v3 discovery document, parsed once per process"""
+    return json.loads(get_static_doc('calendar', 'v3'))
+
+class CalendarServiceCache:
+    """LRU cache of per-user credentials and Calendar service objects"""
+
+    def __init__(self, max_size: int = SERVICE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self._hits += 1
+            return entry
+
+    def put(self, token: str, creds: Credentials, service):
+        with self._lock:
+            self._entries[token] = (creds, service)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, token: str):
+        with self._lock:
+            if self._entries.pop(token, None) is not None:
+                self._invalidations += 1
+
+    def invalidate_credentials(self, creds: Credentials):
+        """Drop the entry built from `creds`, for callers that only hold a request"""
+        with self._lock:
+            for token, entry in list(self._entries.items()):
+                if entry[0] is creds:
+                    del self._entries[token]
+                    self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+service_cache = CalendarServiceCache()
+
+def needs_refresh(creds: Credentials) -> bool:
+    if not creds.refresh_token:
+        return False
+    if creds.expiry is None:
+        return not creds.token
+    # google-auth keeps expiry as naive UTC
+    return creds.expiry - datetime.utcnow() < TOKEN_REFRESH_MARGIN
+
+async def refresh_credentials(token: str, creds: Credentials) -> bool:
+    try:
+        await sync_to_async(creds.refresh, thread_sensitive=False)(Request())
+        await sync_to_async(update_google_auth)(token, {
+            'token': creds.token,
+            'refresh_token': creds.refresh_token,
+            'token_uri': creds.token_uri,
+            'client_id': creds.client_id,
+            'client_secret': creds.client_secret,
+            'scopes': creds.scopes
+        })
+        logger.info("Token refreshed successfully.")
+        return True
+    except Exception as e:
+        # The stored grant may have been replaced by a new sign-in; reload it on the next call
+        service_cache.invalidate(token)
+        logger.error(f"Failed to refresh token: {e}", exc_info=True)
+        return False
+
+async def get_calendar_service(token: str):
+    """Return the cached Calendar service for a user, refreshing credentials ahead of expiry"""
+    entry = service_cache.get(token)
+    if entry:
+        creds, service = entry
+        if needs_refresh(creds):
+            await refresh_credentials(token, creds)
+        return service
+
+    user = await sync_to_async(fetch_user)(token)
+    auth_data = dict(user.u_google_auth)
+    auth_data["client_id"] = GOOGLE_CLIENT_ID
+    auth_data["client_secret"] = GOOGLE_CLIENT_SECRET
+    creds = Credentials.from_authorized_user_info(auth_data)
+
+    refreshed = await refresh_credentials(token, creds) if needs_refresh(creds) else True
+
+    service = build_from_document(get_discovery_document(), credentials=creds)
+    if refreshed:
+        service_cache.put(token, creds, service)
+    return service
+
+def _authorized_http(creds: Credentials) -> AuthorizedHttp:
+    """
+    Per-thread HTTP client for a set of credentials.
+
+    httplib2 connections are not thread-safe, so each pool thread keeps its own
+    keep-alive connection per user instead of sharing the one built into the service.
+    """
+    clients = getattr(_thread_local, "clients", None)
+    if clients is None:
+        clients = _thread_local.clients = weakref.WeakKeyDictionary()
+
+    http = clients.get(creds)
+    if http is None:
+        http = clients[creds] = AuthorizedHttp(creds, http=httplib2.Http())
+    return http
+
+def _execute_blocking(request):
+    return request.execute(http=_authorized_http(request.http.credentials))
+
+async def execute(request):
+    """
+    Execute a googleapiclient request on the calendar I/O pool.
+
+    Inside coalesce_requests() the request is handed to the turn's batcher instead and
+    may share one HTTP round trip with the other calls issued at the same time.
+    """
+    try:
+        batcher = _current_batcher.get()
+        if batcher is not None:
+            return await batcher.submit(request)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(io_pool, _execute_blocking, request)
+    except (HttpError, RefreshError) as e:
+        evict_on_auth_error(request, e)
+        raise
+
+def evict_on_auth_error(request, error: Exception):
+    """Forget the cached service of credentials Google no longer accepts"""
+    if isinstance(error, RefreshError) or (isinstance(error, HttpError) and error.resp.status == 401):
+        logger.warning(f"Calendar credentials were rejected, dropping the cached service: {error}")
+        service_cache.invalidate_credentials(request.http.credentials)
+
+# Google Calendar accepts at most 50 calls per batch request
+MAX_BATCH_SIZE = 50
+
+def _execute_batch_blocking(requests: list) -> list:
+    # The batch goes out on one authorized connection, so it can only carry one user's calls
+    creds = requests[0].http.credentials
+    if any(request.http.credentials is not creds for request in requests):
+        raise ValueError("Requests of a batch must share the same credentials")
+
+    results = [None] * len(requests)
+
+    def callback(request_id, response, exception):
+        results[int(request_id)] = (response, exception)
+
+    http = _authorized_http(creds)
+    for offset in range(0, len(requests), MAX_BATCH_SIZE):
+        chunk = range(offset, min(offset + MAX_BATCH_SIZE, len(requests)))
+        batch = BatchHttpRequest(callback=callback, batch_uri=CALENDAR_BATCH_URI)
+        for index in chunk:
+            batch.add(requests[index], request_id=str(index))
+        try:
+            batch.execute(http=http)
+        except Exception as e:
+            # The whole chunk failed to go through; report it against each of its calls
+            logger.error(f"Batch request failed: {e}")
+            for index in chunk:
+                results[index] = results[index] or (None, e)
+    return results
+
+async def execute_batch(requests: list) -> list:
+    """
+    Execute googleapiclient requests as multipart batches of up to MAX_BATCH_SIZE calls.
+
+    Returns a (response, exception) pair per request, in order, so callers can report
+    partial failures.
+    """
+    if not requests:
+        return []
+    loop = asyncio.get_running_loop()
+    try:
+        results = await loop.run_in_executor(io_pool, _execute_batch_blocking, requests)
+    except (HttpError, RefreshError) as e:
+        evict_on_auth_error(requests[0], e)
+        raise
+    for request, (_, exception) in zip(requests, results):
+        if exception is not None:
+            evict_on_auth_error(request, exception)
+    return results
+
+class BatchStats:
+    """Process-wide counters of coalesced Calendar requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._sizes = {}
+
+    def record(self, size: int):
+        with self._lock:
+            self._batches += 1
+            self._requests += size
+            self._sizes[size] = self._sizes.get(size, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "window_ms": int(CALENDAR_BATCH_WINDOW * 1000),
+                "round_trips": self._batches,
+                "requests": self._requests,
+                "saved_round_trips": self._requests - self._batches,
+                "avg_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+                "batch_sizes": dict(sorted(self._sizes.items())),
+            }
+
+batch_stats = BatchStats()
+
+class RequestBatcher:
+    """
+    Collects the Calendar requests of one agent turn that are issued within a short
+    window and sends them as a single multipart batch, resolving each caller's future
+    with its own response or error. Requests are grouped by the credentials they were
+    built with, one batch per group.
+    """
+
+    def __init__(self, window: float = CALENDAR_BATCH_WINDOW):
+        self.window = window
+        # id(credentials) -> [(request, future)]
+        self._pending = {}
+        self._flush_handle = None
+
+    def submit(self, request) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        group = self._pending.setdefault(id(request.http.credentials), [])
+        group.append((request, future))
+
+        if len(group) >= MAX_BATCH_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        groups, self._pending = self._pending, {}
+        for pending in groups.values():
+            asyncio.get_running_loop().create_task(self._send(pending))
+
+    async def _send(self, pending: list):
+        loop = asyncio.get_running_loop()
+        requests = [request for request, _ in pending]
+        batch_stats.record(len(requests))
+
+        if len(requests) == 1:
+            # A lone request goes out as is, without the multipart envelope
+            try:
+                results = [(await loop.run_in_executor(io_pool, _execute_blocking, requests[0]), None)]
+            except Exception as e:
+                results = [(None, e)]
+        else:
+            try:
+                results = await loop.run_in_executor(io_pool, _execute_batch_blocking, requests)
+            except Exception as e:
+                results = [(None, e)] * len(requests)
+
+        for (_, future), (response, error) in zip(pending, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(response)
+
+_current_batcher = contextvars.ContextVar("calendar_request_batcher", default=None)
+
+@contextlib.contextmanager
+def coalesce_requests():
+    """Route the Calendar requests of everything started in this block through one batcher"""
+    batcher = RequestBatcher()
+    reset_token = _current_batcher.set(batcher)
+    try:
+        yield batcher
+    finally:
+        _current_batcher.reset(reset_token)
+
+class ETagCache:
+    """
+    LRU of GET responses that carry an ETag, keyed by user, method and URI.
+
+    Repeat reads send the stored ETag as If-None-Match; a 304 means the stored
+    response is still current and no payload was transferred.
+    """
+
+    def __init__(self, max_size: int = ETAG_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._not_modified = 0
+        self._changed = 0
+        self._evictions = 0
+
+    def get(self, key: tuple):
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+            return response
+
+    def put(self, key: tuple, response: dict):
+        if not isinstance(response, dict) or not response.get('etag'):
+            return
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def record(self, not_modified: bool):
+        with self._lock:
+            if not_modified:
+                self._not_modified += 1
+            else:
+                self._changed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            revalidations = self._not_modified + self._changed
+            return {
+                "size": len(self._entries),
+                "not_modified": self._not_modified,
+                "changed": self._changed,
+                "not_modified_rate": round(self._not_modified / revalidations, 3) if revalidations else 0.0,
+                "evictions": self._evictions,
+            }
+
+etag_cache = ETagCache()
+
+def etag_key(token: str, request) -> tuple:
+    return (token, request.method, request.uri)
+
+async def execute_conditional(token: str, request):
+    """
+    Execute a GET request with If-None-Match when an earlier response is known,
+    returning a copy of that response on 304 Not Modified.
+    """
+    key = etag_key(token, request)
+    cached = etag_cache.get(key)
+    if cached is not None:
+        request.headers['If-None-Match'] = cached['etag']
+
+    try:
+        response = await execute(request)
+    except HttpError as e:
+        if cached is not None and e.resp.status == 304:
+            etag_cache.record(not_modified=True)
+            return copy.deepcopy(cached)
+        raise
+
+    if cached is not None:
+        etag_cache.record(not_modified=False)
+    etag_cache.put(key, response)
+    # Callers may mutate what they get back, the cached copy must stay pristine
+    return copy.deepcopy(response)
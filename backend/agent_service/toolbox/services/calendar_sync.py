@@ -0,0 +1,60 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from asgiref.sync import sync_to_async
+from googleapiclient.errors import HttpError
+from agent_service.toolbox.services.calendar_client import get_calendar_service, execute
+from app_lib.utils.calendar_mirror import get_sync_token, apply_sync_changes, reset_sync_state
+
+load_dotenv()
+MIRROR_PAST_DAYS = int(os.getenv('CALENDAR_MIRROR_PAST_DAYS', '30'))
+
+logger = logging.getLogger(__name__)
+
+async def sync_calendar(token: str, calendar_id: str = 'primary'):
+    """
+    Bring the local mirror of one calendar up to date.
+
+    Uses the stored syncToken for an incremental sync; without one, or when Google
+    rejects it as expired (410), the calendar is fully resynced from
+    CALENDAR_MIRROR_PAST_DAYS ago onwards.
+    """
+    sync_token = await sync_to_async(get_sync_token)(token, calendar_id)
+    service = await get_calendar_service(token)
+
+    params = {
+        'calendarId': calendar_id,
+        'singleEvents': True,
+        'showDeleted': True,
+        'maxResults': 250,
+    }
+    time_min = None
+    if sync_token:
+        params['syncToken'] = sync_token
+    else:
+        time_min = datetime.now(timezone.utc) - timedelta(days=MIRROR_PAST_DAYS)
+        params['timeMin'] = time_min.isoformat().replace('+00:00', 'Z')
+
+    changes = []
+    page_token = None
+    while True:
+        try:
+            result = await execute(service.events().list(pageToken=page_token, **params))
+        except HttpError as e:
+            if e.resp.status == 410 and sync_token:
+                logger.warning(f"Sync token for calendar {calendar_id} expired, running a full sync.")
+                await sync_to_async(reset_sync_state)(token, calendar_id)
+                return await sync_calendar(token, calendar_id)
+            raise
+
+        changes.extend(result.get('items', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            next_sync_token = result.get('nextSyncToken', '')
+            break
+
+    await sync_to_async(apply_sync_changes)(
+        token, calendar_id, changes, next_sync_token, full=not sync_token, synced_from=time_min
+    )
+    return len(changes)
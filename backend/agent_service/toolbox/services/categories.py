@@ -1,16 +1,91 @@
 import requests
 import os
+import base64
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
 from agent_service.apps import AgentServiceConfig
-from agent_service.toolbox.models.category import Category
+from agent_service.toolbox.models.category import Category, CategoryBatch
 import logging
-from agent_service.apps import AgentServiceConfig
+from agent_service.toolbox.services.prompts import prompt_registry
+from app_lib.utils.categories import get_category_version, load_category_vectors, save_category_vectors
 
 logger = logging.getLogger(__name__)
 
 DATABASE_SERVICE_URL = os.getenv('DATABASE_SERVICE_URL')
 MODEL = os.getenv('OPENAI_LLM_STANDARD')
+CATEGORY_CACHE_SIZE = int(os.getenv('CATEGORY_CACHE_SIZE', '2048'))
+EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
+# on: confident embedding matches skip the LLM; shadow: always ask the LLM and log agreement; off
+CATEGORY_EMBEDDING_MODE = os.getenv('CATEGORY_EMBEDDING_MODE', 'on')
+CATEGORY_EMBEDDING_MIN_SCORE = float(os.getenv('CATEGORY_EMBEDDING_MIN_SCORE', '0.45'))
+CATEGORY_EMBEDDING_MARGIN = float(os.getenv('CATEGORY_EMBEDDING_MARGIN', '0.05'))
 openai_client = AgentServiceConfig.openai_client
-langfuse_client = AgentServiceConfig.langfuse_client
+
+BATCH_PROMPT_FALLBACK = [
+    {
+        "role": "system",
+        "content": (
+            "You assign calendar events to categories. For every event in the list, pick the id of the "
+            "category that fits it best, or 0 when none does. Answer with one entry per event index.\n\n"
+            "Categories:\n{{simplified_categories}}"
+        )
+    },
+    {
+        "role": "user",
+        "content": "Events:\n{{events}}"
+    }
+]
+
+def event_digest(event_name: str, event_description: str) -> str:
+    """Hash of the summary and description with case and whitespace normalized"""
+    normalized = [" ".join((text or "").casefold().split()) for text in (event_name, event_description)]
+    return hashlib.sha256("\x00".join(normalized).encode()).hexdigest()
+
+class ClassificationCache:
+    """
+    LRU of category decisions keyed by user, event digest and category version.
+
+    Changing a category bumps the user's version, so older decisions simply stop
+    being looked up and age out of the LRU.
+    """
+
+    def __init__(self, max_size: int = CATEGORY_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: tuple):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(result)
+
+    def put(self, key: tuple, result: dict):
+        with self._lock:
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            }
+
+classification_cache = ClassificationCache()
 
 def simplify_category(category):
     """
@@ -25,6 +100,123 @@ def simplify_category(category):
     }
     return simplified
 
+def embed_texts(texts: list) -> np.ndarray:
+    """Unit-normalized float32 embeddings, one row per text"""
+    response = openai_client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    matrix = np.array([item.embedding for item in response.data], dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+def category_texts(category: dict) -> list:
+    """Texts describing a category: its title with description, then each example"""
+    texts = [f"{category.get('cat_title', '')}: {category.get('cat_description', '')}"]
+    texts += [example for example in category.get('cat_examples') or [] if example]
+    return texts
+
+class CategoryEmbeddings:
+    """
+    Embedding classifier over a user's active categories.
+
+    Every category contributes one row per text describing it; an event is scored
+    against all rows with one matrix product and each category keeps its best row.
+    Matrices are built once per category version and persisted in KeyValueStore.
+    """
+
+    def __init__(self):
+        self._matrices = {}
+        self._lock = threading.Lock()
+        self._fast_path = 0
+        self._low_confidence = 0
+        self._agreements = 0
+        self._disagreements = 0
+
+    def _build(self, token: str, version: str, categories: list):
+        stored = load_category_vectors(token)
+        if stored and stored["version"] == version and stored["model"] == EMBEDDING_MODEL:
+            matrix = np.frombuffer(base64.b64decode(stored["vectors"]), dtype=np.float32).reshape(-1, stored["dim"])
+            return stored["ids"], np.array(stored["offsets"]), matrix
+
+        ids, offsets, texts = [], [], []
+        for category in categories:
+            ids.append(category["cat_id"])
+            offsets.append(len(texts))
+            texts += category_texts(category)
+
+        matrix = embed_texts(texts)
+        save_category_vectors(token, {
+            "version": version,
+            "model": EMBEDDING_MODEL,
+            "ids": ids,
+            "offsets": offsets,
+            "dim": matrix.shape[1],
+            "vectors": base64.b64encode(matrix.tobytes()).decode(),
+        })
+        logger.info(f"Embedded {len(texts)} category texts for user {token}.")
+        return ids, np.array(offsets), matrix
+
+    def _matrix(self, token: str, version: str, categories: list):
+        with self._lock:
+            entry = self._matrices.get(token)
+        if entry and entry[0] == version:
+            return entry[1:]
+
+        ids, offsets, matrix = self._build(token, version, categories)
+        with self._lock:
+            self._matrices[token] = (version, ids, offsets, matrix)
+        return ids, offsets, matrix
+
+    def predict_many(self, token: str, version: str, categories: list, events: list) -> list:
+        """Return (category id, confident, top score) for each (name, description) pair"""
+        ids, offsets, matrix = self._matrix(token, version, categories)
+        event_vectors = embed_texts([f"{name}\n{description or ''}" for name, description in events])
+
+        # One product scores every event against every category row
+        scores = np.maximum.reduceat(event_vectors @ matrix.T, offsets, axis=1)
+        ranked = np.argsort(scores, axis=1)[:, ::-1]
+
+        predictions = []
+        for row, order in zip(scores, ranked):
+            top = float(row[order[0]])
+            runner_up = float(row[order[1]]) if len(order) > 1 else -1.0
+            confident = top >= CATEGORY_EMBEDDING_MIN_SCORE and top - runner_up >= CATEGORY_EMBEDDING_MARGIN
+            predictions.append((ids[order[0]], confident, top))
+
+        with self._lock:
+            confident_count = sum(1 for prediction in predictions if prediction[1])
+            self._fast_path += confident_count
+            self._low_confidence += len(predictions) - confident_count
+        return predictions
+
+    def predict(self, token: str, version: str, categories: list, event_name: str, event_description: str):
+        """Return (category id, confident, top score)"""
+        return self.predict_many(token, version, categories, [(event_name, event_description)])[0]
+
+    def record_agreement(self, predicted_id, confident: bool, score: float, llm_id, event_name: str):
+        agree = predicted_id == llm_id
+        with self._lock:
+            if agree:
+                self._agreements += 1
+            else:
+                self._disagreements += 1
+        logger.info(
+            f"Category shadow for '{event_name}': embedding={predicted_id} (score {score:.3f}, "
+            f"confident={confident}) llm={llm_id} agree={agree}"
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            compared = self._agreements + self._disagreements
+            return {
+                "mode": CATEGORY_EMBEDDING_MODE,
+                "users": len(self._matrices),
+                "confident": self._fast_path,
+                "low_confidence": self._low_confidence,
+                "agreements": self._agreements,
+                "disagreements": self._disagreements,
+                "agreement_rate": round(self._agreements / compared, 3) if compared else 0.0,
+            }
+
+category_embeddings = CategoryEmbeddings()
+
 def get_available_categories(token: str):
     """
     Fetch all active categories from the database service.
@@ -36,18 +228,20 @@ def get_available_categories(token: str):
         categories = response.json()
         return categories
     except requests.RequestException as e:
-        print(f"Error fetching categories: {e}")
+        logger.error(f"Error fetching categories: {e}", exc_info=True)
         return []
 
-def get_category_by_event(event_name: str, event_description: str, token: str) -> dict[str, str]:
-    categories = get_available_categories(token)
-    default = { "cat_color_id": "0", "cat_event_prefix": "" }
+def category_result(categories: list, category_id, default: dict) -> dict:
+    for cat in categories:
+        if cat["cat_id"] == category_id:
+            return {
+                "cat_color_id": cat["cat_color_id"],
+                "cat_event_prefix": cat["cat_event_prefix"]
+            }
+    return default
 
-    # If no categories are available, return a default category
-    if not categories:
-        logger.error("No categories available.")
-        return default
-    
+def select_category_with_llm(categories: list, event_name: str, event_description: str):
+    """Category id chosen by the LLM (0 for Other), or None when it cannot decide"""
     simplified_categories = [{
         'cat_id': '0',
         'cat_title': 'Other',
@@ -57,7 +251,7 @@ def get_category_by_event(event_name: str, event_description: str, token: str) -
     }] + [simplify_category(category) for category in categories]
     logger.info(f"Available categories: {simplified_categories}")
     
-    prompt = langfuse_client.get_prompt("CategoryAgent_SystemContext", type="chat")
+    prompt = prompt_registry.get("CategoryAgent_SystemContext", type="chat")
     response = openai_client.beta.chat.completions.parse(
         model=MODEL,
         messages=prompt.compile(
@@ -71,21 +265,129 @@ def get_category_by_event(event_name: str, event_description: str, token: str) -
     category = response.choices[0].message
     if category.refusal:
         logger.error(f"Failed to determine category: {category.refusal}", exc_info=True)
-        return default
+        return None
 
     try: 
         selected_category_id = category.parsed.cat_id
         logger.info(f"Selected category: {selected_category_id}")
-
-        for cat in categories:
-            if cat["cat_id"] == selected_category_id:
-                return {
-                    "cat_color_id": cat["cat_color_id"],
-                    "cat_event_prefix": cat["cat_event_prefix"]
-                }
-            
-        return default
+        return selected_category_id
     except Exception as e:
         logger.error(f"Failed to parse category: {e}", exc_info=True)
+        return None
+
+def select_categories_with_llm(categories: list, events: list) -> dict:
+    """Category ids chosen by the LLM in one structured call, keyed by event index"""
+    simplified_categories = [{
+        'cat_id': '0',
+        'cat_title': 'Other',
+        'cat_description': 'No specific category found for this event.',
+        'cat_examples': [],
+        'cat_color_id': '0'
+    }] + [simplify_category(category) for category in categories]
+
+    prompt = prompt_registry.get("CategoryAgent_BatchSystemContext", type="chat", fallback=BATCH_PROMPT_FALLBACK)
+    response = openai_client.beta.chat.completions.parse(
+        model=MODEL,
+        messages=prompt.compile(
+            simplified_categories=simplified_categories,
+            events=[{"index": index, "name": name, "description": description} for index, name, description in events]
+        ),
+        response_format=CategoryBatch
+    )
+
+    batch = response.choices[0].message
+    if batch.refusal or batch.parsed is None:
+        logger.error(f"Failed to determine categories: {batch.refusal}")
+        return {}
+    return {item.index: item.cat_id for item in batch.parsed.categories}
+
+def get_categories_by_events(events: list, token: str) -> list:
+    """
+    Categories of many (name, description) pairs, in order.
+
+    Cached decisions are reused, confident embedding matches are taken as they are, and
+    everything left is classified by a single LLM call instead of one call per event.
+    """
+    version = get_category_version(token)
+    default = { "cat_color_id": "0", "cat_event_prefix": "" }
+    cache_keys = [(token, event_digest(name, description), version) for name, description in events]
+    results = [classification_cache.get(key) for key in cache_keys]
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    if not pending:
+        return results
+
+    categories = get_available_categories(token)
+    if not categories:
+        logger.error("No categories available.")
+        return [result or dict(default) for result in results]
+
+    predictions = {}
+    if CATEGORY_EMBEDDING_MODE in ("on", "shadow"):
+        try:
+            predicted = category_embeddings.predict_many(token, version, categories, [events[index] for index in pending])
+            predictions = dict(zip(pending, predicted))
+        except Exception as e:
+            logger.warning(f"Embedding classification failed, falling back to the LLM: {e}")
+
+    if CATEGORY_EMBEDDING_MODE == "on":
+        for index, (category_id, confident, _) in predictions.items():
+            if confident:
+                results[index] = category_result(categories, category_id, default)
+                classification_cache.put(cache_keys[index], results[index])
+        pending = [index for index in pending if results[index] is None]
+
+    if pending:
+        selected = select_categories_with_llm(categories, [(index, *events[index]) for index in pending])
+        for index in pending:
+            if index not in selected:
+                results[index] = dict(default)
+                continue
+            if index in predictions:
+                category_id, confident, score = predictions[index]
+                category_embeddings.record_agreement(category_id, confident, score, selected[index], events[index][0])
+            results[index] = category_result(categories, selected[index], default)
+            classification_cache.put(cache_keys[index], results[index])
+
+    logger.info(f"Classified {len(events)} events with {len(pending)} left to the LLM.")
+    return results
+
+def get_category_by_event(event_name: str, event_description: str, token: str) -> dict[str, str]:
+    version = get_category_version(token)
+    cache_key = (token, event_digest(event_name, event_description), version)
+    cached = classification_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Category cache hit for event: {event_name}")
+        return cached
+
+    categories = get_available_categories(token)
+    default = { "cat_color_id": "0", "cat_event_prefix": "" }
+
+    # If no categories are available, return a default category
+    if not categories:
+        logger.error("No categories available.")
         return default
-    
\ No newline at end of file
+
+    prediction = None
+    if CATEGORY_EMBEDDING_MODE in ("on", "shadow"):
+        try:
+            prediction = category_embeddings.predict(token, version, categories, event_name, event_description)
+        except Exception as e:
+            logger.warning(f"Embedding classification failed, falling back to the LLM: {e}")
+
+    if prediction and prediction[1] and CATEGORY_EMBEDDING_MODE == "on":
+        logger.info(f"Embedding match for '{event_name}': {prediction[0]} (score {prediction[2]:.3f})")
+        result = category_result(categories, prediction[0], default)
+        classification_cache.put(cache_key, result)
+        return result
+
+    selected_category_id = select_category_with_llm(categories, event_name, event_description)
+    if selected_category_id is None:
+        return default
+
+    if prediction:
+        category_embeddings.record_agreement(prediction[0], prediction[1], prediction[2], selected_category_id, event_name)
+
+    result = category_result(categories, selected_category_id, default)
+    classification_cache.put(cache_key, result)
+    return result
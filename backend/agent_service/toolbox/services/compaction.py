@@ -0,0 +1,151 @@
+import os
+import copy
+import json
+import logging
+from typing import List
+from asgiref.sync import sync_to_async
+from agent_service.apps import AgentServiceConfig
+from agent_service.toolbox.services.prompts import prompt_registry
+from app_lib.utils.conversations import fetch_conversation_summary, update_conversation_summary
+
+MODEL = os.getenv('OPENAI_LLM_SMALL')
+
+TOKEN_BUDGET = int(os.getenv('AGENT_CONTEXT_TOKEN_BUDGET', '12000'))
+KEEP_RECENT = int(os.getenv('AGENT_CONTEXT_KEEP_RECENT', '8'))
+TOOL_RESULT_MAX_CHARS = int(os.getenv('AGENT_TOOL_RESULT_MAX_CHARS', '500'))
+# Rough cost of one image input; base64 payloads say nothing about the tokens they use
+IMAGE_TOKENS = 765
+
+SUMMARY_PROMPT_FALLBACK = [
+    {
+        "role": "system",
+        "content": (
+            "You maintain a running summary of a conversation between a user and a calendar assistant. "
+            "Merge the new messages into the previous summary. Keep names, dates, times, event ids and "
+            "decisions the user made; drop pleasantries and raw tool output. Answer with the summary only."
+        )
+    },
+    {
+        "role": "user",
+        "content": "Previous summary:\n{{previous_summary}}\n\nNew messages:\n{{transcript}}"
+    }
+]
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(messages: List[dict]) -> int:
+    """Cheap token estimate (~4 characters per token) that prices images separately"""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            for part in content:
+                if part.get("type") == "image_url":
+                    total += IMAGE_TOKENS
+                else:
+                    total += len(part.get("text", "")) // 4
+        else:
+            total += len(str(content or "")) // 4
+
+        for tool_call in message.get("tool_calls") or []:
+            total += len(tool_call if isinstance(tool_call, str) else json.dumps(tool_call)) // 4
+    return total
+
+def strip_message(message: dict) -> dict:
+    """Shrink an older message: truncate tool results and drop images"""
+    if message.get("role") == "tool":
+        content = str(message.get("content", ""))
+        if len(content) > TOOL_RESULT_MAX_CHARS:
+            message = {**message, "content": content[:TOOL_RESULT_MAX_CHARS] + "...[truncated]"}
+        return message
+
+    if message.get("role") == "user" and isinstance(message.get("content"), list):
+        message = copy.copy(message)
+        message["content"] = [
+            {"type": "text", "text": "[image omitted]"} if part.get("type") == "image_url" else part
+            for part in message["content"]
+        ]
+    return message
+
+def find_split(messages: List[dict], index: int) -> int:
+    """
+    Move `index` forward to the next user message so tool calls stay paired with their results.
+    Without a later user message it moves back to the last one instead, so a turn still in
+    progress (a resumed job) is replayed verbatim rather than summarized.
+    """
+    for position in range(index, len(messages)):
+        if messages[position].get("role") == "user":
+            return position
+    for position in range(min(index, len(messages)) - 1, -1, -1):
+        if messages[position].get("role") == "user":
+            return position
+    return 0
+
+def render_transcript(messages: List[dict]) -> str:
+    lines = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        if content:
+            lines.append(f"{message.get('role')}: {content}")
+
+        for tool_call in message.get("tool_calls") or []:
+            if isinstance(tool_call, str):
+                tool_call = json.loads(tool_call)
+            function = tool_call.get("function", {})
+            lines.append(f"assistant called {function.get('name')}({json.dumps(function.get('arguments'))})")
+    return "\n".join(lines)
+
+def build_context(summary: str, messages: List[dict], summary_upto: int, split: int) -> List[dict]:
+    context = []
+    if summary:
+        context.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    context.extend(strip_message(message) for message in messages[summary_upto:split])
+    context.extend(messages[split:])
+    return context
+
+async def summarize(previous_summary: str, messages: List[dict]) -> str:
+    prompt = await prompt_registry.aget("SummaryAgent_SystemContext", type="chat", fallback=SUMMARY_PROMPT_FALLBACK)
+    response = await AgentServiceConfig.get_async_openai_client().chat.completions.create(
+        model=MODEL,
+        messages=prompt.compile(
+            previous_summary=previous_summary or "(none)",
+            transcript=render_transcript(messages)
+        ),
+        temperature=0.0
+    )
+    return response.choices[0].message.content or previous_summary
+
+async def compact_messages(conv_id: int, messages: List[dict]) -> List[dict]:
+    """
+    Fit previous messages into the context token budget.
+
+    Messages already folded into the conversation summary are replaced by it, older
+    messages are stripped of images and long tool results, and the last KEEP_RECENT
+    messages are replayed verbatim. When that is still over budget, only the messages
+    since the last summary are folded into it and the new summary is stored.
+    """
+    if estimate_tokens(messages) <= TOKEN_BUDGET:
+        return messages
+
+    summary, summary_upto = await sync_to_async(fetch_conversation_summary)(conv_id)
+    summary_upto = min(summary_upto, len(messages))
+    split = max(find_split(messages, max(len(messages) - KEEP_RECENT, summary_upto)), summary_upto)
+
+    context = build_context(summary, messages, summary_upto, split)
+    if estimate_tokens(context) > TOKEN_BUDGET and split > summary_upto:
+        try:
+            summary = await summarize(summary, [strip_message(message) for message in messages[summary_upto:split]])
+            summary_upto = split
+            await sync_to_async(update_conversation_summary)(conv_id, summary, summary_upto)
+            context = build_context(summary, messages, summary_upto, split)
+        except Exception as e:
+            logger.error(f"Failed to summarize conversation {conv_id}: {e}", exc_info=True)
+
+    logger.info(
+        "Compacted conversation %s from ~%s to ~%s tokens",
+        conv_id, estimate_tokens(messages), estimate_tokens(context)
+    )
+    return context
@@ -0,0 +1,157 @@
+import os
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from agent_service.toolbox.services.calendar_cache import parse_event_time
+
+load_dotenv()
+CONFLICT_INDEX_USERS = int(os.getenv('CALENDAR_CONFLICT_INDEX_USERS', '256'))
+
+logger = logging.getLogger(__name__)
+
+def event_interval(event: dict):
+    """(start, end) of a timed event as aware UTC datetimes, or None for all-day and unparsable events"""
+    start_value = event.get('start')
+    if isinstance(start_value, dict):
+        start_value = start_value.get('dateTime')
+    if not start_value or 'T' not in str(start_value):
+        return None
+
+    start = parse_event_time(start_value)
+    end = parse_event_time(event.get('end'))
+    if start is None or end is None or end <= start:
+        return None
+    return start, end
+
+def _describe(calendar_id: str, event: dict) -> dict:
+    start = event.get('start')
+    end = event.get('end')
+    return {
+        'id': event.get('id'),
+        'calendarId': calendar_id,
+        'summary': event.get('summary', 'No Title'),
+        'start': start.get('dateTime') if isinstance(start, dict) else start,
+        'end': end.get('dateTime') if isinstance(end, dict) else end,
+    }
+
+class _UserIndex:
+    """
+    Events of one user sorted by start, with the longest duration as a search bound.
+    Durations are counted so the bound shrinks again once its longest event is removed.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.entries = {}
+        self.durations = Counter()
+        self.max_duration = timedelta(0)
+
+    def add(self, calendar_id: str, event: dict, interval):
+        key = (calendar_id, event.get('id'))
+        self.remove(key)
+        start, end = interval
+        self.entries[key] = (start, end, _describe(calendar_id, event))
+        insort(self.starts, (start, key))
+        self.durations[end - start] += 1
+        self.max_duration = max(self.max_duration, end - start)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        position = bisect_left(self.starts, (entry[0], key))
+        if position < len(self.starts) and self.starts[position] == (entry[0], key):
+            del self.starts[position]
+
+        duration = entry[1] - entry[0]
+        self.durations[duration] -= 1
+        if not self.durations[duration]:
+            del self.durations[duration]
+            if duration == self.max_duration:
+                self.max_duration = max(self.durations, default=timedelta(0))
+
+    def overlapping(self, start: datetime, end: datetime):
+        # No event starting before start - max_duration can still be running at start
+        position = bisect_left(self.starts, (start - self.max_duration,))
+        while position < len(self.starts) and self.starts[position][0] < end:
+            key = self.starts[position][1]
+            entry_start, entry_end, details = self.entries[key]
+            if entry_end > start:
+                yield key, details
+            position += 1
+
+class ConflictIndex:
+    """
+    In-memory interval index of the events each user has recently read or written.
+
+    Fed by range reads and updated on every write, it answers overlap queries in
+    O(log n + k) so create and modify can report conflicts without another tool call.
+    """
+
+    def __init__(self, max_users: int = CONFLICT_INDEX_USERS):
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self._lookups = 0
+        self._conflicts = 0
+
+    def _user(self, token: str) -> _UserIndex:
+        index = self._users.get(token)
+        if index is None:
+            index = self._users[token] = _UserIndex()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(token)
+        return index
+
+    def add(self, token: str, calendar_id: str, event: dict):
+        """Index a created or modified event, replacing its previous interval"""
+        with self._lock:
+            index = self._user(token)
+            interval = event_interval(event) if not event.get('recurrence') else None
+            if interval:
+                index.add(calendar_id, event, interval)
+            else:
+                index.remove((calendar_id, event.get('id')))
+
+    def remove(self, token: str, calendar_id: str, event_id: str):
+        with self._lock:
+            if token in self._users:
+                self._users[token].remove((calendar_id, event_id))
+
+    def replace_window(self, token: str, calendar_id: str, start: datetime, end: datetime, events: list):
+        """Replace the indexed events of one calendar inside [start, end) with a complete listing"""
+        with self._lock:
+            index = self._user(token)
+            for key, _ in list(index.overlapping(start, end)):
+                if key[0] == calendar_id:
+                    index.remove(key)
+            for event in events:
+                interval = event_interval(event)
+                if interval:
+                    index.add(calendar_id, event, interval)
+
+    def find(self, token: str, start: datetime, end: datetime, exclude_id: str = None) -> list:
+        """Indexed events of any calendar overlapping [start, end), earliest first"""
+        with self._lock:
+            self._lookups += 1
+            index = self._users.get(token)
+            if index is None:
+                return []
+            conflicts = [details for key, details in index.overlapping(start, end) if key[1] != exclude_id]
+            self._conflicts += len(conflicts)
+            return conflicts
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "events": sum(len(index.entries) for index in self._users.values()),
+                "lookups": self._lookups,
+                "conflicts": self._conflicts,
+            }
+
+conflict_index = ConflictIndex()
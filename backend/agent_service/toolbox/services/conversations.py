@@ -4,18 +4,17 @@ import requests
 from agent_service.clients.conversation_ws import DBConversationWebSocketClient
 import logging
 from agent_service.apps import AgentServiceConfig
+from agent_service.toolbox.services.prompts import prompt_registry
 from typing import List
 
-openai_client = AgentServiceConfig.openai_client
-langfuse_client = AgentServiceConfig.langfuse_client
 MODEL = os.getenv('OPENAI_LLM_SMALL')
 DATABASE_SERVICE_URL = os.getenv('DATABASE_SERVICE_URL')
 
 # Initialize logging
 logger = logging.getLogger(__name__)
 
-def get_conversation_name(user_request: str, images: List[str]) -> str:
-    prompt = langfuse_client.get_prompt("NamingAgent_SystemContext", type="chat")
+async def get_conversation_name(user_request: str, images: List[str]) -> str:
+    prompt = await prompt_registry.aget("NamingAgent_SystemContext", type="chat")
     messages = prompt.compile(
         initial_request=user_request
     )
@@ -35,7 +34,7 @@ def get_conversation_name(user_request: str, images: List[str]) -> str:
                 ]
             })
 
-    response = openai_client.chat.completions.create(
+    response = await AgentServiceConfig.get_async_openai_client().chat.completions.create(
         model=MODEL,
         messages=messages,
         temperature=0.0
@@ -53,6 +52,14 @@ async def update_conversation(conversation_id: int, conversation_name: str):
         logger.error(f"Update conversation name failed: {e}", exc_info=True)
         raise
 
+async def name_conversation(conversation_id: int, user_request: str, images: List[str]):
+    try:
+        c_name = await get_conversation_name(user_request, images)
+        logger.info(f"Conversation {conversation_id} name: {c_name}")
+        await update_conversation(conversation_id, c_name)
+    except Exception as e:
+        logger.error(f"Error in conversation naming: {str(e)}", exc_info=True)
+
 def create_blank_conversation(user):
     conversation = requests.post(
         DATABASE_SERVICE_URL + "/conversations/",
@@ -0,0 +1,83 @@
+import os
+import json
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+# Characters kept of each free-text field and of a whole encoded result
+TOOL_RESULT_TEXT_CHARS = int(os.getenv('TOOL_RESULT_TEXT_CHARS', '200'))
+TOOL_RESULT_CHAR_BUDGET = int(os.getenv('TOOL_RESULT_CHAR_BUDGET', '12000'))
+
+logger = logging.getLogger(__name__)
+
+# Placeholders simplify_event puts in for missing fields; they carry no information
+DEFAULTS = {
+    'description': 'No description.',
+    'location': 'No location.',
+    'summary': 'No Title',
+}
+TEXT_FIELDS = ('description', 'location', 'summary')
+TABLE_NOTE = "Each row follows columns; null means not set."
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+def compact_cell(field: str, value):
+    """Compact one field value, returning None for defaults and empty values"""
+    if value in (None, '', [], {}) or DEFAULTS.get(field) == value:
+        return None
+    if field == 'attendees' and isinstance(value, list):
+        emails = [attendee.get('email') if isinstance(attendee, dict) else attendee for attendee in value]
+        return ",".join(email for email in emails if email) or None
+    if field in TEXT_FIELDS and isinstance(value, str):
+        value = " ".join(value.split())
+        if len(value) > TOOL_RESULT_TEXT_CHARS:
+            return value[:TOOL_RESULT_TEXT_CHARS] + "…"
+    return value
+
+def encode_table(rows: list) -> dict:
+    """
+    Columnar layout of a list of flat dicts: keys are listed once and columns whose
+    every cell is empty are dropped. Builds new lists, the input dicts are left untouched.
+    """
+    columns = []
+    for row in rows:
+        columns += [field for field in row if field not in columns]
+
+    cells = [[compact_cell(field, row.get(field)) for field in columns] for row in rows]
+    used = [index for index, field in enumerate(columns) if any(cell[index] is not None for cell in cells)]
+    return {
+        "columns": [columns[index] for index in used],
+        "rows": [[cell[index] for index in used] for cell in cells],
+        "note": TABLE_NOTE,
+    }
+
+def fit_budget(table: dict, budget: int) -> str:
+    """Encode a table, dropping trailing rows until it fits the character budget"""
+    encoded = _dumps(table)
+    if len(encoded) <= budget:
+        return encoded
+
+    rows = table["rows"]
+    # Row sizes are summed once instead of re-encoding the table for every dropped row
+    overhead = len(encoded) - sum(len(_dumps(row)) + 1 for row in rows)
+    kept, size = 0, overhead + 40
+    for row in rows:
+        size += len(_dumps(row)) + 1
+        if size > budget:
+            break
+        kept += 1
+
+    logger.info(f"Tool result over budget, keeping {kept} of {len(rows)} rows.")
+    return _dumps({**table, "rows": rows[:kept], "truncated": len(rows) - kept})
+
+def encode_tool_result(result, budget: int = TOOL_RESULT_CHAR_BUDGET) -> str:
+    """
+    Serialize a tool result for the model.
+
+    Lists of records (event listings, free slots) become a table; anything else keeps
+    its shape, since the frontend renders those results, and is only written compactly.
+    """
+    if isinstance(result, list) and result and all(isinstance(item, dict) for item in result):
+        return fit_budget(encode_table(result), budget)
+    return _dumps(result)
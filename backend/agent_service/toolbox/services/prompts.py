@@ -0,0 +1,115 @@
+import os
+import time
+import logging
+import threading
+from asgiref.sync import sync_to_async
+from agent_service.apps import AgentServiceConfig
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+PROMPT_TTL = int(os.getenv('LANGFUSE_PROMPT_TTL', '300'))
+
+class PromptRegistry:
+    """
+    Process-wide cache of Langfuse prompts keyed by name, version and type.
+
+    Prompts are fetched once and refreshed by a background thread when their TTL runs
+    out, so agent turns never wait on Langfuse after the first fetch. When a refresh
+    fails the last good version keeps being served. Code on the event loop uses aget,
+    which does that first fetch on a worker thread.
+    """
+
+    def __init__(self, ttl: int = PROMPT_TTL):
+        self.ttl = ttl
+        self._prompts = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._refresh_failures = 0
+
+    def get(self, name: str, type: str = "text", version: int = None, fallback=None):
+        prompt = self._cached(name, type, version)
+        if prompt is not None:
+            return prompt
+
+        prompt = self._fetch(name, type, version, fallback)
+        self._store(name, type, version, prompt, fallback)
+        return prompt
+
+    async def aget(self, name: str, type: str = "text", version: int = None, fallback=None):
+        prompt = self._cached(name, type, version)
+        if prompt is not None:
+            return prompt
+
+        prompt = await sync_to_async(self._fetch, thread_sensitive=False)(name, type, version, fallback)
+        self._store(name, type, version, prompt, fallback)
+        return prompt
+
+    def _cached(self, name: str, type: str, version: int):
+        with self._lock:
+            entry = self._prompts.get((name, version, type))
+            if entry:
+                self._hits += 1
+                return entry["prompt"]
+            self._misses += 1
+            return None
+
+    def _store(self, name: str, type: str, version: int, prompt, fallback):
+        key = (name, version, type)
+        with self._lock:
+            self._prompts[key] = {"prompt": prompt, "fetched_at": time.monotonic(), "fallback": fallback}
+        self._start_refresher()
+
+    def _fetch(self, name: str, type: str, version: int, fallback):
+        # Bypass the SDK cache; freshness is handled here
+        return AgentServiceConfig.langfuse_client.get_prompt(
+            name,
+            version=version,
+            type=type,
+            cache_ttl_seconds=0,
+            fallback=fallback
+        )
+
+    def _start_refresher(self):
+        with self._lock:
+            if self._refresher:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="prompt-refresher", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(max(self.ttl / 4, 1))
+            now = time.monotonic()
+            with self._lock:
+                stale = [key for key, entry in self._prompts.items() if now - entry["fetched_at"] >= self.ttl]
+
+            for name, version, type in stale:
+                key = (name, version, type)
+                try:
+                    prompt = self._fetch(name, type, version, self._prompts[key]["fallback"])
+                    if getattr(prompt, "is_fallback", False):
+                        raise ConnectionError("Langfuse unreachable, got fallback prompt")
+                    with self._lock:
+                        self._prompts[key].update(prompt=prompt, fetched_at=time.monotonic())
+                        self._refreshes += 1
+                except Exception as e:
+                    # Keep serving the last good version and try again on the next pass
+                    logger.warning(f"Failed to refresh prompt {name}: {e}")
+                    with self._lock:
+                        self._refresh_failures += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "prompts": len(self._prompts),
+                "hits": self._hits,
+                "misses": self._misses,
+                "refreshes": self._refreshes,
+                "refresh_failures": self._refresh_failures,
+            }
+
+prompt_registry = PromptRegistry()
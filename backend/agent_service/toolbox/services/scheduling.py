@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from datetime import datetime, time, timedelta
+from typing import List, Tuple
+from pytz import timezone
+from agent_service.toolbox.services.calendar import list_events, resolve_calendar_ids
+from agent_service.toolbox.services.calendar_cache import parse_event_time
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[datetime, datetime]
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Sort intervals and merge the overlapping or touching ones in one sweep, O(n log n)"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def working_windows(start: datetime, end: datetime, tz_name: str, day_start: time, day_end: time,
+                    include_weekends: bool = False) -> List[Interval]:
+    """Working-hour windows of each local day between start and end, clipped to the range"""
+    tz = timezone(tz_name)
+    windows = []
+    day = start.astimezone(tz).date()
+    last_day = end.astimezone(tz).date()
+    while day <= last_day:
+        if include_weekends or day.weekday() < 5:
+            window_start = max(tz.localize(datetime.combine(day, day_start)), start)
+            window_end = min(tz.localize(datetime.combine(day, day_end)), end)
+            if window_start < window_end:
+                windows.append((window_start, window_end))
+        day += timedelta(days=1)
+    return windows
+
+def subtract_busy(windows: List[Interval], busy: List[Interval]) -> List[Interval]:
+    """Remove merged, sorted busy intervals from sorted windows with a two-pointer sweep"""
+    free = []
+    index = 0
+    for window_start, window_end in windows:
+        # Busy intervals ending before this window cannot affect it or any later one
+        while index < len(busy) and busy[index][1] <= window_start:
+            index += 1
+
+        cursor = window_start
+        scan = index
+        while scan < len(busy) and busy[scan][0] < window_end:
+            busy_start, busy_end = busy[scan]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            scan += 1
+
+        if cursor < window_end:
+            free.append((cursor, window_end))
+    return free
+
+def compute_free_slots(busy: List[Interval], start: datetime, end: datetime, duration: timedelta, tz_name: str,
+                       day_start: time, day_end: time, include_weekends: bool = False,
+                       max_slots: int = 10) -> List[Interval]:
+    """Free windows inside working hours that are at least `duration` long, earliest first"""
+    windows = working_windows(start, end, tz_name, day_start, day_end, include_weekends)
+    free = subtract_busy(windows, merge_intervals(busy))
+    return [slot for slot in free if slot[1] - slot[0] >= duration][:max_slots]
+
+def busy_intervals(events: List[dict]) -> List[Interval]:
+    """Busy intervals of simplified events; all-day events do not block time"""
+    intervals = []
+    for event in events:
+        if 'T' not in str(event.get('start', '')):
+            continue
+        start = parse_event_time(event.get('start'))
+        end = parse_event_time(event.get('end'))
+        if start and end and start < end:
+            intervals.append((start, end))
+    return intervals
+
+async def find_free_slots(token: str, start: str, end: str, durationMinutes: int, calendarIds: List[str],
+                          workingHoursStart: str = "09:00", workingHoursEnd: str = "17:00", timeZone: str = "UTC",
+                          includeWeekends: bool = False, maxResults: int = 10):
+    start_datetime = parse_event_time(start)
+    end_datetime = parse_event_time(end)
+    if start_datetime is None or end_datetime is None or end_datetime <= start_datetime:
+        raise ValueError("start and end must be RFC3339 timestamps with end after start.")
+
+    calendar_ids = await resolve_calendar_ids(token, calendarIds or ['primary'])
+    events_per_calendar = await asyncio.gather(*[
+        list_events(token, calendar_id, start_datetime, end_datetime) for calendar_id in calendar_ids
+    ])
+    busy = [interval for events in events_per_calendar for interval in busy_intervals(events)]
+
+    tz = timezone(timeZone)
+    slots = compute_free_slots(
+        busy,
+        start_datetime,
+        end_datetime,
+        timedelta(minutes=durationMinutes),
+        timeZone,
+        time.fromisoformat(workingHoursStart),
+        time.fromisoformat(workingHoursEnd),
+        includeWeekends,
+        maxResults
+    )
+    logger.info(f"Found {len(slots)} free slots across {len(busy)} busy intervals.")
+
+    return [
+        {"start": slot_start.astimezone(tz).isoformat(), "end": slot_end.astimezone(tz).isoformat()}
+        for slot_start, slot_end in slots
+    ]
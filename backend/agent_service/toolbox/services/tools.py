@@ -1,18 +1,23 @@
-from agent_service.toolbox.services.calendar import create_event, get_today_events, get_this_week_events, modify_event, delete_event, get_tomorrow_events, get_next_week_events
+from agent_service.toolbox.services.calendar import create_event, create_events, get_today_events, get_this_week_events, modify_event, delete_event, get_tomorrow_events, get_next_week_events, get_events_in_range
+from agent_service.toolbox.services.scheduling import find_free_slots
 from openai import pydantic_function_tool
-from agent_service.toolbox.models.calendar_event import CreateCalendarEvent, GetTodayEvents, GetThisWeekEvents, ModifyEvent, DeleteEvent, GetTomorrowEvents, GetNextWeekEvents
+from agent_service.toolbox.models.calendar_event import CreateCalendarEvent, CreateCalendarEvents, GetTodayEvents, GetThisWeekEvents, ModifyEvent, DeleteEvent, GetTomorrowEvents, GetNextWeekEvents, GetEventsInRange, FindFreeSlots
 from datetime import datetime
 from pytz import timezone
-from agent_service.apps import AgentServiceConfig
+from agent_service.toolbox.services.prompts import prompt_registry
 
 tools = [
     pydantic_function_tool(
         CreateCalendarEvent,
-        description="Create a new calendar event based on the provided details. Use default color id."
+        description="Create a new calendar event based on the provided details. Use default color id. The result lists known overlapping events under conflicts, so there is no need to fetch events beforehand."
+    ),
+    pydantic_function_tool(
+        CreateCalendarEvents,
+        description="Create several calendar events at once, e.g. from a pasted syllabus or schedule. Prefer this over repeated CreateCalendarEvent calls. The result reports each event as created or failed."
     ),
     pydantic_function_tool(
         GetTodayEvents,
-        description="Fetch all events scheduled for today."
+        description="Fetch all events scheduled for today, from one, several or all calendars."
     ),
     pydantic_function_tool(
         GetTomorrowEvents,
@@ -26,9 +31,17 @@ tools = [
         GetNextWeekEvents,
         description="Fetch all events scheduled for next week."
     ),
+    pydantic_function_tool(
+        GetEventsInRange,
+        description="Fetch events between two points in time, e.g. for a month or quarter view. Returns at most maxResults events, earliest first."
+    ),
+    pydantic_function_tool(
+        FindFreeSlots,
+        description="Find free time slots of at least the given duration within working hours, across one or more calendars. Use this instead of fetching events when the user wants to schedule something."
+    ),
     pydantic_function_tool(
         ModifyEvent,
-        description="Modify an existing calendar event. Provide the event ID and the new details."
+        description="Modify an existing calendar event. Provide the event ID and the new details. The result lists known overlapping events under conflicts."
     ),
     pydantic_function_tool(
         DeleteEvent,
@@ -38,16 +51,22 @@ tools = [
 
 tool_map = {
     "CreateCalendarEvent": create_event,
+    "CreateCalendarEvents": create_events,
     "GetTodayEvents": get_today_events,
     "GetTomorrowEvents": get_tomorrow_events,
     "GetThisWeekEvents": get_this_week_events,
     "GetNextWeekEvents": get_next_week_events,
+    "GetEventsInRange": get_events_in_range,
+    "FindFreeSlots": find_free_slots,
     "ModifyEvent": modify_event,
     "DeleteEvent": delete_event
 }
 
-def get_environmental_context_prompt(iana_timezone: str) -> str:
-    prompt = AgentServiceConfig.langfuse_client.get_prompt("MainAgent_SystemContext", type="chat")
+# Tools that change the user's calendar; an interrupted call must not be replayed blindly
+WRITE_TOOLS = {"CreateCalendarEvent", "CreateCalendarEvents", "ModifyEvent", "DeleteEvent"}
+
+async def get_environmental_context_prompt(iana_timezone: str) -> list:
+    prompt = await prompt_registry.aget("MainAgent_SystemContext", type="chat")
 
     local_time = datetime.now(timezone(iana_timezone)).isoformat()
 
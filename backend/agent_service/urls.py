@@ -2,7 +2,7 @@ from django.urls import path, re_path
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
-from agent_service.views import AgentView, AgentMessageView
+from agent_service.views import AgentView, AgentMessageView, AgentStatsView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -23,4 +23,5 @@ urlpatterns = [
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('request/', AgentView.as_view(), name='agent-create'),
     path('message/', AgentMessageView.as_view(), name='agent-create'),
+    path('stats/', AgentStatsView.as_view(), name='agent-stats'),
 ]
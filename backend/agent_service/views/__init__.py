@@ -1 +1,2 @@
 from agent_service.views.agent_view import AgentView, AgentMessageView
+from agent_service.views.stats_view import AgentStatsView
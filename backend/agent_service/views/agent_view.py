@@ -4,58 +4,58 @@ from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import os
-from agent_service.toolbox.agent import start_agent_action
+from agent_service.toolbox.agent import agent_action
+from agent_service.toolbox.executor import get_agent_executor, AgentQueueFull
+from app_lib.utils.agent_jobs import enqueue_job
+from database_service.models import AgentJob, Conversation
 from agent_service.toolbox.services.conversations import *
-import threading
 from rest_framework.views import APIView
-import asyncio
 from app_lib.utils.users import fetch_user
 
 logger = logging.getLogger(__name__)
 DATABASE_SERVICE_URL = os.getenv('DATABASE_SERVICE_URL')
+BUSY_RESPONSE = {"error": "The agent is busy. Please try again shortly."}
+# 'executor' runs agents in this process; 'queue' hands them to `manage.py run_agent_worker`
+AGENT_DISPATCH = os.getenv('AGENT_DISPATCH', 'executor')
+
+def has_capacity() -> bool:
+    return AGENT_DISPATCH == 'queue' or get_agent_executor().has_capacity()
 
 def process(data: dict, conversation_id: int, create_new: bool = True):
     logger.info("Starting new process.")
-    try:
-        user_prompt = data.get('userPrompt')
-        user_token = data.get('token')
-        images = data.get('images')
-        iana_timezone = data.get('ianaTimezone', 'UTC')
-        processed_prompt = ""
+    user_prompt = data.get('userPrompt')
+    user_token = data.get('token')
+    images = data.get('images')
+    iana_timezone = data.get('ianaTimezone', 'UTC')
+    processed_prompt = ""
 
-        if user_prompt:
-            processed_prompt = user_prompt + "\n"
-        
-        def conversation_naming():
-            try:
-                c_name = get_conversation_name(processed_prompt, images)
-                logger.info(f"Conversation {conversation_id} name: {c_name}")
-                # Call the async function using asyncio.run
-                asyncio.run(update_conversation(conversation_id, c_name))
-            except Exception as e:
-                logger.error(f"Error in conversation naming: {str(e)}", exc_info=True)
+    if user_prompt:
+        processed_prompt = user_prompt + "\n"
 
+    if AGENT_DISPATCH == 'queue':
+        enqueue_job(conversation_id, AgentJob.KIND_AGENT_ACTION, {
+            "prompt": processed_prompt,
+            "images": images,
+            "token": user_token,
+            "conv_id": conversation_id,
+            "iana_timezone": iana_timezone
+        })
         if create_new:
-            converastion_naming_thread = threading.Thread(target=conversation_naming)
-            converastion_naming_thread.start()
+            enqueue_job(conversation_id, AgentJob.KIND_CONVERSATION_NAME, {
+                "conversation_id": conversation_id,
+                "user_request": processed_prompt,
+                "images": images
+            })
+        return
 
-        def process_conversation():
-            try:
-                process_thread = threading.Thread(
-                    target=start_agent_action,
-                    args=(processed_prompt, images, user_token, conversation_id, iana_timezone),
-                    daemon=True
-                )
-                process_thread.start()
-            except Exception as e:
-                logger.error(f"Error in agent_action: {str(e)}", exc_info=True)
+    executor = get_agent_executor()
+    executor.submit(agent_action, processed_prompt, images, user_token, conversation_id, iana_timezone)
 
-        conversation_thread = threading.Thread(target=process_conversation)
-        conversation_thread.start()
-
-    except Exception as e:
-        logger.error(f"Error in process: {str(e)}", exc_info=True)
-        raise
+    if create_new:
+        try:
+            executor.submit(name_conversation, conversation_id, processed_prompt, images)
+        except AgentQueueFull:
+            logger.warning(f"Skipped naming conversation {conversation_id}: agent executor is full.")
 
 class AgentView(APIView):
     @swagger_auto_schema(
@@ -81,7 +81,7 @@ class AgentView(APIView):
                 )
             },
         ),
-        responses={200: 'OK', 400: 'Bad Request'}
+        responses={200: 'OK', 400: 'Bad Request', 503: 'Agent Busy'}
     )
     def post(self, request, *args, **kwargs):
         try:
@@ -94,19 +94,24 @@ class AgentView(APIView):
             if not data.get("userPrompt"):
                 return Response({"error": "User prompt is required."}, status=status.HTTP_400_BAD_REQUEST)
 
+            if not has_capacity():
+                return Response(BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
             conversation_id = create_blank_conversation(user)
             logger.info(f"Created conversation {conversation_id}")
             
-            process_thread = threading.Thread(
-                target=process,
-                args=(data, conversation_id),
-                daemon=True
-            )
-            process_thread.start()
+            try:
+                process(data, conversation_id)
+            except AgentQueueFull:
+                # The executor filled up since the capacity check; don't leave an empty conversation behind
+                Conversation.objects.filter(c_id=conversation_id).delete()
+                raise
             return Response({
                 "message": "Processing started",
                 "conversationId": conversation_id
             }, status=status.HTTP_200_OK)
+        except AgentQueueFull:
+            return Response(BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             logger.error(f"Error in post: {str(e)}", exc_info=True)
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -139,7 +144,7 @@ class AgentMessageView(APIView):
                 )
             },
         ),
-        responses={200: 'OK', 400: 'Bad Request'}
+        responses={200: 'OK', 400: 'Bad Request', 503: 'Agent Busy'}
     )
     def post(self, request, *args, **kwargs):
         try:
@@ -158,15 +163,12 @@ class AgentMessageView(APIView):
             conversation_id = data.get("conversationId")
             logger.info(f"New message in conversation {conversation_id}")
             
-            process_thread = threading.Thread(
-                target=process,
-                args=(data, conversation_id, False),
-                daemon=True
-            )
-            process_thread.start()
+            process(data, conversation_id, False)
             return Response({
                 "message": "Processing started"
             }, status=status.HTTP_200_OK)
+        except AgentQueueFull:
+            return Response(BUSY_RESPONSE, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             logger.error(f"Error in post: {str(e)}", exc_info=True)
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,30 @@
+import logging
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_yasg.utils import swagger_auto_schema
+from agent_service.toolbox.executor import get_agent_executor
+from agent_service.toolbox.services.prompts import prompt_registry
+from agent_service.toolbox.services.calendar_client import service_cache, batch_stats, etag_cache
+from agent_service.toolbox.services.calendar_cache import event_cache
+from agent_service.toolbox.services.conflicts import conflict_index
+from agent_service.toolbox.services.categories import classification_cache, category_embeddings
+
+logger = logging.getLogger(__name__)
+
+class AgentStatsView(APIView):
+    @swagger_auto_schema(
+        responses={200: 'OK'}
+    )
+    def get(self, request, *args, **kwargs):
+        return Response({
+            "executor": get_agent_executor().stats(),
+            "prompts": prompt_registry.stats(),
+            "calendar_services": service_cache.stats(),
+            "calendar_batching": batch_stats.stats(),
+            "calendar_etags": etag_cache.stats(),
+            "calendar_events": event_cache.stats(),
+            "calendar_conflicts": conflict_index.stats(),
+            "categories": classification_cache.stats(),
+            "category_embeddings": category_embeddings.stats(),
+        }, status=status.HTTP_200_OK)
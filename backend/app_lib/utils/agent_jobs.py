@@ -0,0 +1,113 @@
+import os
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from database_service.models import AgentJob, Conversation
+
+logger = logging.getLogger(__name__)
+
+VISIBILITY_TIMEOUT = int(os.getenv('AGENT_JOB_VISIBILITY_TIMEOUT', '120'))
+RETRY_BACKOFF = int(os.getenv('AGENT_JOB_RETRY_BACKOFF', '10'))
+MAX_ATTEMPTS = int(os.getenv('AGENT_JOB_MAX_ATTEMPTS', '3'))
+
+def enqueue_job(conversation_id: int, kind: str, payload: dict) -> AgentJob:
+    job = AgentJob.objects.create(
+        c_id_id=conversation_id,
+        j_kind=kind,
+        j_payload=payload,
+        j_max_attempts=MAX_ATTEMPTS
+    )
+    logger.info(f"Enqueued {kind} job {job.j_id} for conversation {conversation_id}.")
+    return job
+
+def claim_jobs(worker_id: str, limit: int) -> list:
+    """
+    Claim up to `limit` runnable jobs for a worker.
+
+    A job is runnable when it is queued and due, or when it is running but its lease
+    expired because the worker that held it died. Rows locked by other workers are
+    skipped rather than waited on.
+    """
+    now = timezone.now()
+    claimed = []
+
+    with transaction.atomic():
+        jobs = AgentJob.objects.select_for_update(skip_locked=True).filter(
+            Q(j_status=AgentJob.STATUS_QUEUED, j_run_after__lte=now) |
+            Q(j_status=AgentJob.STATUS_RUNNING, j_locked_until__lt=now)
+        ).order_by('j_run_after', 'j_id')[:limit]
+
+        for job in jobs:
+            if job.j_attempts >= job.j_max_attempts:
+                logger.error(f"Job {job.j_id} lease expired after {job.j_attempts} attempts, giving up.")
+                job.j_status = AgentJob.STATUS_FAILED
+                job.j_error = f"Worker {job.j_locked_by} stopped responding."
+                job.j_locked_until = None
+                job.j_payload = {}
+                job.save(update_fields=['j_status', 'j_error', 'j_locked_until', 'j_payload', 'j_updated_at'])
+                continue
+
+            if job.j_status == AgentJob.STATUS_RUNNING:
+                logger.warning(f"Reclaiming job {job.j_id} from worker {job.j_locked_by}.")
+
+            job.j_status = AgentJob.STATUS_RUNNING
+            job.j_attempts += 1
+            job.j_locked_by = worker_id
+            job.j_locked_until = now + timedelta(seconds=VISIBILITY_TIMEOUT)
+            job.save(update_fields=['j_status', 'j_attempts', 'j_locked_by', 'j_locked_until', 'j_updated_at'])
+            claimed.append(job)
+
+    return claimed
+
+def extend_job_leases(job_ids: list, worker_id: str) -> int:
+    """Push back the visibility timeout of jobs the worker is still running"""
+    if not job_ids:
+        return 0
+    return AgentJob.objects.filter(
+        j_id__in=job_ids,
+        j_status=AgentJob.STATUS_RUNNING,
+        j_locked_by=worker_id
+    ).update(
+        j_locked_until=timezone.now() + timedelta(seconds=VISIBILITY_TIMEOUT),
+        j_updated_at=timezone.now()
+    )
+
+def record_start_seq(job: AgentJob) -> int:
+    """Remember where the conversation stood before the job's first attempt and return it"""
+    if job.j_start_seq is None:
+        job.j_start_seq = Conversation.objects.filter(c_id=job.c_id_id).values_list('c_last_seq', flat=True).get()
+        AgentJob.objects.filter(j_id=job.j_id).update(j_start_seq=job.j_start_seq)
+    return job.j_start_seq
+
+def complete_job(job: AgentJob):
+    # Payloads hold user tokens and base64 images, which finished jobs no longer need
+    AgentJob.objects.filter(j_id=job.j_id, j_locked_by=job.j_locked_by).update(
+        j_status=AgentJob.STATUS_DONE,
+        j_payload={},
+        j_locked_until=None,
+        j_updated_at=timezone.now()
+    )
+
+def fail_job(job: AgentJob, error: str):
+    """Requeue a failed job with linear backoff, or mark it failed once attempts run out"""
+    now = timezone.now()
+    if job.j_attempts < job.j_max_attempts:
+        AgentJob.objects.filter(j_id=job.j_id, j_locked_by=job.j_locked_by).update(
+            j_status=AgentJob.STATUS_QUEUED,
+            j_run_after=now + timedelta(seconds=RETRY_BACKOFF * job.j_attempts),
+            j_locked_until=None,
+            j_error=error,
+            j_updated_at=now
+        )
+        logger.warning(f"Job {job.j_id} failed (attempt {job.j_attempts}), requeued: {error}")
+    else:
+        AgentJob.objects.filter(j_id=job.j_id, j_locked_by=job.j_locked_by).update(
+            j_status=AgentJob.STATUS_FAILED,
+            j_payload={},
+            j_locked_until=None,
+            j_error=error,
+            j_updated_at=now
+        )
+        logger.error(f"Job {job.j_id} failed permanently: {error}")
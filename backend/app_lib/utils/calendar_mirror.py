@@ -0,0 +1,125 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from django.db import transaction
+from django.utils import timezone as django_timezone
+from database_service.models import MirroredEvent, CalendarSyncState
+
+logger = logging.getLogger(__name__)
+
+MIRROR_MAX_STALENESS = timedelta(seconds=int(os.getenv('CALENDAR_MIRROR_MAX_STALENESS', '300')))
+
+def _parse_time(value: dict):
+    """Return (aware UTC datetime, is_all_day) for an event start/end"""
+    value = value or {}
+    if value.get('dateTime'):
+        parsed = datetime.fromisoformat(value['dateTime'])
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc), False
+    if value.get('date'):
+        return datetime.fromisoformat(value['date']).replace(tzinfo=timezone.utc), True
+    return None, False
+
+def _to_row(user_id: str, calendar_id: str, event: dict):
+    start, all_day = _parse_time(event.get('start'))
+    end, _ = _parse_time(event.get('end'))
+    if start is None or end is None:
+        return None
+    return MirroredEvent(
+        u_id_id=user_id,
+        me_calendar_id=calendar_id,
+        me_event_id=event['id'],
+        me_start=start,
+        me_end=end,
+        me_all_day=all_day,
+        me_payload=event
+    )
+
+def _upsert(rows: list):
+    MirroredEvent.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['u_id', 'me_calendar_id', 'me_event_id'],
+        update_fields=['me_start', 'me_end', 'me_all_day', 'me_payload', 'me_updated_at']
+    )
+
+def get_sync_token(user_id: str, calendar_id: str) -> str:
+    state = CalendarSyncState.objects.filter(u_id=user_id, cs_calendar_id=calendar_id).first()
+    return state.cs_sync_token if state else ""
+
+def apply_sync_changes(user_id: str, calendar_id: str, changes: list, sync_token: str, full: bool,
+                       synced_from: datetime = None):
+    """
+    Apply one sync round to the mirror.
+
+    A full sync replaces the calendar's rows and records `synced_from`, the start of the
+    window it loaded; an incremental one upserts changed events and removes cancelled
+    ones. The sync token is stored in the same transaction.
+    """
+    with transaction.atomic():
+        mirrored = MirroredEvent.objects.filter(u_id=user_id, me_calendar_id=calendar_id)
+        if full:
+            mirrored.delete()
+
+        cancelled = [event['id'] for event in changes if event.get('status') == 'cancelled']
+        if cancelled and not full:
+            mirrored.filter(me_event_id__in=cancelled).delete()
+
+        rows = [
+            row for row in (
+                _to_row(user_id, calendar_id, event)
+                for event in changes if event.get('status') != 'cancelled'
+            ) if row
+        ]
+        if rows:
+            _upsert(rows)
+
+        state = {'cs_sync_token': sync_token, 'cs_synced_at': django_timezone.now()}
+        if full:
+            state['cs_synced_from'] = synced_from
+        CalendarSyncState.objects.update_or_create(u_id_id=user_id, cs_calendar_id=calendar_id, defaults=state)
+
+    logger.info(f"Synced calendar {calendar_id} for user {user_id}: {len(rows)} upserted, {len(cancelled)} cancelled.")
+
+def reset_sync_state(user_id: str, calendar_id: str):
+    CalendarSyncState.objects.filter(u_id=user_id, cs_calendar_id=calendar_id).update(cs_sync_token="")
+
+def query_mirror(user_id: str, calendar_id: str, start: datetime, end: datetime, limit: int = None):
+    """
+    Raw events overlapping [start, end) ordered by start (at most `limit`), or None when the mirror
+    of this calendar is missing, older than CALENDAR_MIRROR_MAX_STALENESS, or does not cover
+    the window because it starts before what the last full sync loaded.
+    """
+    state = CalendarSyncState.objects.filter(u_id=user_id, cs_calendar_id=calendar_id).first()
+    if not state or not state.cs_synced_at or django_timezone.now() - state.cs_synced_at > MIRROR_MAX_STALENESS:
+        return None
+    if state.cs_synced_from is None or start < state.cs_synced_from:
+        return None
+
+    events = MirroredEvent.objects.filter(
+        u_id=user_id,
+        me_calendar_id=calendar_id,
+        me_start__lt=end,
+        me_end__gt=start
+    ).order_by('me_start').values_list('me_payload', flat=True)
+    return list(events[:limit] if limit else events)
+
+def write_through(user_id: str, calendar_id: str, event: dict = None, deleted_event_id: str = None):
+    """Reflect a write made through the API in the mirror, if this calendar is mirrored"""
+    if not CalendarSyncState.objects.filter(u_id=user_id, cs_calendar_id=calendar_id).exists():
+        return
+
+    if deleted_event_id:
+        MirroredEvent.objects.filter(u_id=user_id, me_calendar_id=calendar_id, me_event_id=deleted_event_id).delete()
+        return
+
+    if event and event.get('recurrence'):
+        # The mirror holds expanded instances, which only the next sync can produce;
+        # until then reads must go to Google
+        CalendarSyncState.objects.filter(u_id=user_id, cs_calendar_id=calendar_id).update(cs_synced_at=None)
+        return
+
+    row = _to_row(user_id, calendar_id, event) if event else None
+    if row:
+        _upsert([row])
@@ -0,0 +1,35 @@
+import json
+import time
+import logging
+from database_service.models import KeyValueStore
+
+logger = logging.getLogger(__name__)
+
+def _version_key(token: str) -> str:
+    return f"category_version:{token}"
+
+def get_category_version(token: str) -> str:
+    """Stamp of the user's current categories; it changes whenever one of them is modified"""
+    version = KeyValueStore.objects.filter(key=_version_key(token)).values_list('value', flat=True).first()
+    return version or "0"
+
+def bump_category_version(token: str):
+    # A nanosecond timestamp needs no read-modify-write, so concurrent bumps cannot collide
+    KeyValueStore.objects.update_or_create(
+        key=_version_key(token),
+        defaults={'value': str(time.time_ns()), 'value_type': 'str'}
+    )
+    logger.info(f"Bumped category version of user {token}.")
+
+def _vectors_key(token: str) -> str:
+    return f"category_vectors:{token}"
+
+def load_category_vectors(token: str) -> dict:
+    value = KeyValueStore.objects.filter(key=_vectors_key(token)).values_list('value', flat=True).first()
+    return json.loads(value) if value else None
+
+def save_category_vectors(token: str, vectors: dict):
+    KeyValueStore.objects.update_or_create(
+        key=_vectors_key(token),
+        defaults={'value': json.dumps(vectors), 'value_type': 'json'}
+    )
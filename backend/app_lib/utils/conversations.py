@@ -1,17 +1,69 @@
 import logging
+from django.db import transaction
+from django.db.models import F
 from database_service.models.conversations import Conversation
+from database_service.models.messages import Message
 
 logger = logging.getLogger(__name__)
 
 def fetch_previous_messages(conv_id: int):
     try:
-        # Fetch the conversation by its ID
-        conversation = Conversation.objects.get(c_id=conv_id)
-        if conversation:
-            return conversation.c_messages
-        else:
-            logger.error(f"No conversation found with ID: {conv_id}")
-            return []
+        return list(
+            Message.objects.filter(c_id=conv_id).order_by('m_seq').values_list('m_content', flat=True)
+        )
     except Exception as e:
-        logger.error(f"Error fetching conversation with ID {conv_id}: {e}")
+        logger.error(f"Error fetching messages of conversation {conv_id}: {e}")
         return []
+
+def fetch_messages_since(conv_id: int, after_seq: int = 0):
+    """(seq, message) pairs of a conversation with a seq above `after_seq`, in order"""
+    return list(
+        Message.objects.filter(c_id=conv_id, m_seq__gt=after_seq).order_by('m_seq').values_list('m_seq', 'm_content')
+    )
+
+def raw_message_text(message: dict) -> str:
+    """Searchable text of a message: its string content or the text of its first part"""
+    try:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            return content[0].get("text", "") if content else ""
+        if isinstance(content, str):
+            return content
+    except (IndexError, KeyError, AttributeError):
+        logger.error(f"Error extracting raw message from new message: {message}", exc_info=True)
+    return ""
+
+def append_messages(conv_id: int, messages: list) -> list:
+    """
+    Append messages to a conversation in one transaction and return their seqs.
+
+    The seq range is allocated by incrementing c_last_seq in SQL, whose row lock is held
+    only until the bulk insert commits. Each row carries its own searchable text, so the
+    conversation row stays small however long the conversation grows.
+    """
+    if not messages:
+        return []
+    with transaction.atomic():
+        Conversation.objects.filter(c_id=conv_id).update(c_last_seq=F('c_last_seq') + len(messages))
+        last_seq = Conversation.objects.filter(c_id=conv_id).values_list('c_last_seq', flat=True).get()
+        seqs = list(range(last_seq - len(messages) + 1, last_seq + 1))
+        Message.objects.bulk_create([
+            Message(c_id_id=conv_id, m_seq=seq, m_content=message, m_text=raw_message_text(message)) for seq, message in zip(seqs, messages)
+        ])
+    return seqs
+
+def append_message(conv_id: int, message: dict) -> int:
+    """Append a single message to a conversation and return its seq"""
+    return append_messages(conv_id, [message])[0]
+
+def fetch_conversation_summary(conv_id: int):
+    """Return the stored summary and the number of messages it covers"""
+    try:
+        conversation = Conversation.objects.only('c_summary', 'c_summary_upto').get(c_id=conv_id)
+        return conversation.c_summary, conversation.c_summary_upto
+    except Conversation.DoesNotExist:
+        logger.error(f"No conversation found with ID: {conv_id}")
+        return "", 0
+
+def update_conversation_summary(conv_id: int, summary: str, summary_upto: int):
+    Conversation.objects.filter(c_id=conv_id).update(c_summary=summary, c_summary_upto=summary_upto)
@@ -31,3 +31,6 @@ def get_user_from_query_param(request) -> User:
 def get_user_from_body(request) -> User:
     token = fetch_token_from_body(request)
     return fetch_user(token)
+
+def update_google_auth(token: str, google_auth: dict):
+    User.objects.filter(u_id=token).update(u_google_auth=google_auth)
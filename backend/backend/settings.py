@@ -49,11 +49,26 @@ INSTALLED_APPS = [
     "database_service"
 ]
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
-}
+# "postgres" shares groups across ASGI workers and hosts through LISTEN/NOTIFY
+CHANNEL_LAYER = os.getenv('CHANNEL_LAYER', 'memory')
+
+if CHANNEL_LAYER == 'postgres':
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "database_service.channel_layer.PostgresChannelLayer",
+            "CONFIG": {
+                "expiry": int(os.getenv('CHANNEL_LAYER_EXPIRY', '60')),
+                "group_expiry": int(os.getenv('CHANNEL_LAYER_GROUP_EXPIRY', '86400')),
+                "capacity": int(os.getenv('CHANNEL_LAYER_CAPACITY', '100')),
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
@@ -0,0 +1,407 @@
+import json
+import time
+import uuid
+import random
+import itertools
+import functools
+import select
+import string
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+import psycopg2
+from asgiref.sync import sync_to_async
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+from django.db import connection, close_old_connections
+from django.utils import timezone
+from database_service.models import ChannelGroupMember, ChannelMessage
+
+logger = logging.getLogger(__name__)
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7900
+# Expired group memberships and spilled messages are swept every this many writes
+CLEANUP_EVERY = 100
+# Every process listens here for group_add and group_discard made by any process
+GROUP_NOTIFY_CHANNEL = "channels_groups"
+# Cached group members are reloaded from the table at least this often, covering missed notifications
+GROUP_CACHE_TTL = 30
+
+def with_connection(func):
+    """
+    Run a database helper on a worker thread the way Django runs a request: connections
+    the thread kept from earlier calls are dropped first when broken or past CONN_MAX_AGE,
+    and again afterwards.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return wrapper
+
+class PostgresChannelLayer(BaseChannelLayer):
+    """
+    Channel layer that spans processes and hosts through the Postgres database.
+
+    Every process LISTENs on its own notification channel and owns the specific
+    channels it creates. Group membership is stored in ChannelGroupMember, and a
+    send is one NOTIFY per target process. Payloads over the NOTIFY limit are
+    written to ChannelMessage, and the notification carries only the row id.
+    Messages for channels of the sending process skip the database.
+
+    Members of the groups a process sends to are cached and kept current by
+    membership notifications, so a group_send (one per streamed token) does not
+    query the table while the listener is connected.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(self, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.group_expiry = group_expiry
+        self.process_id = f"pg{uuid.uuid4().hex[:12]}"
+        self.notify_channel = f"channels_{self.process_id}"
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._writes = itertools.count(1)
+        # group -> (loaded_at, {channel: expires_at timestamp})
+        self._groups = {}
+
+    # Channel names
+
+    def _process_of(self, channel: str) -> str:
+        return self.non_local_name(channel).rstrip("!").rsplit(".", 1)[-1]
+
+    def _notify_channel_of(self, process_id: str) -> str:
+        return f"channels_{process_id}"
+
+    # Channel layer API
+
+    async def new_channel(self, prefix="specific."):
+        self._start_listener()
+        channel = "%s%s!%s" % (
+            prefix if prefix.endswith(".") else prefix + ".",
+            self.process_id,
+            "".join(random.choice(string.ascii_letters) for _ in range(12)),
+        )
+        self._local_queue(channel)
+        return channel
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        if "!" not in channel:
+            raise NotImplementedError("PostgresChannelLayer only delivers to process-specific channels")
+
+        process_id = self._process_of(channel)
+        if process_id == self.process_id:
+            self._put(channel, message, raise_full=True)
+            return
+        await sync_to_async(self._notify, thread_sensitive=False)({process_id: [channel]}, message)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        queue = self._local_queue(channel)
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+        except asyncio.CancelledError:
+            # The consumer went away; forget its queue unless messages are still waiting
+            if queue.empty():
+                with self._lock:
+                    self._channels.pop(channel, None)
+            raise
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        expires = time.time() + self.group_expiry
+        await sync_to_async(self._group_add, thread_sensitive=False)(group, channel, expires)
+        self.apply_membership(group, channel, expires)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await sync_to_async(self._group_discard, thread_sensitive=False)(group, channel)
+        self.apply_membership(group, channel, None)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+
+        self._start_listener()
+        channels = self._cached_members(group)
+        if channels is None:
+            channels = await sync_to_async(self._load_group, thread_sensitive=False)(group)
+        by_process = defaultdict(list)
+        for channel in channels:
+            by_process[self._process_of(channel)].append(channel)
+
+        for channel in by_process.pop(self.process_id, []):
+            self._put(channel, message)
+        if by_process:
+            await sync_to_async(self._notify, thread_sensitive=False)(by_process, message)
+
+    async def flush(self):
+        with self._lock:
+            self._channels = {}
+            self._groups = {}
+        await sync_to_async(self._flush, thread_sensitive=False)()
+
+    async def close(self):
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+
+    # Local delivery
+
+    def _local_queue(self, channel: str) -> asyncio.Queue:
+        with self._lock:
+            entry = self._channels.get(channel)
+            if entry is None:
+                entry = self._channels[channel] = (
+                    asyncio.get_running_loop(),
+                    asyncio.Queue(maxsize=self.get_capacity(channel))
+                )
+            return entry[1]
+
+    def _put(self, channel: str, message: dict, raise_full: bool = False):
+        """Queue a message on a channel of this process, from its loop or from the listener thread"""
+        with self._lock:
+            entry = self._channels.get(channel)
+        if entry is None:
+            return
+        loop, queue = entry
+
+        def put():
+            try:
+                queue.put_nowait((time.time() + self.expiry, message))
+            except asyncio.QueueFull:
+                if raise_full:
+                    raise ChannelFull(channel)
+                logger.warning(f"Channel {channel} is full, dropping a message.")
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            put()
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(put)
+
+    def deliver(self, payload: str, cursor):
+        """Hand a notification received by the listener to the local channels it names"""
+        data = json.loads(payload)
+        if "s" in data:
+            cursor.execute(
+                f"SELECT cm_payload FROM {ChannelMessage._meta.db_table} WHERE cm_id = %s", [data["s"]]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                logger.warning(f"Spilled channel message {data['s']} is gone.")
+                return
+            message = json.loads(row[0])
+        else:
+            message = data["m"]
+
+        for channel in data["c"]:
+            self._put(channel, message)
+
+    # Group membership cache
+
+    def _cached_members(self, group: str):
+        """Live members of a cached group, or None when the table must be asked"""
+        with self._lock:
+            entry = self._groups.get(group)
+            if not self._listening() or entry is None or time.time() - entry[0] > GROUP_CACHE_TTL:
+                return None
+            now = time.time()
+            return [channel for channel, expires in entry[1].items() if expires > now]
+
+    def apply_membership(self, group: str, channel: str, expires):
+        """Reflect a group_add (expires set) or group_discard (expires None) in the cache"""
+        with self._lock:
+            entry = self._groups.get(group)
+            if entry is None:
+                return
+            if expires is None:
+                entry[1].pop(channel, None)
+            else:
+                entry[1][channel] = expires
+
+    def apply_membership_notification(self, payload: str):
+        data = json.loads(payload)
+        self.apply_membership(data["g"], data["c"], data.get("x"))
+
+    def reset_groups(self):
+        """Forget cached groups, e.g. after the listener missed notifications while reconnecting"""
+        with self._lock:
+            self._groups = {}
+
+    def _listening(self) -> bool:
+        return self._listener is not None and self._listener.connected
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = NotificationListener(self)
+                self._listener.start()
+
+    # Database side, run in worker threads
+
+    @with_connection
+    def _group_add(self, group: str, channel: str, expires: float):
+        ChannelGroupMember.objects.bulk_create(
+            [ChannelGroupMember(
+                cg_group=group,
+                cg_channel=channel,
+                cg_expires_at=datetime.fromtimestamp(expires, tz=dt_timezone.utc)
+            )],
+            update_conflicts=True,
+            unique_fields=["cg_group", "cg_channel"],
+            update_fields=["cg_expires_at"]
+        )
+        self._notify_membership(group, channel, expires)
+        self._maybe_cleanup()
+
+    @with_connection
+    def _group_discard(self, group: str, channel: str):
+        ChannelGroupMember.objects.filter(cg_group=group, cg_channel=channel).delete()
+        self._notify_membership(group, channel, None)
+
+    def _notify_membership(self, group: str, channel: str, expires):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)",
+                [GROUP_NOTIFY_CHANNEL, json.dumps({"g": group, "c": channel, "x": expires})]
+            )
+
+    @with_connection
+    def _load_group(self, group: str) -> list:
+        """Read a group's live members and, while notifications are flowing, cache them"""
+        listening = self._listening()
+        if listening:
+            # Registered before the query so changes notified meanwhile are not lost
+            with self._lock:
+                pending = self._groups[group] = (0, {})
+
+        members = {
+            channel: expires_at.timestamp()
+            for channel, expires_at in ChannelGroupMember.objects.filter(
+                cg_group=group, cg_expires_at__gt=timezone.now()
+            ).values_list("cg_channel", "cg_expires_at")
+        }
+
+        if listening:
+            with self._lock:
+                if self._groups.get(group) is pending:
+                    members.update(pending[1])
+                    self._groups[group] = (time.time(), members)
+        return list(members)
+
+    @with_connection
+    def _notify(self, by_process: dict, message: dict):
+        """One pg_notify per target process, all in a single statement"""
+        encoded = json.dumps(message)
+        spill_id = None
+        notifications = []
+        for process_id, channels in by_process.items():
+            payload = json.dumps({"c": channels, "m": message})
+            if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+                if spill_id is None:
+                    spill_id = ChannelMessage.objects.create(cm_payload=encoded).cm_id
+                    self._maybe_cleanup()
+                payload = json.dumps({"c": channels, "s": spill_id})
+            notifications.append((self._notify_channel_of(process_id), payload))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT " + ", ".join(["pg_notify(%s, %s)"] * len(notifications)),
+                [value for notification in notifications for value in notification]
+            )
+
+    def _maybe_cleanup(self):
+        if next(self._writes) % CLEANUP_EVERY:
+            return
+        now = timezone.now()
+        ChannelGroupMember.objects.filter(cg_expires_at__lte=now).delete()
+        ChannelMessage.objects.filter(cm_created_at__lt=now - timedelta(seconds=self.expiry)).delete()
+
+    @with_connection
+    def _flush(self):
+        ChannelGroupMember.objects.filter(cg_channel__contains=f".{self.process_id}!").delete()
+
+class NotificationListener(threading.Thread):
+    """Keeps a dedicated connection LISTENing for the process and feeds its notifications to the layer"""
+
+    def __init__(self, layer: PostgresChannelLayer):
+        super().__init__(name="channel-layer-listener", daemon=True)
+        self.layer = layer
+        self.connected = False
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _connect(self):
+        database = settings.DATABASES["default"]
+        conn = psycopg2.connect(
+            dbname=database["NAME"],
+            user=database["USER"],
+            password=database["PASSWORD"],
+            host=database["HOST"],
+            port=database["PORT"]
+        )
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.layer.notify_channel}"')
+            cursor.execute(f'LISTEN "{GROUP_NOTIFY_CHANNEL}"')
+        return conn
+
+    def run(self):
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                conn = self._connect()
+                backoff = 1
+                # Membership changes made while disconnected were missed
+                self.layer.reset_groups()
+                self.connected = True
+                logger.info(f"Listening for channel messages on {self.layer.notify_channel}.")
+                self._listen(conn)
+            except Exception as e:
+                self.connected = False
+                logger.error(f"Channel layer listener failed, reconnecting in {backoff}s: {e}")
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _listen(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        try:
+                            if notification.channel == GROUP_NOTIFY_CHANNEL:
+                                self.layer.apply_membership_notification(notification.payload)
+                            else:
+                                self.layer.deliver(notification.payload, cursor)
+                        except Exception as e:
+                            logger.error(f"Failed to deliver channel message: {e}", exc_info=True)
+        finally:
+            self.connected = False
+            conn.close()
@@ -1,20 +1,36 @@
+import os
 import logging
 import json
+from urllib.parse import parse_qs
 from database_service.models import Conversation
 from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.db import transaction
 from database_service.serializers import ConversationSerializer
+from app_lib.utils.conversations import append_messages, fetch_messages_since
+from database_service.consumers.replay import replay_buffer
 import asyncio
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Reconnects further behind than this get a full snapshot instead of a replay
+REPLAY_MAX_GAP = int(os.getenv('WS_REPLAY_MAX_GAP', '200'))
+# Incoming messages are held this long, or until a conversation_flush frame, and written together
+MESSAGE_FLUSH_MS = int(os.getenv('WS_MESSAGE_FLUSH_MS', '50'))
+MESSAGE_FLUSH_MAX = int(os.getenv('WS_MESSAGE_FLUSH_MAX', '32'))
+# A failed write keeps its messages and is retried with backoff; on disconnect this many times
+MESSAGE_FLUSH_RETRIES = int(os.getenv('WS_MESSAGE_FLUSH_RETRIES', '5'))
+MESSAGE_FLUSH_MAX_BACKOFF = 5
+
 class ConversationUpdatesWebSocket(AsyncWebsocketConsumer):
     async def connect(self):
         # Extract the section ID from the URL route
         self.conversation_id = self.scope['url_route']['kwargs']['conversationId']
         self.group_name = f'Conversation_{self.conversation_id}'
+        self._pending = []
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_failures = 0
 
         exists = await sync_to_async(Conversation.objects.filter(c_id=self.conversation_id).exists)()
         if not exists:
@@ -29,14 +45,55 @@ class ConversationUpdatesWebSocket(AsyncWebsocketConsumer):
         )
         
         try:
-            conversation = await sync_to_async(self._get_conversation)()
-            serialized = ConversationSerializer(conversation).data
-            await self.send(text_data=json.dumps({
-                'data': serialized
-            }))
+            since = self._requested_since()
+            if since is None or not await self._send_replay(since):
+                serialized = await sync_to_async(self._get_snapshot)()
+                await self.send(text_data=json.dumps({
+                    'data': serialized
+                }))
         except Exception as e:
             logger.error(f"Error sending initial data: {str(e)}", exc_info=True)
+
+    def _requested_since(self):
+        """The ?since=<seq> a reconnecting client passes, or None for a fresh subscription"""
+        values = parse_qs(self.scope.get('query_string', b'').decode()).get('since')
+        try:
+            return int(values[0]) if values else None
+        except ValueError:
+            return None
+
+    async def _send_replay(self, since: int) -> bool:
+        """
+        Send a resuming client the messages it missed as one delta, from the replay
+        buffer or the Message table. Returns False when a full snapshot is needed instead.
+        """
+        name, last_seq = await sync_to_async(
+            Conversation.objects.filter(c_id=self.conversation_id).values_list('c_name', 'c_last_seq').get
+        )()
+        if since < 0 or since > last_seq or last_seq - since > REPLAY_MAX_GAP:
+            return False
+
+        missed = replay_buffer.since(self.conversation_id, since, last_seq)
+        if missed is None:
+            missed = await sync_to_async(fetch_messages_since)(self.conversation_id, since)
+        if missed:
+            # Rows appended after c_last_seq was read may be included; the delta's seq follows them
+            last_seq = max(last_seq, missed[-1][0])
+
+        logger.info(f"Replaying {len(missed)} messages of conversation {self.conversation_id} after seq {since}.")
+        await self.send(text_data=json.dumps({
+            'delta': {
+                'seq': last_seq,
+                'c_name': name,
+                'messages': [{'seq': seq, 'message': message} for seq, message in missed]
+            }
+        }))
+        return True
         
+    def _get_snapshot(self) -> dict:
+        # The serializer reads the Message table, which cannot happen on the event loop
+        return ConversationSerializer(self._get_conversation()).data
+
     def _get_conversation(self):
         try:
             return Conversation.objects.get(c_id=self.conversation_id, c_deleted=False)
@@ -46,6 +103,17 @@ class ConversationUpdatesWebSocket(AsyncWebsocketConsumer):
             return None
 
     async def disconnect(self, close_code):
+        # Messages still held must not be lost with the connection
+        for _ in range(MESSAGE_FLUSH_RETRIES):
+            if await self._flush_messages(retry=False):
+                break
+            await asyncio.sleep(self._retry_delay())
+        else:
+            logger.error(
+                f"Could not save {len(self._pending)} messages of conversation {self.conversation_id}, "
+                f"dropping them (roles: {', '.join(message.get('role', '?') for message in self._pending)})"
+            )
+
         # Remove the client from the group
         await self.channel_layer.group_discard(
             self.group_name,
@@ -56,58 +124,117 @@ class ConversationUpdatesWebSocket(AsyncWebsocketConsumer):
         # Process received data (expected to be JSON)
         data = json.loads(text_data)
 
+        # Streamed token deltas are relayed as-is and never persisted
+        if data.get('type') == 'conversation_stream':
+            await self._broadcast_stream(data["message"])
+            return
+
         if data.get('type') == 'conversation_name':
-            await self._handle_name_update(data["message"]["c_name"])
+            # Held messages go first so the rename carries the latest seq
+            await self._flush_messages()
+            new_name = data["message"]["c_name"]
+            seq = await self._handle_name_update(new_name)
+            await self._broadcast_delta({'seq': seq, 'c_name': new_name})
         elif data.get('type') == 'conversation_message':
-            await self._handle_message_update(data["message"])
+            self._pending.append(data["message"])
+            if len(self._pending) >= MESSAGE_FLUSH_MAX:
+                await self._flush_messages()
+            elif self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+        elif data.get('type') == 'conversation_flush':
+            await self._flush_messages()
+
+    async def _flush_later(self, delay: float = MESSAGE_FLUSH_MS / 1000):
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self._flush_messages()
+
+    def _retry_delay(self) -> float:
+        return min(MESSAGE_FLUSH_MS / 1000 * 2 ** self._flush_failures, MESSAGE_FLUSH_MAX_BACKOFF)
 
-        await self._broadcast_update()
+    async def _flush_messages(self, retry: bool = True) -> bool:
+        """
+        Write the held messages in one transaction and broadcast them as one delta.
+
+        When the write fails the messages stay held, ahead of any received meanwhile, and
+        another attempt is scheduled unless `retry` is False. Returns whether all were saved.
+        """
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        async with self._flush_lock:
+            messages, self._pending = self._pending, []
+            if not messages:
+                return True
+            try:
+                seqs = await self._handle_message_update(messages)
+            except Exception as e:
+                self._pending = messages + self._pending
+                self._flush_failures += 1
+                logger.error(
+                    f"Error saving {len(messages)} messages (attempt {self._flush_failures}), keeping them: {str(e)}",
+                    exc_info=True
+                )
+                if retry and self._flush_task is None:
+                    self._flush_task = asyncio.create_task(self._flush_later(self._retry_delay()))
+                return False
+            self._flush_failures = 0
+
+            logger.debug(f"Saved {len(messages)} messages of conversation {self.conversation_id} in one write.")
+            await self._broadcast_delta({
+                'seq': seqs[-1],
+                'messages': [{'seq': seq, 'message': message} for seq, message in zip(seqs, messages)]
+            })
+            return True
 
     async def _handle_name_update(self, new_name):
-        await sync_to_async(self._update_name_in_db)(new_name)
+        return await sync_to_async(self._update_name_in_db)(new_name)
 
     def _update_name_in_db(self, new_name):
-        with transaction.atomic():
-            conversation = Conversation.objects.select_for_update().get(c_id=self.conversation_id)
-            conversation.c_name = new_name
-            conversation.save()
+        """Rename the conversation and return its current seq; a rename does not advance it"""
+        Conversation.objects.filter(c_id=self.conversation_id).update(c_name=new_name)
+        return Conversation.objects.filter(c_id=self.conversation_id).values_list('c_last_seq', flat=True).get()
 
     async def _handle_message_update(self, new_messages):
-        await sync_to_async(self._update_messages_in_db)(new_messages)
+        return await sync_to_async(self._update_messages_in_db)(new_messages)
 
-    def _update_messages_in_db(self, new_message):
-        with transaction.atomic():
-            raw_message = ""
-            try:
-                message_content = new_message.get("content", "")
-                if type(message_content) == list:
-                    raw_message = message_content[0].get("text", "")
-                elif type(message_content) == str:
-                    raw_message = message_content
-
-            except (IndexError, KeyError):
-                logger.error(f"Error extracting raw message from new message: {new_message}", exc_info=True)
+    def _update_messages_in_db(self, new_messages):
+        return append_messages(self.conversation_id, new_messages)
 
-            conversation = Conversation.objects.select_for_update().get(c_id=self.conversation_id)
-            conversation.c_rawmessages += raw_message + "\n"
-            conversation.c_messages.append(new_message)
-            conversation.save()
+    async def delta_message(self, event):
+        for item in event['delta'].get('messages', []):
+            replay_buffer.record(self.conversation_id, item['seq'], item['message'])
+        try:
+            await self.send(text_data=json.dumps({
+                'delta': event['delta']
+            }))
+        except Exception as e:
+            logger.error(f"Error sending delta: {str(e)}", exc_info=True)
 
-    async def chat_message(self, event):
+    async def stream_message(self, event):
         try:
             await self.send(text_data=json.dumps({
-                'data': event['message']
+                'stream': event['message']
             }))
         except Exception as e:
-            logger.error(f"Error sending chat message: {str(e)}", exc_info=True)
+            logger.error(f"Error sending stream message: {str(e)}", exc_info=True)
+
+    async def _broadcast_stream(self, message):
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                'type': 'stream_message',
+                'message': message
+            }
+        )
 
-    async def _broadcast_update(self):
-        conversation = await sync_to_async(self._get_conversation)()
-        serialized = ConversationSerializer(conversation).data
+    async def _broadcast_delta(self, delta):
+        """Fan out only what changed, tagged with the conversation's seq, for clients to apply locally"""
         await self.channel_layer.group_send(
             self.group_name,
             {
-                'type': 'chat_message',
-                'message': serialized
+                'type': 'delta_message',
+                'delta': delta
             }
         )
@@ -0,0 +1,46 @@
+import os
+import threading
+from collections import OrderedDict, deque
+
+REPLAY_BUFFER_SIZE = int(os.getenv('WS_REPLAY_BUFFER_SIZE', '200'))
+REPLAY_CONVERSATIONS = int(os.getenv('WS_REPLAY_CONVERSATIONS', '512'))
+
+class ReplayBuffer:
+    """
+    The last REPLAY_BUFFER_SIZE messages of recently active conversations, by seq.
+
+    Every consumer of a conversation records the deltas it receives, so entries are
+    deduplicated by seq; only contiguous runs are kept, making a hit always complete.
+    """
+
+    def __init__(self, size: int = REPLAY_BUFFER_SIZE, max_conversations: int = REPLAY_CONVERSATIONS):
+        self.size = size
+        self.max_conversations = max_conversations
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, conversation_id, seq: int, message: dict):
+        with self._lock:
+            buffer = self._buffers.get(conversation_id)
+            if buffer is None:
+                buffer = self._buffers[conversation_id] = deque(maxlen=self.size)
+                while len(self._buffers) > self.max_conversations:
+                    self._buffers.popitem(last=False)
+            self._buffers.move_to_end(conversation_id)
+
+            if buffer and seq <= buffer[-1][0]:
+                return
+            if buffer and seq != buffer[-1][0] + 1:
+                # A hole would make later replays incomplete, start a new run instead
+                buffer.clear()
+            buffer.append((seq, message))
+
+    def since(self, conversation_id, after_seq: int, last_seq: int):
+        """Messages after `after_seq` up to `last_seq`, or None when the buffer does not cover them"""
+        with self._lock:
+            buffer = self._buffers.get(conversation_id)
+            if not buffer or buffer[0][0] > after_seq + 1 or buffer[-1][0] < last_seq:
+                return None
+            return [(seq, message) for seq, message in buffer if after_seq < seq <= last_seq]
+
+replay_buffer = ReplayBuffer()
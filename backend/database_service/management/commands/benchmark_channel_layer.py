@@ -0,0 +1,90 @@
+import time
+import asyncio
+import multiprocessing
+from django.db import connections
+from django.core.management.base import BaseCommand
+from database_service.channel_layer import PostgresChannelLayer
+
+GROUP = "benchmark_fanout"
+
+def receive_process(channels: int, messages: int, ready, results):
+    """Join the group with a few channels and report how long the fan-out took to arrive"""
+
+    async def run():
+        layer = PostgresChannelLayer(capacity=messages + 1)
+        names = [await layer.new_channel() for _ in range(channels)]
+        for name in names:
+            await layer.group_add(GROUP, name)
+        # Give the listener thread time to LISTEN before the sender starts
+        await asyncio.sleep(1)
+        ready.put(True)
+
+        received = 0
+
+        async def drain(name):
+            nonlocal received
+            for _ in range(messages):
+                await layer.receive(name)
+                received += 1
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(drain(name) for name in names)), timeout=120)
+        except asyncio.TimeoutError:
+            pass
+        results.put((received, time.time()))
+
+        for name in names:
+            await layer.group_discard(GROUP, name)
+        await layer.close()
+
+    connections.close_all()
+    asyncio.run(run())
+
+class Command(BaseCommand):
+    help = "Benchmark group fan-out through the Postgres channel layer with receivers in separate processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help="Receiving processes.")
+        parser.add_argument('--channels', type=int, default=25, help="Group members per receiving process.")
+        parser.add_argument('--messages', type=int, default=500, help="Messages sent to the group.")
+        parser.add_argument('--payload-bytes', type=int, default=200, help="Message size; over ~7900 bytes spills to the table.")
+
+    def handle(self, *args, **options):
+        processes, messages = options['processes'], options['messages']
+        context = multiprocessing.get_context("fork")
+        ready, results = context.Queue(), context.Queue()
+
+        connections.close_all()
+        workers = [
+            context.Process(target=receive_process, args=(options['channels'], messages, ready, results))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for _ in workers:
+            ready.get(timeout=60)
+
+        async def send():
+            layer = PostgresChannelLayer()
+            message = {"type": "benchmark.message", "payload": "x" * options['payload_bytes']}
+            began = time.perf_counter()
+            for _ in range(messages):
+                await layer.group_send(GROUP, message)
+            return time.perf_counter() - began
+
+        started = time.time()
+        send_seconds = asyncio.run(send())
+        reports = [results.get(timeout=180) for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        delivered = sum(report[0] for report in reports)
+        finished = max(report[1] for report in reports)
+        total_seconds = finished - started
+        expected = processes * options['channels'] * messages
+
+        self.stdout.write(f"group_send: {messages} messages in {send_seconds:.2f}s, {messages / send_seconds:,.0f} msg/s")
+        self.stdout.write(
+            f"delivered: {delivered}/{expected} in {total_seconds:.2f}s, {delivered / total_seconds:,.0f} deliveries/s "
+            f"({processes} processes x {options['channels']} channels, {options['payload_bytes']} byte payloads)"
+        )
@@ -0,0 +1,72 @@
+# Generated by Django 5.2 on 2026-10-18 12:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0018_conversation_c_rawmessages"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AgentJob",
+            fields=[
+                ("j_id", models.AutoField(primary_key=True, serialize=False)),
+                ("j_kind", models.CharField(max_length=30)),
+                ("j_payload", models.JSONField(default=dict)),
+                (
+                    "j_status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                    ),
+                ),
+                ("j_attempts", models.IntegerField(default=0)),
+                ("j_max_attempts", models.IntegerField(default=3)),
+                (
+                    "j_run_after",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "j_locked_by",
+                    models.CharField(blank=True, default="", max_length=100),
+                ),
+                ("j_locked_until", models.DateTimeField(blank=True, null=True)),
+                ("j_error", models.TextField(blank=True, default="")),
+                (
+                    "j_created_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("j_updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "c_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="database_service.conversation",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["j_status", "j_run_after"],
+                        name="agentjob_status_run_idx",
+                    ),
+                    models.Index(
+                        fields=["j_status", "j_locked_until"],
+                        name="agentjob_status_lock_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0019_agentjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="c_summary",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="c_summary_upto",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2 on 2026-10-18 12:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0020_conversation_c_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarSyncState",
+            fields=[
+                ("cs_id", models.AutoField(primary_key=True, serialize=False)),
+                ("cs_calendar_id", models.CharField(max_length=255)),
+                ("cs_sync_token", models.TextField(blank=True, default="")),
+                ("cs_synced_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "u_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="database_service.user",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("u_id", "cs_calendar_id"),
+                        name="calendarsyncstate_unique_calendar",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MirroredEvent",
+            fields=[
+                ("me_id", models.AutoField(primary_key=True, serialize=False)),
+                ("me_calendar_id", models.CharField(max_length=255)),
+                ("me_event_id", models.CharField(max_length=255)),
+                ("me_start", models.DateTimeField()),
+                ("me_end", models.DateTimeField()),
+                ("me_all_day", models.BooleanField(default=False)),
+                ("me_payload", models.JSONField(default=dict)),
+                ("me_updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "u_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="database_service.user",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["u_id", "me_start", "me_end"],
+                        name="mirroredevent_range_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("u_id", "me_calendar_id", "me_event_id"),
+                        name="mirroredevent_unique_event",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2 on 2026-10-18 12:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_messages(apps, schema_editor):
+    Conversation = apps.get_model("database_service", "Conversation")
+    Message = apps.get_model("database_service", "Message")
+
+    for conversation in Conversation.objects.only("c_id", "c_messages").iterator(
+        chunk_size=100
+    ):
+        messages = conversation.c_messages or []
+        Message.objects.bulk_create(
+            [
+                Message(c_id_id=conversation.c_id, m_seq=seq, m_content=message)
+                for seq, message in enumerate(messages, start=1)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        Conversation.objects.filter(c_id=conversation.c_id).update(
+            c_last_seq=len(messages)
+        )
+
+
+def restore_messages(apps, schema_editor):
+    Conversation = apps.get_model("database_service", "Conversation")
+    Message = apps.get_model("database_service", "Message")
+
+    for conversation in Conversation.objects.only("c_id").iterator(chunk_size=100):
+        messages = (
+            Message.objects.filter(c_id=conversation.c_id)
+            .order_by("m_seq")
+            .values_list("m_content", flat=True)
+        )
+        Conversation.objects.filter(c_id=conversation.c_id).update(
+            c_messages=list(messages)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0021_calendar_mirror"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="c_last_seq",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="Message",
+            fields=[
+                ("m_id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("m_seq", models.IntegerField()),
+                ("m_content", models.JSONField(default=dict)),
+                (
+                    "m_created_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "c_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="database_service.conversation",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("c_id", "m_seq"), name="message_unique_seq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_messages, restore_messages),
+        migrations.RemoveField(
+            model_name="conversation",
+            name="c_messages",
+        ),
+    ]
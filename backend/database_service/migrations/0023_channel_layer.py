@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 12:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0022_message_table"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChannelMessage",
+            fields=[
+                ("cm_id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("cm_payload", models.TextField()),
+                (
+                    "cm_created_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ChannelGroupMember",
+            fields=[
+                ("cg_id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("cg_group", models.CharField(max_length=100)),
+                ("cg_channel", models.CharField(max_length=100)),
+                ("cg_expires_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["cg_expires_at"], name="channelgroupmember_expiry_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("cg_group", "cg_channel"),
+                        name="channelgroupmember_unique",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0023_channel_layer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentjob",
+            name="j_start_seq",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
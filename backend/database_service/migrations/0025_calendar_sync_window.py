@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+def require_full_sync(apps, schema_editor):
+    # Existing mirrors do not know their window; the next sync reloads them and records it
+    CalendarSyncState = apps.get_model("database_service", "CalendarSyncState")
+    CalendarSyncState.objects.update(cs_sync_token="")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0024_agent_job_start_seq"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarsyncstate",
+            name="cs_synced_from",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(require_full_sync, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0025_calendar_sync_window"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="mirroredevent",
+            name="mirroredevent_range_idx",
+        ),
+        migrations.AddIndex(
+            model_name="mirroredevent",
+            index=models.Index(
+                fields=["u_id", "me_calendar_id", "me_start"],
+                name="mirroredevent_cal_start_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def message_text(content):
+    """Same as app_lib.utils.conversations.raw_message_text, frozen for this migration"""
+    content = content.get("content", "") if isinstance(content, dict) else ""
+    if isinstance(content, list):
+        return content[0].get("text", "") if content and isinstance(content[0], dict) else ""
+    return content if isinstance(content, str) else ""
+
+
+def backfill_text(apps, schema_editor):
+    Message = apps.get_model("database_service", "Message")
+
+    batch = []
+    for message in Message.objects.only("m_id", "m_content").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        message.m_text = message_text(message.m_content)
+        batch.append(message)
+        if len(batch) >= BATCH_SIZE:
+            Message.objects.bulk_update(batch, ["m_text"])
+            batch = []
+    Message.objects.bulk_update(batch, ["m_text"])
+
+
+def restore_rawmessages(apps, schema_editor):
+    Conversation = apps.get_model("database_service", "Conversation")
+    Message = apps.get_model("database_service", "Message")
+
+    for conversation in Conversation.objects.only("c_id").iterator(chunk_size=100):
+        texts = (
+            Message.objects.filter(c_id=conversation.c_id)
+            .order_by("m_seq")
+            .values_list("m_text", flat=True)
+        )
+        Conversation.objects.filter(c_id=conversation.c_id).update(
+            c_rawmessages="".join(text + "\n" for text in texts)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("database_service", "0026_mirrored_event_calendar_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="m_text",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.RunPython(backfill_text, migrations.RunPython.noop),
+        migrations.RunPython(migrations.RunPython.noop, restore_rawmessages),
+        migrations.RemoveField(
+            model_name="conversation",
+            name="c_rawmessages",
+        ),
+    ]
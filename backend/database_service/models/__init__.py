@@ -1,5 +1,9 @@
 from database_service.models.conversations import Conversation
+from database_service.models.messages import Message
 from database_service.models.user_info import UserInfo
 from database_service.models.categories import Category
 from database_service.models.KVStore import KeyValueStore
 from database_service.models.users import User
+from database_service.models.agent_jobs import AgentJob
+from database_service.models.calendar_events import MirroredEvent, CalendarSyncState
+from database_service.models.channel_layer import ChannelGroupMember, ChannelMessage
@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+from database_service.models.conversations import Conversation
+
+class AgentJob(models.Model):
+    KIND_AGENT_ACTION = "agent_action"
+    KIND_CONVERSATION_NAME = "conversation_name"
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    j_id = models.AutoField(primary_key=True)
+    c_id = models.ForeignKey(Conversation, on_delete=models.CASCADE)
+    j_kind = models.CharField(max_length=30)
+    j_payload = models.JSONField(default=dict)
+    j_status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    j_attempts = models.IntegerField(default=0)
+    j_max_attempts = models.IntegerField(default=3)
+    j_run_after = models.DateTimeField(default=timezone.now)
+    j_locked_by = models.CharField(max_length=100, default="", blank=True)
+    j_locked_until = models.DateTimeField(null=True, blank=True)
+    j_error = models.TextField(default="", blank=True)
+    # Conversation seq before the first attempt, so retries can resume instead of starting over
+    j_start_seq = models.IntegerField(null=True, blank=True)
+    j_created_at = models.DateTimeField(default=timezone.now)
+    j_updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.j_kind} #{self.j_id} ({self.j_status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["j_status", "j_run_after"], name="agentjob_status_run_idx"),
+            models.Index(fields=["j_status", "j_locked_until"], name="agentjob_status_lock_idx"),
+        ]
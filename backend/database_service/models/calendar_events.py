@@ -0,0 +1,42 @@
+from django.db import models
+from database_service.models.users import User
+
+class MirroredEvent(models.Model):
+    """Local copy of a Google Calendar event, kept current by incremental sync"""
+    me_id = models.AutoField(primary_key=True)
+    u_id = models.ForeignKey(User, on_delete=models.CASCADE)
+    me_calendar_id = models.CharField(max_length=255)
+    me_event_id = models.CharField(max_length=255)
+    me_start = models.DateTimeField()
+    me_end = models.DateTimeField()
+    me_all_day = models.BooleanField(default=False)
+    me_payload = models.JSONField(default=dict)
+    me_updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.me_calendar_id}/{self.me_event_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["u_id", "me_calendar_id", "me_event_id"], name="mirroredevent_unique_event"),
+        ]
+        indexes = [
+            models.Index(fields=["u_id", "me_calendar_id", "me_start"], name="mirroredevent_cal_start_idx"),
+        ]
+
+class CalendarSyncState(models.Model):
+    cs_id = models.AutoField(primary_key=True)
+    u_id = models.ForeignKey(User, on_delete=models.CASCADE)
+    cs_calendar_id = models.CharField(max_length=255)
+    cs_sync_token = models.TextField(default="", blank=True)
+    cs_synced_at = models.DateTimeField(null=True, blank=True)
+    # Start of the window the last full sync loaded; earlier events may be missing
+    cs_synced_from = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.u_id} - {self.cs_calendar_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["u_id", "cs_calendar_id"], name="calendarsyncstate_unique_calendar"),
+        ]
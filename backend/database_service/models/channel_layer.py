@@ -0,0 +1,29 @@
+from django.db import models
+from django.utils import timezone
+
+class ChannelGroupMember(models.Model):
+    """Membership of a channel in a group, shared by every process of the Postgres channel layer"""
+    cg_id = models.BigAutoField(primary_key=True)
+    cg_group = models.CharField(max_length=100)
+    cg_channel = models.CharField(max_length=100)
+    cg_expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.cg_group} <- {self.cg_channel}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cg_group", "cg_channel"], name="channelgroupmember_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["cg_expires_at"], name="channelgroupmember_expiry_idx"),
+        ]
+
+class ChannelMessage(models.Model):
+    """Message too large for a NOTIFY payload; the notification carries only its id"""
+    cm_id = models.BigAutoField(primary_key=True)
+    cm_payload = models.TextField()
+    cm_created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Channel message #{self.cm_id}"
@@ -3,8 +3,8 @@ from django.utils import timezone
 from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank, SearchHeadline, TrigramSimilarity
 from database_service.models.users import User
 from django.contrib.postgres.aggregates import StringAgg
-from django.db.models import F, Q
-from django.db.models.functions import Greatest
+from django.db.models import F, Q, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 
 class Conversation(models.Model):
     c_id = models.AutoField(primary_key=True)
@@ -12,16 +12,23 @@ class Conversation(models.Model):
     c_name = models.CharField(max_length=200, default="Untitled")
     c_deleted = models.BooleanField(default=False)
     c_created_at = models.DateTimeField(default=timezone.now)
-    c_messages = models.JSONField(default=list)
-    
-    c_rawmessages = models.TextField(default="")
+
+    # Messages live in the Message table; this is the seq of the last one appended
+    c_last_seq = models.IntegerField(default=0)
+
+    # Rolling summary of the first c_summary_upto messages, used to compact the agent's context
+    c_summary = models.TextField(default="", blank=True)
+    c_summary_upto = models.IntegerField(default=0)
 
     def __str__(self):
         return self.c_name
     
 def search_conversations(search_term: str, user_id: str):
     """
-    Search conversations by c_rawmessages and c_name with relevance ranking and highlighted previews, filtered by user_id.
+    Search conversations by the text of their messages and c_name with relevance ranking and highlighted previews, filtered by user_id.
+
+    Messages are matched one by one against their m_text, and a conversation ranks by its best matching message,
+    which also provides the preview.
     
     Args:
         search_term (str): The term to search for.
@@ -30,12 +37,25 @@ def search_conversations(search_term: str, user_id: str):
     Returns:
         Queryset: Conversations matching the search term and user_id, ranked by relevance, with previews.
     """
+    # Message imports Conversation
+    from database_service.models.messages import Message
 
-    vector_rawmessages = SearchVector('c_rawmessages', config='english')
     vector_name = SearchVector('c_name', config='english')
     query = SearchQuery(search_term, config='english')
+
+    messages = Message.objects.filter(c_id=OuterRef('c_id')).annotate(
+        score=Greatest(
+            SearchRank(SearchVector('m_text', config='english'), query),
+            TrigramSimilarity('m_text', search_term)
+        )
+    )
+    matching = Message.objects.filter(c_id=OuterRef('c_id')).annotate(
+        search_text=SearchVector('m_text', config='english'),
+        similarity_text=TrigramSimilarity('m_text', search_term)
+    ).filter(Q(search_text=query) | Q(similarity_text__gt=0.1))
+    best = messages.order_by('-score', 'm_seq')[:1]
     headline = SearchHeadline(
-        'c_rawmessages',
+        'm_text',
         query,
         config='english',
         start_sel='<b>',
@@ -44,23 +64,18 @@ def search_conversations(search_term: str, user_id: str):
         min_words=15,
     )
 
-    trigram_similarity_rawmessages = TrigramSimilarity('c_rawmessages', search_term)
     trigram_similarity_name = TrigramSimilarity('c_name', search_term)
 
     # Combine full-text search and trigram similarity
     results = Conversation.objects.filter(u_id=user_id, c_deleted=False).annotate(
-        search_rawmessages=vector_rawmessages,
         search_name=vector_name,
-        rank_rawmessages=SearchRank(vector_rawmessages, query),
+        rank_messages=Coalesce(Subquery(best.values('score')), 0.0),
         rank_name=SearchRank(vector_name, query),
-        similarity_rawmessages=trigram_similarity_rawmessages,
         similarity_name=trigram_similarity_name,
-        headline=headline,
-        combined_score=Greatest('rank_rawmessages', 'similarity_rawmessages', 'rank_name', 'similarity_name')  # Combine scores for ranking
+        headline=Subquery(best.annotate(headline=headline).values('headline')),
+        combined_score=Greatest('rank_messages', 'rank_name', 'similarity_name')  # Combine scores for ranking
     ).filter(
-        Q(search_rawmessages=query) | Q(search_name=query) | 
-        Q(similarity_rawmessages__gt=0.1) | Q(similarity_name__gt=0.1)  # Include both full-text and trigram matches
+        Exists(matching) | Q(search_name=query) | Q(similarity_name__gt=0.1)  # Include both full-text and trigram matches
     ).order_by('-c_created_at', '-combined_score')
     
     return results
-    
\ No newline at end of file
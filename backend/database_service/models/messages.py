@@ -0,0 +1,22 @@
+from django.db import models
+from django.utils import timezone
+from database_service.models.conversations import Conversation
+
+class Message(models.Model):
+    """One chat message of a conversation; rows are only ever appended, in m_seq order"""
+    m_id = models.BigAutoField(primary_key=True)
+    c_id = models.ForeignKey(Conversation, on_delete=models.CASCADE)
+    m_seq = models.IntegerField()
+    m_content = models.JSONField(default=dict)
+    # Searchable text of the message, see raw_message_text
+    m_text = models.TextField(default="", blank=True)
+    m_created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.c_id_id}#{self.m_seq}"
+
+    class Meta:
+        constraints = [
+            # Also the index behind range reads of a conversation
+            models.UniqueConstraint(fields=["c_id", "m_seq"], name="message_unique_seq"),
+        ]
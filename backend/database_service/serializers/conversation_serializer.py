@@ -1,15 +1,37 @@
 from rest_framework import serializers
-from database_service.models import Conversation
+from database_service.models import Conversation, Message
 
 class ConversationSerializer(serializers.ModelSerializer):
+    c_messages = serializers.SerializerMethodField()
+    c_last_seq = serializers.SerializerMethodField()
+
+    def _snapshot(self, conversation):
+        """
+        (seq, message) rows read once per conversation; c_last_seq is taken from them rather
+        than from the conversation row, which a concurrent append may have moved past them
+        """
+        rows = getattr(conversation, '_snapshot_rows', None)
+        if rows is None:
+            rows = conversation._snapshot_rows = list(
+                Message.objects.filter(c_id=conversation.c_id).order_by('m_seq').values_list('m_seq', 'm_content')
+            )
+        return rows
+
+    def get_c_messages(self, conversation):
+        return [message for _, message in self._snapshot(conversation)]
+
+    def get_c_last_seq(self, conversation):
+        rows = self._snapshot(conversation)
+        return rows[-1][0] if rows else 0
+
     class Meta:
         model = Conversation
-        exclude = ['u_id', 'c_rawmessages']
+        exclude = ['u_id', 'c_summary', 'c_summary_upto']
         
 class ConversationHeaderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conversation
-        exclude = ['u_id', 'c_messages', 'c_rawmessages']
+        exclude = ['u_id', 'c_last_seq', 'c_summary', 'c_summary_upto']
 
 class ConversationSearchSerializer(serializers.ModelSerializer):
     headline = serializers.CharField(read_only=True)
@@ -1,3 +1,193 @@
-from django.test import TestCase
+import json
+import time
+import asyncio
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from channels.layers import channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TestCase, override_settings
+from app_lib.utils.conversations import append_messages
+from database_service.channel_layer import PostgresChannelLayer
+from database_service.consumers.replay import ReplayBuffer, replay_buffer
+from database_service.routing import websocket_urlpatterns
+from database_service.serializers import ConversationSerializer
+from database_service.models import User, Conversation
 
-# Create your tests here.
+class FakeListener:
+    connected = True
+
+    def stop(self):
+        pass
+
+class FakeCursor:
+    """Answers the listener's lookup of a spilled message"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.row = None
+
+    def execute(self, sql, params):
+        self.row = self.rows.get(params[0])
+
+    def fetchone(self):
+        return self.row
+
+class ChannelLayerDeliveryTests(SimpleTestCase):
+    def setUp(self):
+        self.layer = PostgresChannelLayer()
+        self.layer._listener = FakeListener()
+
+    def run_async(self, func):
+        return async_to_sync(func)()
+
+    def test_deliver_inline_message_from_listener_thread(self):
+        async def run():
+            channel = await self.layer.new_channel()
+            payload = json.dumps({"c": [channel], "m": {"type": "chat.message", "text": "hi"}})
+            await asyncio.to_thread(self.layer.deliver, payload, FakeCursor({}))
+            return await asyncio.wait_for(self.layer.receive(channel), timeout=1)
+
+        self.assertEqual(self.run_async(run), {"type": "chat.message", "text": "hi"})
+
+    def test_deliver_spilled_message(self):
+        message = {"type": "chat.message", "text": "x" * 10000}
+        cursor = FakeCursor({7: (json.dumps(message),)})
+
+        async def run():
+            channel = await self.layer.new_channel()
+            await asyncio.to_thread(self.layer.deliver, json.dumps({"c": [channel], "s": 7}), cursor)
+            return await asyncio.wait_for(self.layer.receive(channel), timeout=1)
+
+        self.assertEqual(self.run_async(run), message)
+
+    def test_membership_notifications_update_cached_group(self):
+        async def run():
+            channel = await self.layer.new_channel()
+            self.layer._groups["room"] = (time.time(), {})
+
+            self.layer.apply_membership_notification(json.dumps({"g": "room", "c": channel, "x": time.time() + 60}))
+            self.assertEqual(self.layer._cached_members("room"), [channel])
+            # Served from the cache, so no database round trip
+            with patch.object(PostgresChannelLayer, '_load_group') as load_group:
+                await self.layer.group_send("room", {"type": "chat.message"})
+            load_group.assert_not_called()
+            received = await asyncio.wait_for(self.layer.receive(channel), timeout=1)
+
+            self.layer.apply_membership_notification(json.dumps({"g": "room", "c": channel, "x": None}))
+            self.assertEqual(self.layer._cached_members("room"), [])
+            return received
+
+        self.assertEqual(self.run_async(run), {"type": "chat.message"})
+
+    def test_notifications_for_uncached_groups_are_ignored(self):
+        self.layer.apply_membership_notification(json.dumps({"g": "other", "c": "specific.x!y", "x": time.time() + 60}))
+        self.assertIsNone(self.layer._cached_members("other"))
+
+    def test_disconnected_listener_bypasses_cache(self):
+        self.layer._groups["room"] = (time.time(), {"specific.x!y": time.time() + 60})
+        self.layer._listener.connected = False
+        self.assertIsNone(self.layer._cached_members("room"))
+
+def chat(text: str) -> dict:
+    return {"role": "user", "content": text}
+
+class ReplayBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.buffer = ReplayBuffer(size=5)
+        for seq in range(1, 5):
+            self.buffer.record(1, seq, chat(f"m{seq}"))
+
+    def test_since_returns_messages_after_seq(self):
+        self.assertEqual([seq for seq, _ in self.buffer.since(1, 2, 4)], [3, 4])
+        self.assertEqual(self.buffer.since(1, 4, 4), [])
+
+    def test_since_is_bounded_by_last_seq(self):
+        self.buffer.record(1, 5, chat("m5"))
+        self.assertEqual([seq for seq, _ in self.buffer.since(1, 2, 4)], [3, 4])
+
+    def test_missing_coverage_is_a_miss(self):
+        self.buffer.record(1, 5, chat("m5"))
+        self.buffer.record(1, 6, chat("m6"))
+        # seq 1 was pushed out of the five kept, so a client at 0 cannot be served
+        self.assertIsNone(self.buffer.since(1, 0, 6))
+        self.assertEqual([seq for seq, _ in self.buffer.since(1, 1, 6)], [2, 3, 4, 5, 6])
+        # The buffer has not seen seq 7 yet
+        self.assertIsNone(self.buffer.since(1, 4, 7))
+        self.assertIsNone(self.buffer.since(2, 0, 1))
+
+    def test_duplicates_are_ignored_and_holes_restart_the_run(self):
+        self.buffer.record(1, 3, chat("again"))
+        self.assertEqual(self.buffer.since(1, 2, 3), [(3, chat("m3"))])
+
+        self.buffer.record(1, 7, chat("m7"))
+        self.assertIsNone(self.buffer.since(1, 4, 7))
+        self.assertEqual(self.buffer.since(1, 6, 7), [(7, chat("m7"))])
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ConversationResumeTests(TestCase):
+    def setUp(self):
+        channel_layers.backends.clear()
+        self.addCleanup(channel_layers.backends.clear)
+        user = User.objects.create(u_email="replay@example.com")
+        self.conversation = Conversation.objects.create(u_id=user, c_name="Week plan")
+        append_messages(self.conversation.c_id, [chat(f"m{index}") for index in range(1, 6)])
+
+    def connect(self, query: str = "") -> dict:
+        async def run():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns), f"/ws/conversation/{self.conversation.c_id}/{query}"
+            )
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            response = await communicator.receive_json_from(timeout=5)
+            await communicator.disconnect()
+            return response
+
+        return async_to_sync(run)()
+
+    def test_since_replays_only_missed_messages(self):
+        with patch.object(replay_buffer, 'since', return_value=None):
+            delta = self.connect("?since=3")["delta"]
+
+        self.assertEqual(delta["seq"], 5)
+        self.assertEqual(delta["c_name"], "Week plan")
+        self.assertEqual([(item["seq"], item["message"]) for item in delta["messages"]], [(4, chat("m4")), (5, chat("m5"))])
+
+    def test_up_to_date_client_gets_an_empty_delta(self):
+        delta = self.connect("?since=5")["delta"]
+        self.assertEqual((delta["seq"], delta["messages"]), (5, []))
+
+    def test_unusable_since_falls_back_to_snapshot(self):
+        for query in ("", "?since=9", "?since=-1", "?since=abc"):
+            data = self.connect(query)["data"]
+            self.assertEqual(data["c_last_seq"], 5)
+            self.assertEqual(len(data["c_messages"]), 5)
+
+class ConversationSnapshotTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(u_email="snapshot@example.com")
+        self.conversation = Conversation.objects.create(u_id=user)
+
+    def test_last_seq_comes_from_the_snapshot_rows(self):
+        append_messages(self.conversation.c_id, [chat("m1"), chat("m2")])
+        # c_last_seq already counts a message whose row is not committed yet
+        Conversation.objects.filter(c_id=self.conversation.c_id).update(c_last_seq=3)
+        conversation = Conversation.objects.get(c_id=self.conversation.c_id)
+
+        data = ConversationSerializer(conversation).data
+
+        self.assertEqual(data["c_messages"], [chat("m1"), chat("m2")])
+        self.assertEqual(data["c_last_seq"], 2)
+
+    def test_rows_are_read_once(self):
+        append_messages(self.conversation.c_id, [chat("m1")])
+        serializer = ConversationSerializer(Conversation.objects.get(c_id=self.conversation.c_id))
+
+        with self.assertNumQueries(1):
+            data = serializer.data
+        self.assertEqual((data["c_last_seq"], len(data["c_messages"])), (1, 1))
+
+    def test_empty_conversation(self):
+        data = ConversationSerializer(self.conversation).data
+        self.assertEqual((data["c_last_seq"], data["c_messages"]), (0, []))
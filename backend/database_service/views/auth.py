@@ -6,6 +6,7 @@ from rest_framework import status
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from database_service.models import User, Category
+from agent_service.toolbox.services.calendar_client import service_cache
 
 logger = logging.getLogger(__name__)
 
@@ -125,6 +126,8 @@ class AuthView(APIView):
                 user = User.objects.get(u_email=email)
                 user.u_google_auth = google_auth
                 user.save()
+                # The cached Calendar service still holds the old grant
+                service_cache.invalidate(str(user.u_id))
                 logger.info(f"Updated Google auth for user: {email}")
             except User.DoesNotExist:
                 # Create a new user.
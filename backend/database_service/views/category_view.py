@@ -7,6 +7,7 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import logging
 from app_lib.utils.users import get_user_from_query_param, fetch_user
+from app_lib.utils.categories import bump_category_version
 
 logger = logging.getLogger(__name__)
 
@@ -139,6 +140,7 @@ class CategoryListView(APIView):
         serializer = CategorySerializer(category, data=category_data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            bump_category_version(user_token)
             return Response(serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1,7 +1,7 @@
 "use client"
 
 import { useParams } from "next/navigation"
-import { useEffect, useState, useMemo } from "react"
+import { useEffect, useState, useMemo, useRef } from "react"
 import { ConversationMessage, ToolCall } from "@/lib/types"
 import { SearchEngine } from "@/components/search-engine/search-engine"
 import { CreateEventCard } from "@/components/tool-call-card/CreateEventCard"
@@ -57,6 +57,30 @@ function extractUserMessageContent(content: any): UserMessageContent {
   return { text: "", voiceTranscript: "" }
 }
 
+// Parse the JSON-encoded parts of a stored message for rendering
+function processMessage(msg: ConversationMessage): ConversationMessage {
+  if (msg.role === "assistant" && msg.tool_calls) {
+    return {
+      ...msg,
+      tool_calls: msg.tool_calls.map((tc: string | ToolCall) =>
+        typeof tc === 'string' ? JSON.parse(tc) : tc
+      )
+    }
+  }
+
+  if (typeof msg.content === 'string') {
+    try {
+      return {
+        ...msg,
+        content: JSON.parse(msg.content)
+      }
+    } catch {
+      return msg // Keep as string if not JSON
+    }
+  }
+  return msg
+}
+
 function extractUserMessageImages(content: any): string[] {
   const images: string[] = []
   content.forEach((element: any) => {
@@ -72,7 +96,10 @@ export default function ChatCanvas() {
   const { id } = useParams()
   const [messages, setMessages] = useState<ConversationMessage[]>([])
   const [conversationName, setConversationName] = useState<string>("Untitled")
+  const [streamingReply, setStreamingReply] = useState<string>("")
   const [isLoading, setIsLoading] = useState(true)
+  // Seq of the last message applied, so replayed or duplicated deltas are skipped
+  const lastSeq = useRef(0)
   const { path, setPath } = useBreadcrumbPath()
   const { refreshSidebar } = useApplicationStore()
   const [selectedImageIndex, setSelectedImageIndex] = useState<number | null>(null)
@@ -145,62 +172,103 @@ export default function ChatCanvas() {
     if (!id) return
 
     setIsLoading(true)
+    lastSeq.current = 0
+
+    let ws: WebSocket
+    let received = false
+    let closedByPage = false
+    let attempts = 0
+    let retryTimer: ReturnType<typeof setTimeout> | undefined
+
+    const connect = () => {
+      // Once a snapshot was applied, resume after the last seq instead of re-downloading everything
+      const query = received ? `?since=${lastSeq.current}` : ""
+      ws = new WebSocket(`${WS_BACKEND}/ws/conversation/${id}/${query}`)
+
+      ws.onopen = () => {
+        attempts = 0
+        console.log('WebSocket connection established')
+      }
 
-    const ws = new WebSocket(`${WS_BACKEND}/ws/conversation/${id}/`)
+      ws.onmessage = (event) => {
+        try {
+          const payload = JSON.parse(event.data)
 
-    ws.onopen = () => console.log('WebSocket connection established')
+          // Token deltas of the reply being generated; the full message follows once done
+          if (payload.stream) {
+            setStreamingReply((prev) => prev + (payload.stream.delta || ""))
+            return
+          }
 
-    ws.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data).data
-        if (data.c_name || "Untitled" != conversationName) {
-          setConversationName(data.c_name || "Untitled")
-          refreshSidebar()
-        }
+          // Incremental update: a rename or messages appended after lastSeq
+          if (payload.delta) {
+            received = true
+            const delta = payload.delta
+            if (delta.c_name) {
+              setConversationName(delta.c_name)
+              refreshSidebar()
+            }
 
-        const processedMessages = data.c_messages.map((msg: ConversationMessage) => {
-          // Parse tool calls if they exist
-          if (msg.role === "assistant" && msg.tool_calls) {
-            return {
-              ...msg,
-              tool_calls: msg.tool_calls.map((tc: string | ToolCall) =>
-                typeof tc === 'string' ? JSON.parse(tc) : tc
-              )
+            const fresh = (delta.messages || []).filter((item: any) => item.seq > lastSeq.current)
+            if (fresh.length && fresh[0].seq > lastSeq.current + 1) {
+              // Something was missed; reconnecting resumes from lastSeq and fills the gap
+              ws.close()
+              return
             }
+            if (fresh.length) {
+              lastSeq.current = fresh[fresh.length - 1].seq
+              setMessages((prev) => [...prev, ...fresh.map((item: any) => processMessage(item.message))])
+              setStreamingReply("")
+            }
+            return
           }
 
-          if (typeof msg.content === 'string') {
-            try {
-              return {
-                ...msg,
-                content: JSON.parse(msg.content)
-              }
-            } catch {
-              return msg // Keep as string if not JSON
-            }
+          // Full snapshot, sent on a fresh connection or when a resume is too far behind
+          const data = payload.data
+          if (data.c_name || "Untitled" != conversationName) {
+            setConversationName(data.c_name || "Untitled")
+            refreshSidebar()
           }
-          return msg
-        })
 
-        setMessages(processedMessages)
-      } catch (error) {
-        console.error('Error processing message:', error)
-      } finally {
+          received = true
+          const processedMessages = data.c_messages.map(processMessage)
+          lastSeq.current = data.c_last_seq ?? processedMessages.length
+
+          setMessages(processedMessages)
+          setStreamingReply("")
+        } catch (error) {
+          console.error('Error processing message:', error)
+        } finally {
+          setIsLoading(false)
+        }
+      }
+
+      ws.onclose = () => {
+        console.log('WebSocket connection closed')
+        if (closedByPage) return
+        // Never got any data: the conversation does not exist
+        if (!received) {
+          window.location.href = "/"
+          return
+        }
+        const delay = Math.min(1000 * 2 ** attempts, 15000)
+        attempts += 1
+        retryTimer = setTimeout(connect, delay)
+      }
+
+      ws.onerror = (error) => {
+        console.error('WebSocket error:', error)
         setIsLoading(false)
       }
     }
 
-    ws.onclose = () => {
-      console.log('WebSocket connection closed')
-      window.location.href = "/"
-    }
+    connect()
 
-    ws.onerror = (error) => {
-      console.error('WebSocket error:', error)
-      setIsLoading(false)
+    return () => {
+      closedByPage = true
+      clearTimeout(retryTimer)
+      ws.close()
     }
-
-    return () => ws.close()
   }, [id])
 
   useEffect(() => {
@@ -370,6 +438,23 @@ export default function ChatCanvas() {
                     message="Creating Calendar Event..."
                   />);
                 }
+              case "CreateCalendarEvents":
+                if (message.tool_call_result && message.tool_call_result?.content) {
+                  const created = (message.tool_call_result?.content?.results || [])
+                    .filter((item: any) => item.status === "created")
+                  return toolCallWrapper(index, <div className="flex flex-col gap-2">
+                    {created.map((item: any) => (
+                      <CreateEventCard
+                        key={item.index}
+                        result={{ content: { event_details: normalizeEventData(item) } }}
+                      />
+                    ))}
+                  </div>);
+                } else {
+                  return toolCallWrapper(index, <ToolWaitCard
+                    message="Creating Calendar Events..."
+                  />);
+                }
               case "GetTodayEvents":
                 if (message.tool_call_result && message.tool_call_result?.content) {
                   return <div key={messageKey}></div>;
@@ -409,6 +494,19 @@ export default function ChatCanvas() {
 
           return <div key={messageKey}></div>;
         })}
+
+        {streamingReply && (
+          <div className="flex items-start gap-3 max-w-[60%] mr-auto">
+            <div className="flex-shrink-0 h-8 w-8 rounded-lg flex items-center justify-center">
+              <Bot className="h-5 w-5 text-green-600" />
+            </div>
+            <div className="p-4 rounded-lg flex-1">
+              <div className="text-gray-900">
+                <MarkdownContent content={streamingReply} />
+              </div>
+            </div>
+          </div>
+        )}
       </div>
 
       <div className="sticky bottom-0 p-4">